@@ -0,0 +1,98 @@
+"""Archive tier for finished tournaments.
+
+Finished tournaments are moved out of the hot tables once they are
+ARCHIVE_AFTER_DAYS old, along with their participations, matches and
+standings. Each goes to the matching archived_* table in models. A
+tournament is finished once its end_date has passed. One still marked
+"completed" without an end_date is aged from its created_at.
+
+`run` moves ARCHIVE_BATCH tournaments per transaction, so the write lock
+is only ever held for one small batch. Between batches it walks the
+tournaments by id rather than rescanning. GET /tournaments/{id} falls
+back to the archive, so links to an archived tournament keep working.
+Rows keep their ids. The live tables are AUTOINCREMENT on SQLite, so no
+id that went to the archive is handed out again. Nothing writes to
+archived rows, and there is no way back yet.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.orm import Session
+
+import models
+import versions
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "20"))  # tournaments per transaction
+ARCHIVE_PAUSE_SECONDS = float(os.getenv("ARCHIVE_PAUSE_SECONDS", "0.05"))  # lets other writers in between batches
+
+# (live table, archive table); children first, so nothing points at a row already gone
+TABLES = (
+    (models.Standing.__table__, models.archived_standings),
+    (models.Participation.__table__, models.archived_participations),
+    (models.Match.__table__, models.archived_matches),
+)
+
+def _finished_before(cutoff: datetime):
+    tournament = models.Tournament
+    return or_(
+        tournament.end_date < cutoff,
+        and_(tournament.end_date.is_(None), tournament.status == "completed", tournament.created_at < cutoff),
+    )
+
+def _move(db: Session, table, archive, where) -> int:
+    db.execute(archive.insert().from_select([column.name for column in table.columns], select(table).where(where)))
+    return db.execute(delete(table).where(where)).rowcount
+
+def archive_batch(db: Session, cutoff: datetime, after_id: int = 0, limit: int = ARCHIVE_BATCH) -> Optional[dict]:
+    """Archive up to limit finished tournaments past after_id, in id order; commits.
+
+    Returns None when there is nothing left to look at. Otherwise returns
+    the last id looked at, to carry on from, and the rows moved per table.
+    """
+    ids = db.scalars(
+        select(models.Tournament.id)
+        .where(models.Tournament.id > after_id, _finished_before(cutoff))
+        .order_by(models.Tournament.id)
+        .limit(limit)
+    ).all()
+    if not ids:
+        db.rollback()
+        return None
+    moved = {"last_id": ids[-1], "tournaments": len(ids)}
+    for table, archive in TABLES:
+        moved[table.name] = _move(db, table, archive, table.c.tournament_id.in_(ids))
+    tournaments = models.Tournament.__table__
+    _move(db, tournaments, models.archived_tournaments, tournaments.c.id.in_(ids))
+    versions.bump(db, versions.TOURNAMENTS,
+                  *(key for tournament_id in ids
+                    for key in (versions.tournament(tournament_id), versions.participants(tournament_id))))
+    db.commit()
+    return moved
+
+def run(db: Session, older_than_days: Optional[int] = None,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None) -> dict:
+    """Archive every tournament finished more than older_than_days ago (default ARCHIVE_AFTER_DAYS)."""
+    started = time.perf_counter()
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    totals = {"tournaments": 0, **{table.name: 0 for table, _ in TABLES}}
+    after_id = 0
+    while (moved := archive_batch(db, cutoff, after_id)) is not None:
+        after_id = moved.pop("last_id")
+        for name, count in moved.items():
+            totals[name] += count
+        if progress:
+            progress(totals["tournaments"])
+        time.sleep(ARCHIVE_PAUSE_SECONDS)
+    return {**totals, "seconds": round(time.perf_counter() - started, 3)}
+
+if __name__ == "__main__":
+    import sys
+    from database import SessionLocal
+
+    with SessionLocal() as session:
+        print(run(session, int(sys.argv[1]) if len(sys.argv) > 1 else None))
@@ -0,0 +1,157 @@
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+import schemas
+import auth
+import serialization
+import standings
+import search
+from typing import List, Optional
+
+# Async counterparts of the crud read paths, used by the async routes and the
+# auth dependencies so they never run a blocking query on the event loop.
+# Writes stay in crud and run from sync routes in FastAPI's threadpool.
+
+# User CRUD
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user_by_username(db, username)
+    if not user:
+        return False
+    if not await auth.verify_password_async(password, user.hashed_password):
+        return False
+    return user
+
+# Tournament CRUD
+async def get_tournament(db: AsyncSession, tournament_id: int):
+    result = await db.execute(select(models.Tournament).where(models.Tournament.id == tournament_id))
+    return result.scalars().first()
+
+async def get_archived_tournament(db: AsyncSession, tournament_id: int):
+    """The archived tournament's row (see archive.py); it has the same columns as a live one."""
+    result = await db.execute(
+        select(models.archived_tournaments).where(models.archived_tournaments.c.id == tournament_id))
+    return result.first()
+
+async def get_tournament_full(db: AsyncSession, tournament_id: int):
+    """Tournament with organizer, participations and matches, in three queries at any size.
+
+    The organizer is joined into the tournament query. Participations and
+    matches each come from one IN query, with their teams joined in.
+    """
+    result = await db.execute(
+        select(models.Tournament)
+        .where(models.Tournament.id == tournament_id)
+        .options(
+            joinedload(models.Tournament.organizer),
+            selectinload(models.Tournament.participations).joinedload(models.Participation.team),
+            selectinload(models.Tournament.matches).options(
+                joinedload(models.Match.team1),
+                joinedload(models.Match.team2),
+                joinedload(models.Match.winner),
+            ),
+        )
+    )
+    return result.scalars().first()
+
+def _tournaments_query(query, skip: int, limit: int, game: Optional[str], after):
+    if game:
+        query = query.where(models.Tournament.game == game)
+    query = query.order_by(models.Tournament.created_at, models.Tournament.id)
+    if after is not None:
+        query = query.where(tuple_(models.Tournament.created_at, models.Tournament.id) > tuple_(*after))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+async def get_tournaments(db: AsyncSession, skip: int = 0, limit: int = 100, game: Optional[str] = None, after=None):
+    result = await db.execute(_tournaments_query(select(models.Tournament), skip, limit, game, after))
+    return result.scalars().all()
+
+async def get_tournament_rows(db: AsyncSession, skip: int = 0, limit: int = 100, game: Optional[str] = None, after=None):
+    """Like get_tournaments, but plain rows with just the schemas.Tournament columns."""
+    query = select(*serialization.columns(models.Tournament, schemas.Tournament))
+    result = await db.execute(_tournaments_query(query, skip, limit, game, after))
+    return result.all()
+
+# Team CRUD
+def _teams_query(query, skip: int, limit: int, after):
+    query = query.order_by(models.Team.created_at, models.Team.id)
+    if after is not None:
+        query = query.where(tuple_(models.Team.created_at, models.Team.id) > tuple_(*after))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+async def get_teams(db: AsyncSession, skip: int = 0, limit: int = 100, after=None):
+    result = await db.execute(_teams_query(select(models.Team), skip, limit, after))
+    return result.scalars().all()
+
+async def get_team_rows(db: AsyncSession, skip: int = 0, limit: int = 100, after=None):
+    """Like get_teams, but plain rows with just the schemas.Team columns."""
+    query = select(*serialization.columns(models.Team, schemas.Team))
+    result = await db.execute(_teams_query(query, skip, limit, after))
+    return result.all()
+
+# Match CRUD
+async def get_tournament_matches(db: AsyncSession, tournament_id: int):
+    result = await db.execute(select(models.Match).where(models.Match.tournament_id == tournament_id))
+    return result.scalars().all()
+
+# Search
+async def search_entities(db: AsyncSession, q: str, kind: Optional[str] = None, skip: int = 0, limit: int = 20):
+    query = search.search_query(q, kind=kind, skip=skip, limit=limit, dialect=db.get_bind().dialect.name)
+    if query is None:
+        return []
+    result = await db.execute(query)
+    return result.all()
+
+# Standings
+async def get_standings(db: AsyncSession, tournament_id: int):
+    result = await db.execute(standings.standings_query(tournament_id))
+    return result.scalars().all()
+
+# Ratings
+async def get_leaderboard_rows(db: AsyncSession, skip: int = 0, limit: int = 50, min_matches: int = 1, after=None):
+    """Teams by rating, best first, as plain rows with the schemas.LeaderboardEntry columns."""
+    query = (
+        select(*serialization.columns(models.Team, schemas.LeaderboardEntry))
+        .where(models.Team.rated_matches >= min_matches)
+        .order_by(models.Team.rating.desc(), models.Team.id.desc())
+    )
+    if after is not None:
+        query = query.where(tuple_(models.Team.rating, models.Team.id) < tuple_(*after))
+    else:
+        query = query.offset(skip)
+    result = await db.execute(query.limit(limit))
+    return result.all()
+
+# Participation CRUD
+async def get_tournament_participants(db: AsyncSession, tournament_id: int):
+    result = await db.execute(
+        select(models.Participation).where(models.Participation.tournament_id == tournament_id)
+    )
+    return result.scalars().all()
+
+async def get_participants_for(db: AsyncSession, tournament_ids: List[int]):
+    result = await db.execute(
+        select(models.Participation)
+        .where(models.Participation.tournament_id.in_(tournament_ids))
+        .order_by(models.Participation.tournament_id, models.Participation.id)
+    )
+    return result.scalars().all()
+
+# Jobs
+async def get_job(db: AsyncSession, job_id: int):
+    return await db.get(models.Job, job_id)
+
+async def get_user_jobs(db: AsyncSession, user_id: int, status: Optional[str] = None, limit: int = 50):
+    query = select(models.Job).where(models.Job.created_by == user_id)
+    if status:
+        query = query.where(models.Job.status == status)
+    result = await db.execute(query.order_by(models.Job.id.desc()).limit(limit))
+    return result.scalars().all()
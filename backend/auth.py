@@ -1,12 +1,15 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+import asyncio
+import threading
+import time
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-import crud, models, schemas
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+import async_crud, schemas, metrics
+from database import get_async_db
 import os
 
 # Security
@@ -14,16 +17,163 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing pool. bcrypt takes 100ms+ per call, so it runs on a bounded
+# pool instead of the event loop; once workers + queue are all taken, callers
+# are turned away with PasswordHashPoolBusy rather than piling up.
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")  # thread, process
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+# Resolved-user cache. Entries are keyed by (sub, exp) and kept for at most
+# USER_CACHE_TTL seconds, which bounds how long a deactivation made by another
+# process can go unnoticed; changes made through crud invalidate immediately.
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+class PasswordHashPoolBusy(Exception):
+    def __init__(self, retry_after: int = PASSWORD_HASH_RETRY_AFTER):
+        super().__init__("Password hashing pool is saturated")
+        self.retry_after = retry_after
+
+_hash_executor = None
+_pwd_context = None
+_hash_lock = threading.Lock()
+hash_pool_stats = {
+    "in_flight": 0,
+    "peak_in_flight": 0,
+    "completed": 0,
+    "rejected": 0,
+}
+
+def _get_hash_executor():
+    global _hash_executor
+    if _hash_executor is None:
+        executor_class = ProcessPoolExecutor if PASSWORD_HASH_EXECUTOR == "process" else ThreadPoolExecutor
+        _hash_executor = executor_class(max_workers=PASSWORD_HASH_WORKERS)
+    return _hash_executor
+
+def get_pwd_context():
+    # passlib and bcrypt are imported on first use, keeping them out of worker startup
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+def _hash(password):
+    return get_pwd_context().hash(password)
+
+def _verify(plain_password, hashed_password):
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+def _release_slot(future: Future):
+    with _hash_lock:
+        hash_pool_stats["in_flight"] -= 1
+        hash_pool_stats["completed"] += 1
+
+def _submit(fn, *args) -> Future:
+    with _hash_lock:
+        if hash_pool_stats["in_flight"] >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE:
+            hash_pool_stats["rejected"] += 1
+            raise PasswordHashPoolBusy()
+        hash_pool_stats["in_flight"] += 1
+        hash_pool_stats["peak_in_flight"] = max(hash_pool_stats["peak_in_flight"], hash_pool_stats["in_flight"])
+    try:
+        future = _get_hash_executor().submit(fn, *args)
+    except Exception:
+        with _hash_lock:
+            hash_pool_stats["in_flight"] -= 1
+        raise
+    future.add_done_callback(_release_slot)
+    return future
+
+def get_hash_pool_stats() -> dict:
+    with _hash_lock:
+        return {
+            **hash_pool_stats,
+            "workers": PASSWORD_HASH_WORKERS,
+            "queue_limit": PASSWORD_HASH_QUEUE,
+            "executor": PASSWORD_HASH_EXECUTOR,
+        }
+
+# Sync variants block the calling (threadpool) thread on the pool; async
+# variants await it without holding up the event loop.
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    with metrics.password_hash_timer("verify"):
+        return _submit(_verify, plain_password, hashed_password).result()
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    with metrics.password_hash_timer("hash"):
+        return _submit(_hash, password).result()
+
+async def verify_password_async(plain_password, hashed_password):
+    with metrics.password_hash_timer("verify"):
+        return await asyncio.wrap_future(_submit(_verify, plain_password, hashed_password))
+
+async def get_password_hash_async(password):
+    with metrics.password_hash_timer("hash"):
+        return await asyncio.wrap_future(_submit(_hash, password))
+
+def _collect_hash_pool() -> list:
+    stats = get_hash_pool_stats()
+    return (
+        metrics.gauge("password_hash_pool_in_flight", "Hash jobs running or queued", [({}, stats["in_flight"])])
+        + metrics.gauge("password_hash_pool_rejected", "Hash jobs turned away since start", [({}, stats["rejected"])])
+    )
+
+metrics.register_collector(_collect_hash_pool)
+
+class UserCache:
+    """Thread-safe TTL + LRU cache of schemas.User keyed by (username, exp)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == username]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+def invalidate_cached_user(username: str):
+    user_cache.invalidate(username)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -35,13 +185,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -50,10 +202,19 @@ async def get_current_user(
         token_data = schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    
-    user = crud.get_user_by_username(db, username=token_data.username)
+
+    cache_key = (token_data.username, payload.get("exp"))
+    user = user_cache.get(cache_key)
+    if user is not None:
+        return user
+
+    db_user = await async_crud.get_user_by_username(db, username=token_data.username)
+    user = None if db_user is None else schemas.User.model_validate(db_user)
+    # Hand the connection back: a write route would otherwise hold it, idle, until it responds
+    await db.rollback()
     if user is None:
         raise credentials_exception
+    user_cache.set(cache_key, user)
     return user
 
 async def get_current_active_user(current_user: schemas.User = Depends(get_current_user)):
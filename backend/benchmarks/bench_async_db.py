@@ -0,0 +1,104 @@
+"""Sync vs async database path throughput.
+
+Drives the ASGI app in-process with httpx at 50, 200 and 1000 concurrent
+clients. The "sync" rows are the handlers as they were before the async
+path: a threadpool route on a sync Session for listings, and an async
+dependency doing a blocking user lookup for authenticated reads. They open
+their sessions inline rather than through get_db: with a yield dependency
+the sync path deadlocks the threadpool against the connection pool at
+these concurrency levels, which would measure the stall, not throughput.
+
+    python benchmarks/bench_async_db.py [--requests 2000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import httpx
+from fastapi import Depends
+from jose import jwt
+
+import auth, crud, migrations, schemas
+from database import SessionLocal, async_engine, engine
+from main import app
+
+CONCURRENCY_LEVELS = [50, 200, 1000]
+
+async def legacy_current_user(token: str = Depends(auth.oauth2_scheme)):
+    payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    with SessionLocal() as db:
+        return crud.get_user_by_username(db, username=payload["sub"])
+
+@app.get("/_bench/sync/tournaments", response_model=list[schemas.Tournament])
+def sync_tournaments(limit: int = 100):
+    with SessionLocal() as db:
+        return crud.get_tournaments(db, limit=limit)
+
+@app.get("/_bench/sync/users/me", response_model=schemas.User)
+async def sync_users_me(current_user=Depends(legacy_current_user)):
+    return current_user
+
+def seed():
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    user = crud.create_user(db, schemas.UserCreate(
+        username="bench", email="bench@example.com", password="benchpass"
+    ))
+    for i in range(500):
+        crud.create_tournament(db, schemas.TournamentCreate(name=f"Bench {i}", game="CS:GO"), user.id)
+    db.close()
+    return auth.create_access_token({"sub": "bench"})
+
+async def run(url: str, total: int, concurrency: int, headers: dict):
+    transport = httpx.ASGITransport(app=app)
+    remaining = total
+    latencies = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                sent = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                latencies.append(time.perf_counter() - sent)
+                assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99_ms = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    return total / elapsed, p99_ms
+
+async def main(total: int):
+    token = seed()
+    headers = {"Authorization": f"Bearer {token}"}
+    cases = [
+        ("tournaments", "/_bench/sync/tournaments?limit=20", "/tournaments/?limit=20"),
+        ("users/me", "/_bench/sync/users/me", "/users/me"),
+    ]
+
+    print(f"{'route':<12} {'clients':>8} {'sync req/s':>11} {'p99 ms':>8} {'async req/s':>12} {'p99 ms':>8}")
+    for name, sync_url, async_url in cases:
+        for concurrency in CONCURRENCY_LEVELS:
+            sync_rps, sync_p99 = await run(sync_url, total, concurrency, headers)
+            async_rps, async_p99 = await run(async_url, total, concurrency, headers)
+            print(f"{name:<12} {concurrency:>8} {sync_rps:>11.0f} {sync_p99:>8.1f} {async_rps:>12.0f} {async_p99:>8.1f}")
+
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000, help="requests per run")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
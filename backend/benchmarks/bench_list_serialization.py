@@ -0,0 +1,84 @@
+"""Schema vs fast-path serialization of list responses.
+
+Requests /tournaments/?limit=100 and /teams/?limit=100 one at a time
+through the ASGI app, first with the schema path (ORM objects validated
+through the response model), then with FAST_LIST_RESPONSES (column rows
+dumped by orjson). Reports p50/p99 latency, then runs a second pass under
+tracemalloc for the peak memory allocated while serving one request.
+Tracing slows everything down, so it is kept out of the timings.
+
+    python benchmarks/bench_list_serialization.py [--requests 1000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import httpx
+
+import crud, migrations, schemas
+import main
+from database import SessionLocal, async_engine, engine
+
+def seed():
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    user = crud.create_user(db, schemas.UserCreate(
+        username="bench", email="bench@example.com", password="benchpass"
+    ))
+    for i in range(500):
+        crud.create_tournament(db, schemas.TournamentCreate(
+            name=f"Bench {i}", game="CS:GO", description="Weekly cup " * 5
+        ), user.id)
+        crud.create_team(db, schemas.TeamCreate(name=f"Team {i}", tag=f"T{i}", description="Roster " * 5))
+    db.close()
+
+async def timed(client: httpx.AsyncClient, url: str, total: int):
+    latencies = []
+    for _ in range(total):
+        sent = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - sent)
+        assert response.status_code == 200, response.text
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+async def traced(client: httpx.AsyncClient, url: str, total: int):
+    peaks = 0
+    tracemalloc.start()
+    for _ in range(total):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        response = await client.get(url)
+        peaks += tracemalloc.get_traced_memory()[1] - baseline
+        del response
+    tracemalloc.stop()
+    return peaks / total / 1024
+
+async def run(total: int):
+    seed()
+    transport = httpx.ASGITransport(app=main.app)
+    print(f"{'route':<14} {'path':<7} {'p50 ms':>7} {'p99 ms':>7} {'peak KiB/req':>13}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for url in ("/tournaments/?limit=100", "/teams/?limit=100"):
+            for name, fast in (("schema", False), ("fast", True)):
+                main.FAST_LIST_RESPONSES = fast
+                await timed(client, url, 50)  # warm up
+                p50, p99 = await timed(client, url, total)
+                peak = await traced(client, url, max(total // 10, 20))
+                print(f"{url.split('?')[0]:<14} {name:<7} {p50:>7.2f} {p99:>7.2f} {peak:>13.0f}")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000, help="timed requests per path")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
@@ -0,0 +1,104 @@
+"""Connection pool saturation.
+
+Drives the ASGI app in-process with httpx at 1x, 2x and 4x as many
+concurrent clients as the read pool has connections (DB_READ_POOL_SIZE +
+DB_READ_MAX_OVERFLOW). The pool is kept small and the pool timeout short,
+so past the pool size requests queue for a connection and, once the queue
+outlasts DB_POOL_TIMEOUT, are shed with a 503. Reports throughput, p95
+latency, the number of 503s and the most connections checked out at once.
+
+Runs on SQLite by default. Point DATABASE_URL at Postgres to measure the
+server profile (pre-ping, recycle, statement timeout) instead:
+
+    python benchmarks/bench_pool.py [--requests 2000] [--pool 4] [--timeout 0.5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=2000, help="requests per run")
+parser.add_argument("--pool", type=int, default=4, help="read pool size (no overflow)")
+parser.add_argument("--timeout", type=float, default=0.5, help="seconds to wait for a pooled connection")
+args = parser.parse_args()
+
+# The engines read these at import
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ["DB_READ_POOL_SIZE"] = str(args.pool)
+os.environ["DB_READ_MAX_OVERFLOW"] = "0"
+os.environ["DB_POOL_TIMEOUT"] = str(args.timeout)
+
+import httpx
+from sqlalchemy import event
+
+import crud, migrations, schemas
+from database import SessionLocal, async_engine, engine
+from main import app
+
+checked_out = {"now": 0, "peak": 0}
+
+@event.listens_for(async_engine.sync_engine, "checkout")
+def on_checkout(dbapi_connection, connection_record, connection_proxy):
+    checked_out["now"] += 1
+    checked_out["peak"] = max(checked_out["peak"], checked_out["now"])
+
+@event.listens_for(async_engine.sync_engine, "checkin")
+def on_checkin(dbapi_connection, connection_record):
+    checked_out["now"] -= 1
+
+def seed():
+    migrations.upgrade(engine)
+    with SessionLocal() as db:
+        user = crud.create_user(db, schemas.UserCreate(
+            username="bench", email="bench@example.com", password="benchpass"
+        ))
+        for i in range(500):
+            crud.create_tournament(db, schemas.TournamentCreate(name=f"Bench {i}", game="CS:GO"), user.id)
+
+async def run(url: str, total: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    remaining = total
+    latencies = []
+    shed = 0
+    checked_out["peak"] = 0
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal remaining, shed
+            while remaining > 0:
+                remaining -= 1
+                sent = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - sent)
+                if response.status_code == 503:
+                    shed += 1
+                else:
+                    assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95_ms = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    return total / elapsed, p95_ms, shed, checked_out["peak"]
+
+async def main(total: int):
+    seed()
+    url = "/tournaments/?limit=100"
+    print(f"pool {args.pool}, pool timeout {args.timeout}s, {async_engine.dialect.name}")
+    print(f"{'clients':>8} {'req/s':>8} {'p95 ms':>8} {'503s':>6} {'peak checked out':>17}")
+    for concurrency in (args.pool, 2 * args.pool, 4 * args.pool):
+        rps, p95, shed, peak = await run(url, total, concurrency)
+        print(f"{concurrency:>8} {rps:>8.0f} {p95:>8.1f} {shed:>6} {peak:>17}")
+
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main(args.requests))
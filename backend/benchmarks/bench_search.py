@@ -0,0 +1,96 @@
+"""Search latency over a large index.
+
+Fills search_index with --rows synthetic tournaments and teams (written
+straight into the index, since only the index is queried), then times
+typical queries through search.search_query: a full word, type-ahead
+prefixes of growing length, multi-term queries and a kind filter.
+
+    python benchmarks/bench_search.py [--rows 1000000]
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import text
+
+import search
+from database import SessionLocal, engine
+import migrations
+
+WORDS = ("summer winter spring autumn open cup league masters series invitational championship "
+         "qualifier major minor pro amateur academy legends titans wolves dragons phoenix ravens "
+         "storm thunder shadow crimson azure golden silver iron night dawn").split()
+GAMES = ("cs", "dota", "valorant", "league", "overwatch", "rocket", "apex", "fortnite")
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    # Made-up words, drawn with a Zipf-like skew below, so a few are very
+    # common and most are rare, like real descriptions
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [
+        "".join(rng.choice(letters) for _ in range(rng.randint(4, 9)))
+        for _ in range(size)
+    ]
+
+def fill(rows: int):
+    rng = random.Random(7)
+    vocab = WORDS + vocabulary(20000, rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocab))))
+    batch = []
+    db = SessionLocal()
+    insert = text("INSERT INTO search_index(rowid, name, tag, description) VALUES (:rowid, :name, :tag, :description)")
+    for i in range(rows):
+        name = " ".join(rng.sample(WORDS, 2)) + f" {rng.choice(GAMES)} {i}"
+        description = " ".join(rng.choices(vocab, cum_weights=cum_weights, k=12))
+        batch.append({"rowid": i, "name": name, "tag": f"T{i}" if i % 2 else None, "description": description})
+        if len(batch) == 10000:
+            db.execute(insert, batch)
+            batch.clear()
+    if batch:
+        db.execute(insert, batch)
+    db.commit()
+    db.close()
+
+def timed(q: str, kind=None, repeat: int = 20):
+    db = SessionLocal()
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = db.execute(search.search_query(q, kind=kind, limit=20)).all()
+        latencies.append(time.perf_counter() - started)
+    db.close()
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[-1] * 1000, len(rows)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    started = time.perf_counter()
+    fill(args.rows)
+    print(f"indexed {args.rows} rows in {time.perf_counter() - started:.1f}s\n")
+
+    print(f"{'query':<26} {'p50 ms':>8} {'max ms':>8} {'hits':>5}")
+    for q, kind in [
+        ("123456", None),
+        ("phoenix valorant 4242", None),
+        ("cr", None), ("crim", None), ("crimson", None),
+        ("crimson azu", None), ("golden dragons apex", None),
+        ("storm", "team"),
+    ]:
+        p50, worst, hits = timed(q, kind)
+        label = q + (f" [{kind}]" if kind else "")
+        print(f"{label:<26} {p50:>8.1f} {worst:>8.1f} {hits:>5}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Read latency during write bursts: default SQLite setup vs the WAL profile.
+
+"default" is the engine as it was: rollback journal, no pragmas, one
+engine for reads and writes. "wal" is the new profile: database.configure_sqlite
+plus pool_options, so writes go through one BEGIN IMMEDIATE connection and
+reads through a separate query_only pool. For each setup, writer processes post bursts of match scores through
+crud's batch path back to back, while reader threads load the tournament's standings and stream its
+matches. Reports read latency and throughput, writes per second and
+failed write transactions. Then times one commit made while a reader
+is part-way through a result set; with a rollback journal the reader's
+shared lock holds the commit up until busy_timeout gives out.
+
+    python benchmarks/bench_sqlite_profile.py [--seconds 5] [--writers 2] [--readers 2] [--batch 100]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'app.db')}"
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import crud, migrations, models, schemas, standings
+from database import configure_sqlite, pool_options
+
+TEAMS = 32
+
+def make_engines(profile: str):
+    url = f"sqlite:///{os.path.join(TMP_DIR, profile + '.db')}"
+    if profile == "default":
+        write_engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=16)
+        return write_engine, write_engine
+    write_engine = create_engine(url, connect_args={"check_same_thread": False}, **pool_options(url))
+    read_engine = create_engine(url, connect_args={"check_same_thread": False}, **pool_options(url, read=True))
+    configure_sqlite(write_engine)
+    configure_sqlite(read_engine, read_only=True)
+    return write_engine, read_engine
+
+def seed(Session):
+    db = Session()
+    user = crud.create_user(db, schemas.UserCreate(username="bench", email="bench@example.com", password="benchpass"))
+    tournament = crud.create_tournament(db, schemas.TournamentCreate(name="Bench", game="CS:GO"), user.id)
+    organizer_id, tournament_id = user.id, tournament.id
+    for i in range(TEAMS):
+        team = crud.create_team(db, schemas.TeamCreate(name=f"Team {i}", tag=f"T{i}"))
+        crud.register_team(db, schemas.ParticipationCreate(tournament_id=tournament_id, team_id=team.id))
+    matches = crud.generate_bracket(db, tournament_id, "round_robin")
+    pairs = [(m.id, m.team1_id, m.team2_id) for m in matches]
+    db.close()
+    return organizer_id, tournament_id, pairs
+
+def percentile(values, p):
+    return values[min(int(len(values) * p), len(values) - 1)] * 1000
+
+def writer(profile: str, organizer_id: int, pairs, batch: int, stop, results):
+    # Runs in its own process, like another API worker, so writers and
+    # readers don't also contend for one GIL
+    write_engine, _ = make_engines(profile)
+    WriteSession = sessionmaker(bind=write_engine, autoflush=False)
+    done = errors = 0
+    rng = random.Random()
+    while not stop.is_set():
+        updates = []
+        for match_id, _, _ in rng.sample(pairs, batch):
+            score1, score2 = rng.choice([(2, 0), (0, 2), (2, 1), (1, 2)])
+            updates.append(schemas.ScoreUpdate(match_id=match_id, score1=score1, score2=score2))
+        db = WriteSession()
+        try:
+            crud.batch_update_match_scores(db, updates, organizer_id)
+            done += len(updates)
+        except OperationalError:
+            db.rollback()
+            errors += 1
+        finally:
+            db.close()
+    results.put((done, errors))
+
+def run(profile: str, seconds: float, writers: int, readers: int, batch: int):
+    write_engine, read_engine = make_engines(profile)
+    migrations.upgrade(write_engine)
+    organizer_id, tournament_id, pairs = seed(sessionmaker(bind=write_engine, autoflush=False))
+    ReadSession = sessionmaker(bind=read_engine, autoflush=False)
+
+    stop, results = multiprocessing.Event(), multiprocessing.Queue()
+    read_latencies = []
+
+    def reader():
+        latencies = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            db = ReadSession()
+            try:
+                standings.get_standings(db, tournament_id)
+                # Stream the matches like a paged read or an export would; the
+                # reader's statement stays open while it serializes each chunk
+                matches = db.scalars(
+                    select(models.Match).where(models.Match.tournament_id == tournament_id)
+                    .execution_options(yield_per=50)
+                )
+                for match in matches:
+                    schemas.Match.model_validate(match)
+            finally:
+                db.close()
+            latencies.append(time.perf_counter() - started)
+        read_latencies.extend(latencies)
+
+    processes = [multiprocessing.Process(target=writer, args=(profile, organizer_id, pairs, batch, stop, results)) for _ in range(writers)]
+    for process in processes:
+        process.start()
+    time.sleep(1)  # let the writers connect before measuring
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    counts = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    write_engine.dispose()
+    read_engine.dispose()
+
+    read_latencies.sort()
+    return {
+        "reads/s": len(read_latencies) / seconds,
+        "p50": percentile(read_latencies, 0.50),
+        "p99": percentile(read_latencies, 0.99),
+        "max": read_latencies[-1] * 1000,
+        "scores/s": sum(done for done, _ in counts) / (seconds + 1),
+        "failed": sum(errors for _, errors in counts),
+    }
+
+def commit_during_open_read(profile: str) -> str:
+    """How long a commit waits while a reader is part-way through a result."""
+    write_engine, read_engine = make_engines(profile)
+    Session = sessionmaker(bind=write_engine, autoflush=False)
+    db = Session()
+    try:
+        with read_engine.connect() as conn:
+            rows = conn.exec_driver_sql("SELECT id FROM matches")
+            rows.fetchone()
+            started = time.perf_counter()
+            try:
+                crud.create_team(db, schemas.TeamCreate(name=f"Late {profile}", tag=f"L{profile[0]}"))
+                outcome = "ok"
+            except OperationalError:
+                db.rollback()
+                outcome = "database is locked"
+            elapsed = (time.perf_counter() - started) * 1000
+            rows.fetchall()
+    finally:
+        db.close()
+        write_engine.dispose()
+        read_engine.dispose()
+    return f"{elapsed:.1f} ms ({outcome})"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=100, help="score updates per write transaction")
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'reads/s':>8} {'p50 ms':>7} {'p99 ms':>7} {'max ms':>8} {'scores/s':>9} {'failed':>7}")
+    for profile in ("default", "wal"):
+        r = run(profile, args.seconds, args.writers, args.readers, args.batch)
+        print(f"{profile:<8} {r['reads/s']:>8.0f} {r['p50']:>7.1f} {r['p99']:>7.1f} {r['max']:>8.1f} "
+              f"{r['scores/s']:>9.0f} {r['failed']:>7}")
+
+    print()
+    for profile in ("default", "wal"):
+        print(f"{profile:<8} commit while a read is open: {commit_during_open_read(profile)}")
+
+if __name__ == "__main__":
+    main()
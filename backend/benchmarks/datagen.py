@@ -0,0 +1,194 @@
+"""Deterministic data generator for the benchmark suite.
+
+The same --scale and --seed always produce the same database. Ids are
+sequential from 1, so scenarios can pick valid ids without querying.
+Rows go in through Core executemany. The search index, standings and
+ratings are then derived in bulk, so the result looks like data written
+through crud.
+
+Every user's password is PASSWORD. User 1 (USERNAME) is an admin and
+organizes every 10th tournament, split into pools that the write
+scenarios can use up:
+
+    played       matches generated and mostly scored
+    bracketable  teams registered, no matches yet
+    open         no teams registered
+    deletable    nothing attached
+
+    python benchmarks/datagen.py --scale large --out /tmp/large.db
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SCALES = {
+    "tiny": {"users": 1_000, "teams": 500, "tournaments": 200, "matches": 10_000},
+    "small": {"users": 10_000, "teams": 5_000, "tournaments": 2_000, "matches": 100_000},
+    "large": {"users": 100_000, "teams": 50_000, "tournaments": 20_000, "matches": 1_000_000},
+}
+POOLS = ("played", "bracketable", "open", "deletable")
+USERNAME = "user1"
+PASSWORD = "benchpass"
+GAMES = ("CS:GO", "Dota 2", "Valorant", "League of Legends", "Overwatch", "Rocket League")
+WORDS = ("summer winter spring autumn open cup league masters series invitational championship "
+         "qualifier major minor pro amateur academy legends titans wolves dragons phoenix ravens "
+         "storm thunder shadow crimson azure golden silver iron night dawn").split()
+CHUNK = 10_000
+EPOCH = datetime(2024, 1, 1)
+GENERATOR_VERSION = 4
+
+def default_path(scale: str, seed: int) -> str:
+    return os.path.join(tempfile.gettempdir(), "tournament-bench", f"{scale}-{seed}-v{GENERATOR_VERSION}.db")
+
+def pool_of(tournament_id: int) -> str:
+    """Which pool one of user 1's tournaments is in (every 10th tournament is theirs)."""
+    return POOLS[(tournament_id // 10) % len(POOLS)]
+
+def user1_tournaments(count: int, pool: str) -> list:
+    return [t for t in range(10, count + 1, 10) if pool_of(t) == pool]
+
+def _insert(conn, table, rows):
+    for chunk_start in range(0, len(rows), CHUNK):
+        conn.execute(table.insert(), rows[chunk_start:chunk_start + CHUNK])
+
+def generate(path: str, scale: str = "small", seed: int = 42, log=print) -> str:
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+    import migrations, models, ratings, search, standings
+    from auth import get_password_hash
+
+    sizes = SCALES[scale]
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine)
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+
+        # One bcrypt hash for everyone; hashing 100k passwords would take hours
+        hashed = get_password_hash(PASSWORD)
+        _insert(conn, models.User.__table__, [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "full_name": f"User {i}",
+             "hashed_password": hashed, "is_active": True, "is_admin": i == 1,
+             "created_at": EPOCH + timedelta(seconds=i)}
+            for i in range(1, sizes["users"] + 1)
+        ])
+        log(f"users: {sizes['users']}")
+
+        _insert(conn, models.Team.__table__, [
+            {"id": i, "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}", "tag": f"T{i}",
+             "description": " ".join(rng.choices(WORDS, k=8)), "created_at": EPOCH + timedelta(seconds=i)}
+            for i in range(1, sizes["teams"] + 1)
+        ])
+        log(f"teams: {sizes['teams']}")
+
+        tournaments, participations, matches = [], [], []
+        totals, match_count = {}, 0
+
+        def flush_matches():
+            # Matches are the bulk of the data; insert and tally them as we go
+            nonlocal match_count
+            _insert(conn, models.Match.__table__, matches)
+            for key, row in standings.tally(
+                (m["tournament_id"], m["team1_id"], m["team2_id"], m["score1"], m["score2"], m["winner_id"], m["status"])
+                for m in matches
+            ).items():
+                total = totals.setdefault(key, dict.fromkeys(standings.COUNTERS, 0))
+                for counter, value in row.items():
+                    total[counter] += value
+            match_count += len(matches)
+            matches.clear()
+
+        played = [t for t in range(1, sizes["tournaments"] + 1) if t % 10 or pool_of(t) == "played"]
+        matches_per_tournament = max(1, sizes["matches"] // len(played))
+        match_id = itertools.count(1)
+        for t in range(1, sizes["tournaments"] + 1):
+            pool = pool_of(t) if t % 10 == 0 else "played"
+            organizer_id = 1 if t % 10 == 0 else rng.randint(2, sizes["users"])
+            created_at = EPOCH + timedelta(minutes=t)
+            tournaments.append({
+                "id": t, "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {t}",
+                "game": rng.choice(GAMES), "description": " ".join(rng.choices(WORDS, k=12)),
+                "max_teams": 32, "prize_pool": rng.randrange(0, 100_000, 500),
+                "status": "ongoing" if pool == "played" else "upcoming",
+                "organizer_id": organizer_id, "created_at": created_at,
+                # Open tournaments take any number of registrations from the suite
+                "registered_count": 0, "waitlist": pool == "open",
+            })
+            if pool in ("open", "deletable"):
+                continue
+            team_ids = rng.sample(range(1, sizes["teams"] + 1), rng.randint(8, 32))
+            tournaments[-1]["registered_count"] = len(team_ids)
+            participations.extend(
+                {"tournament_id": t, "team_id": team_id, "registered_at": created_at + timedelta(seconds=i)}
+                for i, team_id in enumerate(team_ids)
+            )
+            if pool != "played":
+                continue
+            for position in range(matches_per_tournament):
+                team1_id, team2_id = rng.sample(team_ids, 2)
+                completed = rng.random() < 0.8
+                score1, score2 = rng.choice([(2, 0), (2, 1), (0, 2), (1, 2)]) if completed else (0, 0)
+                matches.append({
+                    "id": next(match_id), "tournament_id": t, "round": position // 8 + 1,
+                    "team1_id": team1_id, "team2_id": team2_id, "score1": score1, "score2": score2,
+                    "winner_id": (team1_id if score1 > score2 else team2_id) if completed else None,
+                    "status": "completed" if completed else "scheduled",
+                    "match_date": created_at + timedelta(days=1, hours=position),
+                })
+            if len(matches) >= CHUNK:
+                flush_matches()
+        flush_matches()
+        _insert(conn, models.Tournament.__table__, tournaments)
+        _insert(conn, models.Participation.__table__, participations)
+        log(f"tournaments: {len(tournaments)}, participations: {len(participations)}, matches: {match_count}")
+
+        _insert(conn, models.Standing.__table__, [
+            {"tournament_id": tournament_id, "team_id": team_id, **row}
+            for (tournament_id, team_id), row in totals.items()
+        ])
+        log(f"standings: {len(totals)}")
+
+        if conn.dialect.name == "sqlite":
+            conn.execute(text("DELETE FROM search_index"))
+            conn.execute(text(search.BACKFILL_INDEX))
+            log("search index built")
+
+    with Session(engine) as session:
+        log(f"ratings: {ratings.recompute(session)}")
+
+    engine.dispose()
+    log(f"generated {scale} (seed {seed}) in {time.perf_counter() - started:.1f}s -> {path}")
+    return path
+
+def ensure(scale: str = "small", seed: int = 42, log=print) -> str:
+    """Path to a generated database for scale/seed, generating it on first use."""
+    path = default_path(scale, seed)
+    if not os.path.exists(path):
+        generate(path + ".partial", scale, seed, log)
+        os.replace(path + ".partial", path)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="database file (default: a cached file per scale and seed)")
+    args = parser.parse_args()
+    if args.out:
+        generate(args.out, args.scale, args.seed)
+    else:
+        print(ensure(args.scale, args.seed))
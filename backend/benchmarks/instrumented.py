@@ -0,0 +1,35 @@
+"""The API app with SQL statement counting, for the benchmark suite.
+
+Importing this module counts every statement on the app's read and write
+engines. It also adds GET /_bench/statements, which returns the running
+total. The suite reads that total before and after a scenario, and the
+same code path works in-process and under uvicorn.
+
+    uvicorn instrumented:app --app-dir benchmarks
+"""
+import os
+import sys
+import threading
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import event
+
+from database import engine, async_engine
+from main import app
+
+_lock = threading.Lock()
+statements = 0
+
+def _count(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    with _lock:
+        statements += 1
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _count)
+
+@app.get("/_bench/statements", include_in_schema=False)
+def read_statement_count():
+    return {"statements": statements}
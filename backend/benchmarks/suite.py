@@ -0,0 +1,456 @@
+"""Benchmark suite for every API route.
+
+Generates (or reuses) a deterministic dataset with datagen.py. Each
+target gets a fresh copy of it, and every route in main.py is driven at
+each concurrency level, either in-process through the ASGI app or over
+HTTP against a local uvicorn. For each route and level the suite records
+throughput, p50/p95/p99 latency, errors, and SQL statements per request.
+It writes everything to a JSON file. Pass a previous file as --baseline
+to flag regressions; the exit status is 1 if any are found.
+
+    python benchmarks/suite.py --scale small --targets asgi,uvicorn \\
+        --concurrency 1,10,50 --requests 200 --output results.json \\
+        [--baseline previous.json]
+
+Write routes use ids handed on from earlier scenarios: tournaments
+created by POST /tournaments/ get teams from the batch registration, then
+a bracket, then are deleted. Every write therefore hits a valid target,
+however many requests are run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+
+import datagen
+
+# Routes the suite deliberately doesn't time
+SKIPPED = {
+    ("GET", "/tournaments/{tournament_id}/live"): "streaming response",
+    ("GET", "/jobs/{job_id}/download"): "file response; GET /export/{kind} times the same bytes",
+}
+
+@dataclass
+class Scenario:
+    method: str
+    path: str
+    build: Callable  # (ctx, rng, i) -> request kwargs, or None when out of targets
+    auth: bool = False
+    on_response: Optional[Callable] = None  # (ctx, request kwargs, response)
+    max_requests: Optional[int] = None  # per concurrency level, for routes too heavy to repeat
+
+@dataclass
+class Context:
+    sizes: dict
+    token: str = ""
+    created: deque = field(default_factory=deque)
+    registered: deque = field(default_factory=deque)
+    entries: deque = field(default_factory=deque)
+    bracketed: deque = field(default_factory=deque)
+    played: list = field(default_factory=list)
+    played_matches: list = field(default_factory=list)
+    participants: dict = field(default_factory=dict)
+    open_tournaments: list = field(default_factory=list)
+    jobs: list = field(default_factory=list)
+    counter: int = 0
+
+    def next(self) -> int:
+        self.counter += 1
+        return self.counter
+
+def load_context(db_path: str, scale: str) -> Context:
+    ctx = Context(sizes=datagen.SCALES[scale])
+    count = ctx.sizes["tournaments"]
+    ctx.played = datagen.user1_tournaments(count, "played")
+    ctx.open_tournaments = datagen.user1_tournaments(count, "open")
+    with sqlite3.connect(db_path) as conn:
+        marks = ",".join("?" * len(ctx.played))
+        ctx.played_matches = [row[0] for row in conn.execute(
+            f"SELECT id FROM matches WHERE tournament_id IN ({marks}) AND team2_id IS NOT NULL", ctx.played)]
+        for tournament_id, team_id in conn.execute(
+                f"SELECT tournament_id, team_id FROM participations WHERE tournament_id IN ({marks})", ctx.played):
+            ctx.participants.setdefault(tournament_id, []).append(team_id)
+    return ctx
+
+def any_id(key):
+    return lambda ctx, rng: rng.randint(1, ctx.sizes[key])
+
+def take(queue_name):
+    def pop(ctx):
+        queue = getattr(ctx, queue_name)
+        return queue.popleft() if queue else None
+    return pop
+
+def _created(ctx, kwargs, response):
+    if response.status_code == 200:
+        ctx.created.append(response.json()["id"])
+
+def _registered(ctx, kwargs, response):
+    if response.status_code == 200:
+        ctx.registered.append(kwargs["json"][0]["tournament_id"])
+
+def _bracketed(ctx, kwargs, response):
+    if response.status_code == 200:
+        ctx.bracketed.append(int(kwargs["url"].split("/")[2]))
+
+def _register_batch(ctx, rng, i):
+    tournament_id = take("created")(ctx)
+    if tournament_id is None:
+        return None
+    teams = rng.sample(range(1, ctx.sizes["teams"] + 1), 16)
+    return {"url": "/participations/batch",
+            "json": [{"tournament_id": tournament_id, "team_id": team} for team in teams]}
+
+def _register_one(ctx, rng, i):
+    # Walk open tournaments x teams so every pair is new
+    n = ctx.next()
+    tournament_id = ctx.open_tournaments[n % len(ctx.open_tournaments)]
+    team_id = n // len(ctx.open_tournaments) + 1
+    return {"url": "/participations/", "json": {"tournament_id": tournament_id, "team_id": team_id}}
+
+def _entered(ctx, kwargs, response):
+    if response.status_code == 200:
+        ctx.entries.append((kwargs["json"]["tournament_id"], kwargs["json"]["team_id"]))
+
+def _withdraw(ctx, rng, i):
+    entry = take("entries")(ctx)
+    if entry is None:
+        return None
+    return {"url": f"/tournaments/{entry[0]}/participants/{entry[1]}"}
+
+def _create_match(ctx, rng, i):
+    tournament_id = rng.choice(ctx.played)
+    team1_id, team2_id = rng.sample(ctx.participants[tournament_id], 2)
+    return {"url": "/matches/", "json": {"tournament_id": tournament_id, "team1_id": team1_id, "team2_id": team2_id}}
+
+def _bracket(ctx, rng, i):
+    tournament_id = take("registered")(ctx)
+    if tournament_id is None:
+        return None
+    return {"url": f"/tournaments/{tournament_id}/bracket", "json": {"format": "single_elimination"}}
+
+def _delete(ctx, rng, i):
+    tournament_id = take("bracketed")(ctx)
+    if tournament_id is None:
+        return None
+    return {"url": f"/tournaments/{tournament_id}"}
+
+def _score(ctx, rng, i):
+    score1, score2 = rng.choice([(2, 0), (0, 2), (2, 1), (1, 2)])
+    return {"url": f"/matches/{rng.choice(ctx.played_matches)}/score", "params": {"score1": score1, "score2": score2}}
+
+def _scores(ctx, rng, i):
+    return {"url": "/matches/scores", "json": [
+        {"match_id": match_id, "score1": 2, "score2": rng.choice([0, 1])}
+        for match_id in rng.sample(ctx.played_matches, 20)
+    ]}
+
+def _import_teams(ctx, rng, i):
+    lines = [json.dumps({"name": f"Imported Team {ctx.next()}", "tag": f"I{ctx.counter}"}) for _ in range(100)]
+    return {"url": "/import/teams", "content": "\n".join(lines)}
+
+def _queued(ctx, request, response):
+    if response.status_code == 202:
+        ctx.jobs.append(response.json()["id"])
+
+WORDS = datagen.WORDS
+
+SCENARIOS = [
+    Scenario("POST", "/token", lambda ctx, rng, i: {
+        "url": "/token", "data": {"username": datagen.USERNAME, "password": datagen.PASSWORD}}),
+    Scenario("POST", "/register", lambda ctx, rng, i: {"url": "/register", "json": {
+        "username": f"bench{ctx.next()}", "email": f"bench{ctx.counter}@example.com", "password": "benchpass"}}),
+    Scenario("GET", "/metrics/hash-pool", lambda ctx, rng, i: {"url": "/metrics/hash-pool"}, auth=True),
+    Scenario("GET", "/metrics", lambda ctx, rng, i: {"url": "/metrics"}),
+    Scenario("GET", "/users/me", lambda ctx, rng, i: {"url": "/users/me"}, auth=True),
+    Scenario("GET", "/tournaments/", lambda ctx, rng, i: {"url": "/tournaments/", "params": {
+        "limit": 100, "skip": rng.randrange(0, ctx.sizes["tournaments"] - 100)}}),
+    Scenario("GET", "/search", lambda ctx, rng, i: {"url": "/search", "params": {
+        "q": f"{rng.choice(WORDS)} {rng.choice(WORDS)[:3]}"}}),
+    Scenario("GET", "/tournaments/{tournament_id}", lambda ctx, rng, i: {
+        "url": f"/tournaments/{any_id('tournaments')(ctx, rng)}"}),
+    Scenario("GET", "/tournaments/{tournament_id}/full", lambda ctx, rng, i: {
+        "url": f"/tournaments/{any_id('tournaments')(ctx, rng)}/full"}),
+    Scenario("GET", "/tournaments/{tournament_id}/standings", lambda ctx, rng, i: {
+        "url": f"/tournaments/{any_id('tournaments')(ctx, rng)}/standings"}),
+    Scenario("GET", "/tournaments/{tournament_id}/participants", lambda ctx, rng, i: {
+        "url": f"/tournaments/{any_id('tournaments')(ctx, rng)}/participants"}),
+    Scenario("GET", "/participations/", lambda ctx, rng, i: {"url": "/participations/", "params": {
+        "tournament_id": [any_id('tournaments')(ctx, rng) for _ in range(10)]}}),
+    Scenario("GET", "/teams/", lambda ctx, rng, i: {"url": "/teams/", "params": {
+        "limit": 100, "skip": rng.randrange(0, ctx.sizes["teams"] - 100)}}),
+    Scenario("POST", "/tournaments/", lambda ctx, rng, i: {"url": "/tournaments/", "json": {
+        "name": f"Bench Cup {ctx.next()}", "game": "CS:GO", "description": "benchmark"}},
+        auth=True, on_response=_created),
+    Scenario("PUT", "/tournaments/{tournament_id}", lambda ctx, rng, i: {
+        "url": f"/tournaments/{rng.choice(ctx.played)}",
+        "json": {"name": f"Renamed {ctx.next()}", "game": "CS:GO"}}, auth=True),
+    Scenario("POST", "/teams/", lambda ctx, rng, i: {"url": "/teams/", "json": {
+        "name": f"Bench Team {ctx.next()}", "tag": f"B{ctx.counter}"}}, auth=True),
+    Scenario("POST", "/participations/", _register_one, auth=True, on_response=_entered),
+    Scenario("DELETE", "/tournaments/{tournament_id}/participants/{team_id}", _withdraw, auth=True),
+    Scenario("POST", "/participations/batch", _register_batch, auth=True, on_response=_registered),
+    Scenario("POST", "/tournaments/{tournament_id}/bracket", _bracket, auth=True, on_response=_bracketed),
+    Scenario("POST", "/matches/", _create_match, auth=True),
+    Scenario("PUT", "/matches/{match_id}/score", _score, auth=True),
+    Scenario("PUT", "/matches/scores", _scores, auth=True),
+    Scenario("POST", "/tournaments/{tournament_id}/standings/rebuild", lambda ctx, rng, i: {
+        "url": f"/tournaments/{rng.choice(ctx.played)}/standings/rebuild"}, auth=True),
+    Scenario("GET", "/leaderboard", lambda ctx, rng, i: {"url": "/leaderboard", "params": {
+        "limit": 50, "skip": rng.randrange(0, 1000)}}),
+    Scenario("POST", "/ratings/recompute", lambda ctx, rng, i: {"url": "/ratings/recompute"},
+             auth=True, max_requests=2),
+    Scenario("DELETE", "/tournaments/{tournament_id}", _delete, auth=True),
+    Scenario("POST", "/import/{kind}", _import_teams, auth=True),
+    Scenario("GET", "/export/{kind}", lambda ctx, rng, i: {"url": "/export/tournaments"}, auth=True),
+    # Submitting only; the jobs themselves run beside the rest of the suite
+    Scenario("POST", "/export/{kind}", lambda ctx, rng, i: {"url": "/export/tournaments"},
+             auth=True, on_response=_queued, max_requests=5),
+    Scenario("POST", "/standings/rebuild", lambda ctx, rng, i: {"url": "/standings/rebuild"},
+             auth=True, on_response=_queued, max_requests=2),
+    # A sweep that finds nothing that old, so the other scenarios keep their tournaments
+    Scenario("POST", "/archive", lambda ctx, rng, i: {"url": "/archive", "params": {"older_than_days": 36500}},
+             auth=True, on_response=_queued, max_requests=2),
+    Scenario("GET", "/jobs", lambda ctx, rng, i: {"url": "/jobs"}, auth=True),
+    Scenario("GET", "/jobs/{job_id}", lambda ctx, rng, i: {
+        "url": f"/jobs/{rng.choice(ctx.jobs)}"} if ctx.jobs else None, auth=True),
+]
+
+def check_coverage(app) -> list:
+    """Routes in main.py with neither a scenario nor a reason to skip."""
+    from fastapi.routing import APIRoute
+    covered = {(s.method, s.path) for s in SCENARIOS} | set(SKIPPED)
+    return sorted(
+        (method, route.path)
+        for route in app.routes if isinstance(route, APIRoute) and not route.path.startswith("/_bench")
+        for method in route.methods
+        if (method, route.path) not in covered
+    )
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(int(len(sorted_values) * p), len(sorted_values) - 1)] * 1000, 3)
+
+async def statement_count(client) -> int:
+    return (await client.get("/_bench/statements")).json()["statements"]
+
+async def run_scenario(client, ctx: Context, scenario: Scenario, requests: int, concurrency: int, seed: int):
+    rng = random.Random(f"{seed}:{scenario.method}:{scenario.path}:{concurrency}")
+    headers = {"Authorization": f"Bearer {ctx.token}"} if scenario.auth else {}
+    latencies, errors, issued = [], 0, 0
+    exhausted = False
+    requests = min(requests, scenario.max_requests or requests)
+
+    async def worker():
+        nonlocal errors, issued, exhausted
+        while issued < requests and not exhausted:
+            kwargs = scenario.build(ctx, rng, issued)
+            if kwargs is None:
+                exhausted = True
+                return
+            issued += 1
+            sent = time.perf_counter()
+            response = await client.request(scenario.method, headers=headers, **kwargs)
+            latencies.append(time.perf_counter() - sent)
+            if response.status_code >= 400:
+                errors += 1
+            if scenario.on_response:
+                scenario.on_response(ctx, kwargs, response)
+
+    before = await statement_count(client)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    statements = await statement_count(client) - before
+
+    latencies.sort()
+    done = len(latencies)
+    return {
+        "method": scenario.method,
+        "route": scenario.path,
+        "concurrency": concurrency,
+        "requests": done,
+        "errors": errors,
+        "throughput_rps": round(done / elapsed, 1) if done else 0,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "statements_per_request": round(statements / done, 2) if done else None,
+    }
+
+async def run_target(client, ctx: Context, target: str, levels: list, requests: int, seed: int, log) -> list:
+    response = await client.post("/token", data={"username": datagen.USERNAME, "password": datagen.PASSWORD})
+    ctx.token = response.json()["access_token"]
+    results = []
+    for scenario in SCENARIOS:
+        for concurrency in levels:
+            result = await run_scenario(client, ctx, scenario, requests, concurrency, seed)
+            result["target"] = target
+            results.append(result)
+            log(f"{target:<8} {scenario.method:<6} {scenario.path:<48} c={concurrency:<4} "
+                f"{result['throughput_rps']:>8} req/s  p95 {result['p95_ms']} ms  "
+                f"{result['statements_per_request']} stmt/req  errors {result['errors']}/{result['requests']}")
+    return results
+
+def dataset(scale: str, seed: int, log) -> str:
+    path = datagen.default_path(scale, seed)
+    if not os.path.exists(path):
+        # In a child process: generating here would import database.py, binding
+        # the app's engines to the default DATABASE_URL before run_asgi sets it
+        log(f"generating {scale} dataset (seed {seed})")
+        subprocess.run([sys.executable, os.path.join(BENCH_DIR, "datagen.py"), "--scale", scale, "--seed", str(seed)],
+                       check=True)
+    return path
+
+def fresh_copy(source: str) -> str:
+    path = os.path.join(tempfile.mkdtemp(prefix="tournament-bench-"), "bench.db")
+    shutil.copy(source, path)
+    return path
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def run_asgi(db_path, scale, levels, requests, seed, log):
+    # The app's engines are created at import; point them at the copy first
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    import instrumented
+    from database import async_engine
+
+    ctx = load_context(db_path, scale)
+    transport = httpx.ASGITransport(app=instrumented.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            return await run_target(client, ctx, "asgi", levels, requests, seed, log)
+    finally:
+        await async_engine.dispose()
+
+async def run_uvicorn(db_path, scale, levels, requests, seed, log):
+    port = free_port()
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "instrumented:app", "--app-dir", BENCH_DIR,
+         "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/metrics")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            ctx = load_context(db_path, scale)
+            return await run_target(client, ctx, "uvicorn", levels, requests, seed, log)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """Regressions against a previous results file: slower p95, lower throughput or more statements."""
+    previous = {(r["target"], r["method"], r["route"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = previous.get((r["target"], r["method"], r["route"], r["concurrency"]))
+        if not old or not r["requests"] or not old["requests"]:
+            continue
+        label = f"{r['target']} {r['method']} {r['route']} c={r['concurrency']}"
+        if r["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {old['p95_ms']} -> {r['p95_ms']} ms")
+        if r["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {old['throughput_rps']} -> {r['throughput_rps']} req/s")
+        if (r["statements_per_request"] or 0) > (old["statements_per_request"] or 0) + 0.01:
+            regressions.append(f"{label}: statements/request {old['statements_per_request']} -> "
+                               f"{r['statements_per_request']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=datagen.SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--targets", default="asgi,uvicorn")
+    parser.add_argument("--concurrency", default="1,10,50")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route and concurrency level")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--baseline", help="results file from a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    targets = args.targets.split(",")
+    log = lambda line: print(line, flush=True)
+    source = dataset(args.scale, args.seed, log)
+
+    results = []
+    if "uvicorn" in targets:
+        results += asyncio.run(run_uvicorn(fresh_copy(source), args.scale, levels, args.requests, args.seed, log))
+    if "asgi" in targets:
+        results += asyncio.run(run_asgi(fresh_copy(source), args.scale, levels, args.requests, args.seed, log))
+
+    import main as api
+    uncovered = check_coverage(api.app)
+    for method, path in uncovered:
+        log(f"warning: no benchmark scenario for {method} {path}")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "scale": args.scale,
+            "sizes": datagen.SCALES[args.scale],
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": levels,
+            "skipped": {f"{m} {p}": reason for (m, p), reason in SKIPPED.items()},
+            "uncovered": [f"{m} {p}" for m, p in uncovered],
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    log(f"wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            log(f"regression: {line}")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
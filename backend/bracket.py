@@ -0,0 +1,361 @@
+"""Bracket generation and winner advancement.
+
+Generators lay out the whole match tree in memory as plain dicts. That
+includes next-match links for winners, and for losers in double elimination.
+`generate_bracket` then writes the tree in one transaction: an executemany
+INSERT for the matches, one SELECT to read their ids back, and an executemany
+UPDATE that links them.
+"""
+import math
+from typing import List, Optional
+from sqlalchemy import insert, update, select, func
+from sqlalchemy.orm import Session
+import models
+import standings
+
+FORMATS = ("single_elimination", "double_elimination", "round_robin", "swiss")
+
+def seed_order(size: int) -> List[int]:
+    # Standard bracket placement: 1 v size, and top seeds meet as late as possible
+    order = [1, 2]
+    while len(order) < size:
+        order = [s for seed in order for s in (seed, 2 * len(order) + 1 - seed)]
+    return order[:size]
+
+def _add(nodes: list, bracket: str, round_number: int, position: int) -> int:
+    nodes.append({
+        "bracket": bracket,
+        "round": round_number,
+        "position": position,
+        "team1_id": None,
+        "team2_id": None,
+        "next": None,
+        "loser_next": None,
+    })
+    return len(nodes) - 1
+
+def _elimination_tree(team_ids: List[int], nodes: list, bracket: str) -> List[List[int]]:
+    size = 1 << max(1, math.ceil(math.log2(len(team_ids))))
+    seeds = [team_ids[s - 1] if s <= len(team_ids) else None for s in seed_order(size)]
+
+    rounds = []
+    count = size // 2
+    round_number = 1
+    while count >= 1:
+        rounds.append([_add(nodes, bracket, round_number, pos) for pos in range(count)])
+        count //= 2
+        round_number += 1
+
+    for r in range(len(rounds) - 1):
+        for pos, idx in enumerate(rounds[r]):
+            nodes[idx]["next"] = (rounds[r + 1][pos // 2], pos % 2 + 1)
+    for pos, idx in enumerate(rounds[0]):
+        nodes[idx]["team1_id"] = seeds[2 * pos]
+        nodes[idx]["team2_id"] = seeds[2 * pos + 1]
+    return rounds
+
+def single_elimination(team_ids: List[int]) -> list:
+    nodes = []
+    _elimination_tree(team_ids, nodes, "winners")
+    return _collapse_byes(nodes)
+
+def double_elimination(team_ids: List[int]) -> list:
+    nodes = []
+    winners = _elimination_tree(team_ids, nodes, "winners")
+    grand_final = _add(nodes, "grand_final", len(winners) + 1, 0)
+    nodes[winners[-1][0]]["next"] = (grand_final, 1)
+
+    if len(winners) == 1:
+        nodes[winners[0][0]]["loser_next"] = (grand_final, 2)
+        return _collapse_byes(nodes)
+
+    # Losers round 1 pairs off the first-round losers; after that rounds
+    # alternate between taking in the next winners-round losers and halving.
+    round_number = 1
+    previous = [_add(nodes, "losers", round_number, pos) for pos in range(len(winners[0]) // 2)]
+    for pos, idx in enumerate(winners[0]):
+        nodes[idx]["loser_next"] = (previous[pos // 2], pos % 2 + 1)
+
+    for r in range(1, len(winners)):
+        round_number += 1
+        drop_in = [_add(nodes, "losers", round_number, pos) for pos in range(len(previous))]
+        for pos, idx in enumerate(previous):
+            nodes[idx]["next"] = (drop_in[pos], 1)
+        for pos, idx in enumerate(winners[r]):
+            # Flip every other round so teams don't meet the same side twice
+            target = drop_in[len(drop_in) - 1 - pos] if r % 2 else drop_in[pos]
+            nodes[idx]["loser_next"] = (target, 2)
+        previous = drop_in
+
+        if len(previous) > 1:
+            round_number += 1
+            merged = [_add(nodes, "losers", round_number, pos) for pos in range(len(previous) // 2)]
+            for pos, idx in enumerate(previous):
+                nodes[idx]["next"] = (merged[pos // 2], pos % 2 + 1)
+            previous = merged
+
+    nodes[previous[0]]["next"] = (grand_final, 2)
+    return _collapse_byes(nodes)
+
+def round_robin(team_ids: List[int]) -> list:
+    # Circle method: fix the first team, rotate the rest one place per round
+    teams = list(team_ids) + ([None] if len(team_ids) % 2 else [])
+    nodes = []
+    for round_number in range(1, len(teams)):
+        position = 0
+        for i in range(len(teams) // 2):
+            team1, team2 = teams[i], teams[-1 - i]
+            if team1 is not None and team2 is not None:
+                idx = _add(nodes, "round_robin", round_number, position)
+                nodes[idx]["team1_id"], nodes[idx]["team2_id"] = team1, team2
+                position += 1
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return nodes
+
+def swiss_rounds(team_count: int) -> int:
+    return max(1, math.ceil(math.log2(team_count)))
+
+def swiss_pairings(team_ids: List[int], round_number: int, wins: dict, opponents: dict, had_bye: set) -> list:
+    ranked = sorted(team_ids, key=lambda team_id: -wins.get(team_id, 0))  # stable: ties keep seed order
+    nodes = []
+
+    if len(ranked) % 2:
+        bye = next((t for t in reversed(ranked) if t not in had_bye), ranked[-1])
+        ranked.remove(bye)
+        idx = _add(nodes, "swiss", round_number, len(ranked) // 2)
+        nodes[idx].update(team1_id=bye, winner_id=bye, status="completed")
+
+    position = 0
+    while ranked:
+        team1 = ranked.pop(0)
+        team2 = next((t for t in ranked if t not in opponents.get(team1, ())), ranked[0])
+        ranked.remove(team2)
+        idx = _add(nodes, "swiss", round_number, position)
+        nodes[idx]["team1_id"], nodes[idx]["team2_id"] = team1, team2
+        position += 1
+    return nodes
+
+def _collapse_byes(nodes: list) -> list:
+    """Remove matches that can only ever have one team in them.
+
+    A first-round bye leaves a slot with neither a team nor a feeding match.
+    In double elimination that also empties a losers-bracket slot. Such a
+    match is dropped and whatever reaches its live slot is passed straight
+    on to its next match. That repeats until every remaining match has two
+    live slots.
+    """
+    feeders = {}
+    for idx, node in enumerate(nodes):
+        for kind in ("next", "loser_next"):
+            if node[kind] is not None:
+                feeders[node[kind]] = (idx, kind)
+
+    alive = set(range(len(nodes)))
+    changed = True
+    while changed:
+        changed = False
+        for idx in sorted(alive):
+            node = nodes[idx]
+            live = [slot for slot in (1, 2) if node[f"team{slot}_id"] is not None or (idx, slot) in feeders]
+            if len(live) == 2:
+                continue
+
+            alive.discard(idx)
+            changed = True
+            target = node["next"]
+            if target is not None:
+                feeders.pop(target, None)
+            if node["loser_next"] is not None:
+                feeders.pop(node["loser_next"], None)
+
+            if len(live) == 1:
+                slot = live[0]
+                team_id = node[f"team{slot}_id"]
+                if team_id is not None:
+                    if target is not None:
+                        nodes[target[0]][f"team{target[1]}_id"] = team_id
+                else:
+                    source, kind = feeders.pop((idx, slot))
+                    nodes[source][kind] = target
+                    if target is not None:
+                        feeders[target] = (source, kind)
+
+    kept = [idx for idx in range(len(nodes)) if idx in alive]
+    new_index = {old: new for new, old in enumerate(kept)}
+    result = []
+    for old in kept:
+        node = dict(nodes[old])
+        for kind in ("next", "loser_next"):
+            if node[kind] is not None:
+                node[kind] = (new_index[node[kind][0]], node[kind][1])
+        result.append(node)
+    return result
+
+GENERATORS = {
+    "single_elimination": single_elimination,
+    "double_elimination": double_elimination,
+    "round_robin": round_robin,
+}
+
+def insert_nodes(db: Session, tournament_id: int, nodes: list) -> List[int]:
+    if not nodes:
+        return []
+    rows = [{
+        "tournament_id": tournament_id,
+        "bracket": node["bracket"],
+        "round": node["round"],
+        "position": node["position"],
+        "team1_id": node["team1_id"],
+        "team2_id": node["team2_id"],
+        "winner_id": node.get("winner_id"),
+        "status": node.get("status", "scheduled"),
+    } for node in nodes]
+    db.execute(insert(models.Match), rows)
+
+    # (bracket, round, position) is unique within a generated tournament; read
+    # the new ids back in one query rather than paying for ordered RETURNING,
+    # which SQLite can only honour one row per statement
+    rounds = {node["round"] for node in nodes}
+    keyed = {
+        (row.bracket, row.round, row.position): row.id
+        for row in db.execute(
+            select(models.Match.id, models.Match.bracket, models.Match.round, models.Match.position).where(
+                models.Match.tournament_id == tournament_id,
+                models.Match.round.in_(rounds),
+            )
+        )
+    }
+    ids = [keyed[(node["bracket"], node["round"], node["position"])] for node in nodes]
+
+    links = []
+    for node, match_id in zip(nodes, ids):
+        if node["next"] is None and node["loser_next"] is None:
+            continue
+        link = {"id": match_id, "next_match_id": None, "next_match_slot": None,
+                "loser_next_match_id": None, "loser_next_match_slot": None}
+        if node["next"] is not None:
+            link["next_match_id"] = ids[node["next"][0]]
+            link["next_match_slot"] = node["next"][1]
+        if node["loser_next"] is not None:
+            link["loser_next_match_id"] = ids[node["loser_next"][0]]
+            link["loser_next_match_slot"] = node["loser_next"][1]
+        links.append(link)
+    if links:
+        db.execute(update(models.Match), links)
+    return ids
+
+def seeded_team_ids(db: Session, tournament_id: int) -> List[int]:
+    return db.execute(
+        select(models.Participation.team_id)
+        .where(models.Participation.tournament_id == tournament_id, models.Participation.status == "registered")
+        .order_by(models.Participation.registered_at, models.Participation.id)
+    ).scalars().all()
+
+def generate_bracket(db: Session, tournament: models.Tournament, bracket_format: str) -> List[int]:
+    """Create every match for the tournament; returns match ids. The caller commits."""
+    if bracket_format not in FORMATS:
+        raise ValueError(f"Unknown bracket format: {bracket_format}")
+    team_ids = seeded_team_ids(db, tournament.id)
+    if len(team_ids) < 2:
+        raise ValueError("At least two registered teams are needed")
+
+    tournament.bracket_format = bracket_format
+    if bracket_format == "swiss":
+        return _insert_swiss_round(db, tournament.id, swiss_pairings(team_ids, 1, {}, {}, set()))
+    return insert_nodes(db, tournament.id, GENERATORS[bracket_format](team_ids))
+
+def _insert_swiss_round(db: Session, tournament_id: int, nodes: list) -> List[int]:
+    ids = insert_nodes(db, tournament_id, nodes)
+    # A bye is created already won, with no score update to credit it in the standings
+    for node in nodes:
+        if node.get("status") == "completed":
+            standings.apply_match_delta(db, None, (tournament_id, node["team1_id"], None, 0, 0,
+                                                   node["winner_id"], "completed"))
+    return ids
+
+def _next_swiss_round(db: Session, match: models.Match):
+    open_matches = db.execute(
+        select(func.count(models.Match.id)).where(
+            models.Match.tournament_id == match.tournament_id,
+            models.Match.round == match.round,
+            models.Match.status != "completed",
+        )
+    ).scalar()
+    if open_matches:
+        return
+
+    team_ids = seeded_team_ids(db, match.tournament_id)
+    next_round = match.round + 1
+    already_paired = db.execute(
+        select(models.Match.id).where(
+            models.Match.tournament_id == match.tournament_id,
+            models.Match.round == next_round,
+        ).limit(1)
+    ).first()
+    if next_round > swiss_rounds(len(team_ids)) or already_paired:
+        return
+
+    wins, opponents, had_bye = {}, {}, set()
+    played = db.execute(
+        select(models.Match.team1_id, models.Match.team2_id, models.Match.winner_id)
+        .where(models.Match.tournament_id == match.tournament_id)
+    ).all()
+    for team1_id, team2_id, winner_id in played:
+        if winner_id is not None:
+            wins[winner_id] = wins.get(winner_id, 0) + 1
+        if team2_id is None:
+            had_bye.add(team1_id)
+            continue
+        opponents.setdefault(team1_id, set()).add(team2_id)
+        opponents.setdefault(team2_id, set()).add(team1_id)
+
+    _insert_swiss_round(db, match.tournament_id, swiss_pairings(team_ids, next_round, wins, opponents, had_bye))
+
+def downstream_started(db: Session, match: models.Match) -> bool:
+    """Whether a match this one's result was fed into is already under way.
+
+    Its result can't change after that: the team that moved on has played
+    (or, in Swiss, been paired) on the strength of it.
+    """
+    if match.bracket == "swiss":
+        return db.execute(
+            select(models.Match.id).where(
+                models.Match.tournament_id == match.tournament_id,
+                models.Match.round > match.round,
+            ).limit(1)
+        ).first() is not None
+    # Through the session, so changes a batch hasn't flushed yet count too
+    return any(
+        db.get(models.Match, match_id).status != "scheduled"
+        for match_id in (match.next_match_id, match.loser_next_match_id) if match_id is not None
+    )
+
+def advance_match(db: Session, match: models.Match, previous_winner_id: Optional[int] = None):
+    """Move the winner (and loser) of a completed match into their next matches.
+
+    A corrected result replaces the teams sent on before, or takes them back
+    out when the match no longer has a winner. Callers check
+    downstream_started first.
+    """
+    if match.winner_id == previous_winner_id:
+        return
+
+    winner_id = match.winner_id if match.status == "completed" else None
+    loser_id = None
+    if winner_id is not None:
+        loser_id = match.team2_id if winner_id == match.team1_id else match.team1_id
+    if match.next_match_id is not None:
+        db.execute(
+            update(models.Match)
+            .where(models.Match.id == match.next_match_id)
+            .values({f"team{match.next_match_slot}_id": winner_id})
+        )
+    if match.loser_next_match_id is not None and (loser_id is not None or previous_winner_id is not None):
+        db.execute(
+            update(models.Match)
+            .where(models.Match.id == match.loser_next_match_id)
+            .values({f"team{match.loser_next_match_slot}_id": loser_id})
+        )
+    if match.bracket == "swiss" and winner_id is not None:
+        db.flush()
+        _next_swiss_round(db, match)
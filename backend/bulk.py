@@ -0,0 +1,365 @@
+"""Streaming bulk import and export of tournaments, teams and results.
+
+Imports read NDJSON (one object per line) or CSV (header row first) one
+line at a time. Each record is validated with the schema the single-row
+endpoint uses. Records are inserted CHUNK_SIZE at a time, with executemany
+and one transaction per chunk, so memory stays flat whatever the input
+size. Each chunk also updates the search index, version counters and
+standings, the same as crud does for a single write. Invalid records are
+skipped and reported by line number, and committed chunks stay committed.
+
+Imported rows always get new ids. Results refer to existing tournaments
+and teams by id; their winner and status follow from the scores. They
+are rated in file order on top of the current ratings; after importing
+history out of order, run `python ratings.py` to replay it by date.
+
+Exports stream rows off a server-side cursor (yield_per), one partition
+at a time, so a full dump is never held in memory.
+
+    python bulk.py import teams teams.csv --format csv
+    python bulk.py import tournaments cups.ndjson --organizer alice
+    python bulk.py export results > results.ndjson
+"""
+import argparse
+import codecs
+import csv
+import io
+import json
+import sys
+from typing import AsyncIterator, Iterable, Iterator, Optional
+from pydantic import ValidationError
+from sqlalchemy import select, insert, null
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+import models
+import ratings
+import schemas
+import search
+import serialization
+import standings
+import versions
+
+CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# kind -> (model, schema a record is validated with, schema an exported row has)
+KINDS = {
+    "tournaments": (models.Tournament, schemas.TournamentCreate, schemas.Tournament),
+    "teams": (models.Team, schemas.TeamCreate, schemas.Team),
+    "results": (models.Match, schemas.MatchCreate, schemas.Match),
+}
+
+# Parsing
+class RecordParser:
+    """Turns input lines, fed one at a time, into (line number, record or error message)."""
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.line_no = 0
+        self.header = None
+        self.pending = []
+        self.start = 0
+
+    def feed(self, line: str) -> Optional[tuple]:
+        self.line_no += 1
+        if self.fmt == "ndjson":
+            return self._json(line)
+        # A quoted CSV field may contain newlines; collect lines until the quotes balance
+        if not self.pending:
+            self.start = self.line_no
+        self.pending.append(line)
+        if sum(part.count('"') for part in self.pending) % 2:
+            return None
+        text, self.pending = "".join(self.pending), []
+        return self._csv(text)
+
+    def close(self) -> Optional[tuple]:
+        if self.pending:
+            return (self.start, "Unterminated quoted field")
+        return None
+
+    def _json(self, line: str):
+        if not line.strip():
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            return (self.line_no, f"Invalid JSON: {e}")
+        if not isinstance(record, dict):
+            return (self.line_no, "Expected a JSON object")
+        return (self.line_no, record)
+
+    def _csv(self, text: str):
+        values = next(csv.reader([text]), [])
+        if not any(values):
+            return None
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None
+        if len(values) != len(self.header):
+            return (self.start, f"Expected {len(self.header)} fields, got {len(values)}")
+        # Empty cells fall back to the schema's defaults
+        return (self.start, {name: value for name, value in zip(self.header, values) if value != ""})
+
+def parse(lines: Iterable[str], fmt: str) -> Iterator[tuple]:
+    parser = RecordParser(fmt)
+    for line in lines:
+        item = parser.feed(line)
+        if item is not None:
+            yield item
+    item = parser.close()
+    if item is not None:
+        yield item
+
+async def aparse(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[tuple]:
+    """parse() over a byte stream such as a request body."""
+    parser = RecordParser(fmt)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            item = parser.feed(line + "\n")
+            if item is not None:
+                yield item
+    buffer += decoder.decode(b"", final=True)
+    for item in (parser.feed(buffer) if buffer else None, parser.close()):
+        if item is not None:
+            yield item
+
+# Import
+def new_report(kind: str) -> dict:
+    return {"kind": kind, "imported": 0, "failed": 0, "errors": []}
+
+def _fail(report: dict, line: int, detail: str):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line, "detail": detail})
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+def _validate(kind: str, items: list, report: dict) -> list:
+    schema = KINDS[kind][1]
+    valid = []
+    for line, record in items:
+        if isinstance(record, str):
+            _fail(report, line, record)
+            continue
+        try:
+            valid.append((line, schema(**record)))
+        except ValidationError as e:
+            _fail(report, line, _describe(e))
+    return valid
+
+def _insert_teams(db: Session, valid: list, report: dict, organizer_id, check_organizer):
+    # Names and tags are unique; skip clashes with stored teams or earlier records
+    names = {item.name for _, item in valid}
+    tags = {item.tag for _, item in valid if item.tag}
+    taken_names = {row.name for row in db.query(models.Team.name).filter(models.Team.name.in_(names))}
+    taken_tags = {row.tag for row in db.query(models.Team.tag).filter(models.Team.tag.in_(tags))}
+
+    rows = []
+    for line, item in valid:
+        if item.name in taken_names:
+            _fail(report, line, "Team name already exists")
+        elif item.tag and item.tag in taken_tags:
+            _fail(report, line, "Team tag already exists")
+        else:
+            taken_names.add(item.name)
+            taken_tags.add(item.tag)
+            rows.append(item.dict())
+    if not rows:
+        return 0
+
+    # RETURNING the indexed columns too: rows come back unordered, in batched multi-row INSERTs
+    created = db.execute(
+        insert(models.Team).returning(models.Team.id, models.Team.name, models.Team.tag, models.Team.description),
+        rows,
+    ).all()
+    search.index_many(db, "team", created)
+    versions.bump(db, versions.TEAMS, versions.RATINGS)  # new teams enter the leaderboard
+    return len(rows)
+
+def _insert_tournaments(db: Session, valid: list, report: dict, organizer_id, check_organizer):
+    rows = [{**item.dict(), "organizer_id": organizer_id} for _, item in valid]
+    created = db.execute(
+        insert(models.Tournament).returning(models.Tournament.id, models.Tournament.name,
+                                            null(), models.Tournament.description),
+        rows,
+    ).all()
+    search.index_many(db, "tournament", created)
+    versions.bump(db, versions.TOURNAMENTS, *(versions.tournament(row.id) for row in created))
+    return len(rows)
+
+def _insert_results(db: Session, valid: list, report: dict, organizer_id, check_organizer):
+    tournament_ids = {item.tournament_id for _, item in valid}
+    team_ids = {t for _, item in valid for t in (item.team1_id, item.team2_id)}
+    organizers = dict(
+        db.query(models.Tournament.id, models.Tournament.organizer_id)
+        .filter(models.Tournament.id.in_(tournament_ids))
+    )
+    known_teams = {row.id for row in db.query(models.Team.id).filter(models.Team.id.in_(team_ids))}
+
+    rows = []
+    for line, item in valid:
+        if item.tournament_id not in organizers:
+            _fail(report, line, "Tournament not found")
+        elif check_organizer and organizers[item.tournament_id] != organizer_id:
+            _fail(report, line, "Not authorized")
+        elif item.team1_id not in known_teams or item.team2_id not in known_teams:
+            _fail(report, line, "Team not found")
+        elif item.team1_id == item.team2_id:
+            _fail(report, line, "A team cannot play itself")
+        else:
+            winner_id = (item.team1_id if item.score1 > item.score2
+                         else item.team2_id if item.score2 > item.score1 else None)
+            status = "completed" if winner_id else "ongoing" if item.score1 or item.score2 else "scheduled"
+            rows.append({**item.dict(), "winner_id": winner_id, "status": status})
+
+    if rows:
+        if ratings.rate_rows(db, rows):
+            versions.bump(db, versions.RATINGS)
+        db.execute(insert(models.Match), rows)
+        standings.add(db, standings.tally(
+            (r["tournament_id"], r["team1_id"], r["team2_id"], r["score1"], r["score2"], r["winner_id"], r["status"])
+            for r in rows
+        ))
+    return len(rows)
+
+INSERTERS = {"tournaments": _insert_tournaments, "teams": _insert_teams, "results": _insert_results}
+
+def import_chunk(db: Session, kind: str, items: list, report: dict,
+                 organizer_id: Optional[int] = None, check_organizer: bool = True):
+    """Validate and insert one chunk of (line, record) items in its own transaction.
+
+    Imported tournaments are organized by organizer_id. Results are only
+    accepted for tournaments it organizes, unless check_organizer is off.
+    """
+    valid = _validate(kind, items, report)
+    if not valid:
+        return
+    try:
+        imported = INSERTERS[kind](db, valid, report, organizer_id, check_organizer)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        for line, _ in valid:
+            _fail(report, line, f"Rejected by the database: {e.__class__.__name__}")
+        return
+    report["imported"] += imported
+
+def import_lines(db: Session, kind: str, lines: Iterable[str], fmt: str = "ndjson",
+                 organizer_id: Optional[int] = None, check_organizer: bool = True) -> dict:
+    report, chunk = new_report(kind), []
+    for item in parse(lines, fmt):
+        chunk.append(item)
+        if len(chunk) >= CHUNK_SIZE:
+            import_chunk(db, kind, chunk, report, organizer_id, check_organizer)
+            chunk = []
+    if chunk:
+        import_chunk(db, kind, chunk, report, organizer_id, check_organizer)
+    return report
+
+async def import_stream(db: Session, kind: str, chunks: AsyncIterator[bytes], fmt: str = "ndjson",
+                        organizer_id: Optional[int] = None) -> dict:
+    """import_lines() over a request body; inserts run in the threadpool, parsing doesn't block on them."""
+    report, chunk = new_report(kind), []
+    async for item in aparse(chunks, fmt):
+        chunk.append(item)
+        if len(chunk) >= CHUNK_SIZE:
+            await run_in_threadpool(import_chunk, db, kind, chunk, report, organizer_id)
+            chunk = []
+    if chunk:
+        await run_in_threadpool(import_chunk, db, kind, chunk, report, organizer_id)
+    return report
+
+# Export
+def export_query(kind: str):
+    model, _, schema = KINDS[kind]
+    return (
+        select(*serialization.columns(model, schema))
+        .order_by(model.id)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+def header(kind: str, fmt: str) -> bytes:
+    if fmt != "csv":
+        return b""
+    out = io.StringIO()
+    csv.writer(out).writerow(KINDS[kind][2].model_fields)
+    return out.getvalue().encode()
+
+def encode(rows, fmt: str) -> bytes:
+    if fmt == "ndjson":
+        return b"".join(serialization.dumps(row._asdict()) + b"\n" for row in rows)
+    out = io.StringIO()
+    csv.writer(out).writerows([_csv_value(value) for value in row] for row in rows)
+    return out.getvalue().encode()
+
+def export_lines(db: Session, kind: str, fmt: str = "ndjson") -> Iterator[bytes]:
+    yield header(kind, fmt)
+    for partition in db.execute(export_query(kind)).partitions():
+        yield encode(partition, fmt)
+
+async def export_stream(db: AsyncSession, kind: str, fmt: str = "ndjson") -> AsyncIterator[bytes]:
+    yield header(kind, fmt)
+    result = await db.stream(export_query(kind))
+    async for partition in result.partitions():
+        yield encode(partition, fmt)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import or export tournaments, teams and results.")
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("file", nargs="?", default="-", help="input or output file, - for stdin/stdout")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension, else ndjson")
+    parser.add_argument("--organizer", help="username that organizes imported tournaments")
+    args = parser.parse_args()
+    fmt = args.format or ("csv" if args.file.endswith(".csv") else "ndjson")
+
+    from database import SessionLocal, engine
+    import migrations
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        if args.action == "export":
+            out = sys.stdout.buffer if args.file == "-" else open(args.file, "wb")
+            with out:
+                for data in export_lines(db, args.kind, fmt):
+                    out.write(data)
+            return
+
+        organizer_id = None
+        if args.organizer:
+            organizer = db.query(models.User).filter(models.User.username == args.organizer).first()
+            if organizer is None:
+                parser.error(f"no user named {args.organizer}")
+            organizer_id = organizer.id
+        elif args.kind == "tournaments":
+            parser.error("--organizer is required to import tournaments")
+
+        source = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8-sig", newline="")
+        with source:
+            # From the command line results may go into any tournament
+            report = import_lines(db, args.kind, source, fmt, organizer_id, check_organizer=False)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import or_, tuple_, insert, update, delete, select
+from sqlalchemy.exc import IntegrityError
 import models
 import schemas
-from auth import get_password_hash, verify_password
+import bracket
+import standings
+import ratings
+import live
+import versions
+import search
+from auth import get_password_hash, verify_password, invalidate_cached_user
 from typing import Optional, List
 
 # User CRUD
@@ -19,6 +26,12 @@ def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
 def create_user(db: Session, user: schemas.UserCreate):
+    """Insert a user; raises ValueError if the username or email is taken.
+
+    The unique constraints decide, not a lookup beforehand, so two concurrent
+    registrations can't both pass. Only a conflict pays for the SELECT that
+    tells the caller which field clashed.
+    """
     hashed_password = get_password_hash(user.password)
     db_user = models.User(
         username=user.username,
@@ -27,10 +40,32 @@ def create_user(db: Session, user: schemas.UserCreate):
         full_name=user.full_name
     )
     db.add(db_user)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        if get_user_by_username(db, user.username):
+            raise ValueError("Username already registered")
+        raise ValueError("Email already registered")
+    return db_user
+
+def update_user(db: Session, user_id: int, user_update: dict):
+    db_user = get_user(db, user_id)
+    if not db_user:
+        return None
+
+    previous_username = db_user.username
+    for key, value in user_update.items():
+        setattr(db_user, key, value)
+
     db.commit()
-    db.refresh(db_user)
+    invalidate_cached_user(previous_username)
+    invalidate_cached_user(db_user.username)
     return db_user
 
+def deactivate_user(db: Session, user_id: int):
+    return update_user(db, user_id, {"is_active": False})
+
 def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
@@ -41,37 +76,56 @@ def authenticate_user(db: Session, username: str, password: str):
 
 # Tournament CRUD
 def get_tournament(db: Session, tournament_id: int):
-    return db.query(models.Tournament).filter(models.Tournament.id == tournament_id).first()
+    # Identity map first: a route that already loaded it doesn't query again
+    return db.get(models.Tournament, tournament_id)
 
-def get_tournaments(db: Session, skip: int = 0, limit: int = 100, game: Optional[str] = None):
+def get_tournaments(db: Session, skip: int = 0, limit: int = 100, game: Optional[str] = None, after=None):
     query = db.query(models.Tournament)
     if game:
         query = query.filter(models.Tournament.game == game)
+    query = query.order_by(models.Tournament.created_at, models.Tournament.id)
+    if after is not None:
+        # Keyset page: seek past the last (created_at, id) instead of skipping rows
+        query = query.filter(tuple_(models.Tournament.created_at, models.Tournament.id) > tuple_(*after))
+        return query.limit(limit).all()
     return query.offset(skip).limit(limit).all()
 
 def create_tournament(db: Session, tournament: schemas.TournamentCreate, organizer_id: int):
     db_tournament = models.Tournament(**tournament.dict(), organizer_id=organizer_id)
     db.add(db_tournament)
+    db.flush()
+    search.index_many(db, "tournament", [(db_tournament.id, db_tournament.name, None, db_tournament.description)])
+    versions.bump(db, versions.TOURNAMENTS, versions.tournament(db_tournament.id))
     db.commit()
-    db.refresh(db_tournament)
     return db_tournament
 
-def update_tournament(db: Session, tournament_id: int, tournament_update: dict):
-    db_tournament = get_tournament(db, tournament_id)
+def update_tournament(db: Session, tournament_id: int, tournament_update: dict, organizer_id: Optional[int] = None):
+    """UPDATE .. RETURNING the whole row; None if it doesn't exist or isn't organizer_id's."""
+    stmt = update(models.Tournament).where(models.Tournament.id == tournament_id)
+    if organizer_id is not None:
+        stmt = stmt.where(models.Tournament.organizer_id == organizer_id)
+    db_tournament = db.scalars(stmt.values(**tournament_update).returning(models.Tournament)).first()
     if not db_tournament:
+        db.rollback()
         return None
-    
-    for key, value in tournament_update.items():
-        setattr(db_tournament, key, value)
-    
+
+    if db_tournament.waitlist and db_tournament.registered_count < db_tournament.max_teams:
+        # More seats (or the waitlist was just switched on): move waiting teams up
+        if promote_waitlisted(db, tournament_id):
+            db.refresh(db_tournament)
+            versions.bump(db, versions.participants(tournament_id))
+    search.index_tournament(db, db_tournament)
+    versions.bump(db, versions.TOURNAMENTS, versions.tournament(tournament_id))
     db.commit()
-    db.refresh(db_tournament)
     return db_tournament
 
 def delete_tournament(db: Session, tournament_id: int):
     db_tournament = get_tournament(db, tournament_id)
     if db_tournament:
         db.delete(db_tournament)
+        search.remove(db, "tournament", tournament_id)
+        versions.bump(db, versions.TOURNAMENTS, versions.tournament(tournament_id),
+                      versions.participants(tournament_id))
         db.commit()
     return db_tournament
 
@@ -79,61 +133,363 @@ def delete_tournament(db: Session, tournament_id: int):
 def get_team(db: Session, team_id: int):
     return db.query(models.Team).filter(models.Team.id == team_id).first()
 
-def get_teams(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Team).offset(skip).limit(limit).all()
+def get_teams(db: Session, skip: int = 0, limit: int = 100, after=None):
+    query = db.query(models.Team).order_by(models.Team.created_at, models.Team.id)
+    if after is not None:
+        query = query.filter(tuple_(models.Team.created_at, models.Team.id) > tuple_(*after))
+        return query.limit(limit).all()
+    return query.offset(skip).limit(limit).all()
 
 def create_team(db: Session, team: schemas.TeamCreate):
+    """Insert a team; raises ValueError if the name or tag is taken."""
     db_team = models.Team(**team.dict())
     db.add(db_team)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        if db.query(models.Team.id).filter(models.Team.name == team.name).first():
+            raise ValueError("Team name already exists")
+        raise ValueError("Team tag already exists")
+    search.index_many(db, "team", [(db_team.id, db_team.name, db_team.tag, db_team.description)])
+    versions.bump(db, versions.TEAMS, versions.RATINGS)  # new teams enter the leaderboard
     db.commit()
-    db.refresh(db_team)
     return db_team
 
+# Live events
+def publish_match(db_match: models.Match, action: str):
+    if live.wants(db_match.tournament_id):
+        live.publish(db_match.tournament_id, "match", {
+            "action": action,
+            "match": schemas.Match.model_validate(db_match).model_dump(mode="json"),
+        })
+
+def publish_participation(db_participation: models.Participation):
+    if live.wants(db_participation.tournament_id):
+        live.publish(db_participation.tournament_id, "participation", {
+            "action": "created",
+            "participation": schemas.Participation.model_validate(db_participation).model_dump(mode="json"),
+        })
+
 # Match CRUD
 def get_match(db: Session, match_id: int):
-    return db.query(models.Match).filter(models.Match.id == match_id).first()
+    return db.get(models.Match, match_id)
+
+def get_match_with_organizer(db: Session, match_id: int):
+    """(match, its tournament's organizer_id) in one SELECT, or None."""
+    return (
+        db.query(models.Match, models.Tournament.organizer_id)
+        .join(models.Tournament, models.Tournament.id == models.Match.tournament_id)
+        .filter(models.Match.id == match_id)
+        .first()
+    )
 
 def get_tournament_matches(db: Session, tournament_id: int):
     return db.query(models.Match).filter(models.Match.tournament_id == tournament_id).all()
 
+def tournament_has_matches(db: Session, tournament_id: int):
+    return db.query(models.Match.id).filter(models.Match.tournament_id == tournament_id).first() is not None
+
 def create_match(db: Session, match: schemas.MatchCreate):
     db_match = models.Match(**match.dict())
     db.add(db_match)
     db.commit()
-    db.refresh(db_match)
+    publish_match(db_match, "created")
     return db_match
 
 def update_match_score(db: Session, match_id: int, score1: int, score2: int, winner_id: Optional[int] = None):
     db_match = get_match(db, match_id)
     if not db_match:
         return None
+    if winner_id != db_match.winner_id and db_match.winner_id is not None and bracket.downstream_started(db, db_match):
+        raise ValueError("Next match has already started")
     
+    previous_winner_id = db_match.winner_id
+    previous_state = standings.match_state(db_match)
     db_match.score1 = score1
     db_match.score2 = score2
     db_match.winner_id = winner_id
     db_match.status = "completed" if winner_id else "ongoing"
+    standings.apply_match_delta(db, previous_state, standings.match_state(db_match))
+    if ratings.rate_match(db, db_match, previous_winner_id):
+        versions.bump(db, versions.RATINGS)
+    bracket.advance_match(db, db_match, previous_winner_id)
     
     db.commit()
-    db.refresh(db_match)
+    publish_match(db_match, "updated")
     return db_match
 
+def batch_update_match_scores(db: Session, updates: List[schemas.ScoreUpdate], organizer_id: int):
+    """Apply many score updates in one transaction.
+
+    Each item is checked on its own (match exists, caller organizes its
+    tournament, both teams decided, no Swiss draw); failing items are
+    reported and skipped.
+    Everything that passes is flushed together, which the unit of work turns
+    into a single executemany UPDATE, and committed at once. If the commit
+    fails nothing is applied.
+    """
+    match_ids = {u.match_id for u in updates}
+    matches = {m.id: m for m in db.query(models.Match).filter(models.Match.id.in_(match_ids))}
+    tournament_ids = {m.tournament_id for m in matches.values()}
+    organizers = dict(
+        db.query(models.Tournament.id, models.Tournament.organizer_id)
+        .filter(models.Tournament.id.in_(tournament_ids))
+    )
+    teams = ratings.load_teams(db, (team_id for m in matches.values() for team_id in (m.team1_id, m.team2_id)))
+
+    results, rated = [], False
+    for index, item in enumerate(updates):
+        db_match = matches.get(item.match_id)
+        if db_match is None:
+            results.append({"index": index, "ok": False, "detail": "Match not found"})
+            continue
+        if organizers.get(db_match.tournament_id) != organizer_id:
+            results.append({"index": index, "ok": False, "detail": "Not authorized"})
+            continue
+        if db_match.team1_id is None or db_match.team2_id is None:
+            results.append({"index": index, "ok": False, "detail": "Match teams are not decided yet"})
+            continue
+
+        winner_id = db_match.team1_id if item.score1 > item.score2 else db_match.team2_id if item.score2 > item.score1 else None
+        if winner_id is None and db_match.bracket == "swiss":
+            results.append({"index": index, "ok": False, "detail": "Swiss matches need a winner"})
+            continue
+        if winner_id != db_match.winner_id and db_match.winner_id is not None and bracket.downstream_started(db, db_match):
+            results.append({"index": index, "ok": False, "detail": "Next match has already started"})
+            continue
+
+        previous_winner_id = db_match.winner_id
+        previous_state = standings.match_state(db_match)
+        db_match.score1 = item.score1
+        db_match.score2 = item.score2
+        db_match.winner_id = winner_id
+        db_match.status = "completed" if winner_id else "ongoing"
+        standings.apply_match_delta(db, previous_state, standings.match_state(db_match))
+        rated = ratings.rate_match(db, db_match, previous_winner_id, teams) or rated
+        bracket.advance_match(db, db_match, previous_winner_id)
+        results.append({"index": index, "ok": True, "match": db_match})
+
+    if rated:
+        versions.bump(db, versions.RATINGS)
+    # Bracket advancement updates other matches through the session, so the
+    # loaded ones stay current without reading them back
+    db.commit()
+    for result in results:
+        if result["ok"]:
+            publish_match(result["match"], "updated")
+    return results
+
+def generate_bracket(db: Session, tournament_id: int, bracket_format: str):
+    db_tournament = get_tournament(db, tournament_id)
+    if not db_tournament:
+        return None
+    # Sets bracket_format, committed along with the matches
+    versions.bump(db, versions.TOURNAMENTS, versions.tournament(tournament_id))
+    bracket.generate_bracket(db, db_tournament, bracket_format)
+    # Read back before the commit: one transaction, one connection checkout
+    matches = get_tournament_matches(db, tournament_id)
+    db.commit()
+    if live.wants(tournament_id):
+        live.publish(tournament_id, "bracket", {"action": "generated", "format": bracket_format})
+    return matches
+
+# Standings
+def get_standings(db: Session, tournament_id: int):
+    return standings.get_standings(db, tournament_id)
+
+def rebuild_standings(db: Session, tournament_id: int):
+    changed = standings.rebuild(db, tournament_id)
+    return {"changed": changed, "standings": standings.get_standings(db, tournament_id)}
+
 # Participation CRUD
+def _insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def _claim_seat(db: Session, tournament_id: int) -> bool:
+    """Take a seat by bumping registered_count, only while it's under max_teams.
+
+    A single conditional UPDATE is atomic: on Postgres concurrent claims
+    queue on the row lock and re-check the condition, and on SQLite the
+    write transaction already holds the database lock.
+    """
+    return db.execute(
+        update(models.Tournament)
+        .where(models.Tournament.id == tournament_id, models.Tournament.registered_count < models.Tournament.max_teams)
+        .values(registered_count=models.Tournament.registered_count + 1)
+        .returning(models.Tournament.id)
+        .execution_options(synchronize_session=False)
+    ).first() is not None
+
 def register_team(db: Session, participation: schemas.ParticipationCreate):
-    # Check if team is already registered
-    existing = db.query(models.Participation).filter(
-        models.Participation.tournament_id == participation.tournament_id,
-        models.Participation.team_id == participation.team_id
+    """Register a team, or waitlist it if the tournament is full and keeps a waitlist.
+
+    Returns None if the team is already in the tournament, and raises
+    ValueError if the tournament doesn't exist or is full. The unique
+    (tournament_id, team_id) constraint catches duplicates. On a conflict
+    the whole transaction rolls back, seat claim included.
+    """
+    status = "registered"
+    if not _claim_seat(db, participation.tournament_id):
+        tournament = get_tournament(db, participation.tournament_id)
+        if tournament is None:
+            db.rollback()
+            raise ValueError("Tournament not found")
+        if not tournament.waitlist:
+            already = db.query(models.Participation.id).filter(
+                models.Participation.tournament_id == participation.tournament_id,
+                models.Participation.team_id == participation.team_id,
+            ).first()
+            db.rollback()
+            if already:
+                return None
+            raise ValueError("Tournament is full")
+        status = "waitlisted"
+
+    insert = _insert(db)
+    db_participation = db.scalars(
+        insert(models.Participation)
+        .values(**participation.dict(), status=status)
+        .on_conflict_do_nothing(index_elements=["tournament_id", "team_id"])
+        .returning(models.Participation)
     ).first()
-    
-    if existing:
+    if db_participation is None:
+        db.rollback()
         return None
-    
-    db_participation = models.Participation(**participation.dict())
-    db.add(db_participation)
+
+    keys = [versions.participants(participation.tournament_id)]
+    if status == "registered":
+        # registered_count is part of the tournament's representation
+        keys += [versions.TOURNAMENTS, versions.tournament(participation.tournament_id)]
+    versions.bump(db, *keys)
     db.commit()
-    db.refresh(db_participation)
+    publish_participation(db_participation)
     return db_participation
 
+def promote_waitlisted(db: Session, tournament_id: int) -> int:
+    """Fill free seats from the waitlist, first come first served; returns how many moved up."""
+    free = db.scalar(
+        select(models.Tournament.max_teams - models.Tournament.registered_count)
+        .where(models.Tournament.id == tournament_id)
+        .with_for_update()
+    )
+    if not free or free <= 0:
+        return 0
+    promoted = db.scalars(
+        select(models.Participation.id)
+        .where(models.Participation.tournament_id == tournament_id, models.Participation.status == "waitlisted")
+        .order_by(models.Participation.registered_at, models.Participation.id)
+        .limit(free)
+    ).all()
+    if promoted:
+        db.execute(
+            update(models.Participation).where(models.Participation.id.in_(promoted)).values(status="registered")
+        )
+        db.execute(
+            update(models.Tournament).where(models.Tournament.id == tournament_id)
+            .values(registered_count=models.Tournament.registered_count + len(promoted))
+        )
+    return len(promoted)
+
+def withdraw_team(db: Session, tournament_id: int, team_id: int):
+    """Remove a team from a tournament; a freed seat goes to the waitlist. None if it wasn't in it."""
+    removed = db.execute(
+        delete(models.Participation)
+        .where(models.Participation.tournament_id == tournament_id, models.Participation.team_id == team_id)
+        .returning(models.Participation.status)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if removed is None:
+        db.rollback()
+        return None
+    if removed.status == "registered":
+        db.execute(
+            update(models.Tournament).where(models.Tournament.id == tournament_id)
+            .values(registered_count=models.Tournament.registered_count - 1)
+        )
+        promote_waitlisted(db, tournament_id)
+    versions.bump(db, versions.TOURNAMENTS, versions.tournament(tournament_id), versions.participants(tournament_id))
+    db.commit()
+    if live.wants(tournament_id):
+        live.publish(tournament_id, "participation", {"action": "withdrawn", "team_id": team_id})
+    return removed.status
+
+def batch_register_teams(db: Session, participations: List[schemas.ParticipationCreate]):
+    """Register many teams in one transaction.
+
+    Unknown tournaments or teams and duplicates (already registered, or
+    repeated within the batch) are reported per item and skipped. Teams
+    past a tournament's free seats are waitlisted if it keeps a waitlist
+    and refused otherwise. The rest go in with one executemany INSERT ..
+    RETURNING, followed by one registered_count UPDATE per tournament, and a
+    single commit. The tournaments are read FOR UPDATE, so seats can't be
+    handed out twice.
+    """
+    tournament_ids = {p.tournament_id for p in participations}
+    team_ids = {p.team_id for p in participations}
+    tournaments = {
+        row.id: row for row in db.execute(
+            select(models.Tournament.id, models.Tournament.max_teams, models.Tournament.registered_count,
+                   models.Tournament.waitlist)
+            .where(models.Tournament.id.in_(tournament_ids))
+            .with_for_update()
+        )
+    }
+    known_teams = {row.id for row in db.query(models.Team.id).filter(models.Team.id.in_(team_ids))}
+    registered = set(
+        db.query(models.Participation.tournament_id, models.Participation.team_id).filter(
+            models.Participation.tournament_id.in_(tournament_ids),
+            models.Participation.team_id.in_(team_ids),
+        )
+    )
+    free = {row.id: row.max_teams - row.registered_count for row in tournaments.values()}
+    seated = dict.fromkeys(tournaments, 0)
+
+    results, rows = [], []
+    for index, item in enumerate(participations):
+        key = (item.tournament_id, item.team_id)
+        tournament = tournaments.get(item.tournament_id)
+        if tournament is None:
+            results.append({"index": index, "ok": False, "detail": "Tournament not found"})
+        elif item.team_id not in known_teams:
+            results.append({"index": index, "ok": False, "detail": "Team not found"})
+        elif key in registered:
+            results.append({"index": index, "ok": False, "detail": "Team already registered"})
+        elif seated[tournament.id] >= free[tournament.id] and not tournament.waitlist:
+            results.append({"index": index, "ok": False, "detail": "Tournament is full"})
+        else:
+            registered.add(key)
+            status = "registered" if seated[tournament.id] < free[tournament.id] else "waitlisted"
+            seated[tournament.id] += status == "registered"
+            results.append({"index": index, "ok": True})
+            rows.append({**item.dict(), "status": status})
+
+    if rows:
+        created = {
+            (p.tournament_id, p.team_id): p
+            for p in db.scalars(insert(models.Participation).returning(models.Participation), rows)
+        }
+        filled = [{"id": tournament_id, "registered_count": tournaments[tournament_id].registered_count + count}
+                  for tournament_id, count in seated.items() if count]
+        if filled:
+            db.execute(update(models.Tournament), filled)
+        versions.bump(
+            db, *(versions.participants(row["tournament_id"]) for row in rows),
+            *((versions.TOURNAMENTS,) if filled else ()),
+            *(versions.tournament(row["id"]) for row in filled),
+        )
+    db.commit()
+
+    if rows:
+        for result, row in zip([r for r in results if r["ok"]], rows):
+            result["participation"] = created[(row["tournament_id"], row["team_id"])]
+            publish_participation(result["participation"])
+    return results
+
 def get_tournament_participants(db: Session, tournament_id: int):
     return db.query(models.Participation).filter(
         models.Participation.tournament_id == tournament_id
@@ -1,14 +1,148 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
 
+import metrics
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tournament.db")
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Connection pools. Writes go through the sync engine, reads (the async GET
+# routes and auth) through the async one, so each has its own pool. On
+# SQLite the write pool is always a single connection, see pool_options.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", str(DB_MAX_OVERFLOW)))
+
+# Server databases (Postgres). Connections are replaced before a server or
+# proxy idle timeout can drop them, checked with a ping on checkout, and
+# reused most-recent-first, so surplus ones sit idle long enough to recycle.
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 keeps connections forever
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Server-side limit per statement; 0 turns it off. Background jobs read
+# through their own engine (read_engine), which gets the job limit instead:
+# exports scan whole tables.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_JOB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_JOB_STATEMENT_TIMEOUT_MS", "0"))
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "tournament-api")  # shows in pg_stat_activity
+
+# SQLite profile, applied to every connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))  # per connection
+
+def to_async_url(url: str) -> str:
+    # Same database, async driver: aiosqlite for SQLite, asyncpg for Postgres
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+def sqlite_pragmas(read_only: bool = False) -> list:
+    pragmas = [
+        # WAL lets readers keep reading their snapshot while a write commits
+        "PRAGMA journal_mode=WAL",
+        # Durable at checkpoints rather than at every commit; safe with WAL
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+def configure_sqlite(engine, read_only: bool = False):
+    """Apply the SQLite profile to a (sync) engine's connections.
+
+    Read-only engines refuse writes. Write engines start every transaction
+    with BEGIN IMMEDIATE, taking the database's single write lock up front.
+    Writers then queue on busy_timeout instead of failing with "database is
+    locked" when a read transaction tries to upgrade to a write.
+    """
+    if engine.url.database in (None, "", ":memory:"):
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        if not read_only:
+            # Let SQLAlchemy issue BEGIN itself, below
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas(read_only):
+            cursor.execute(pragma)
+        cursor.close()
+
+    if not read_only:
+        @event.listens_for(engine, "begin")
+        def begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def pool_options(url: str, read: bool = False) -> dict:
+    if url.startswith("sqlite") and not read:
+        # SQLite has one write lock anyway. A single pooled connection makes
+        # writers queue on the pool instead of spinning on busy_timeout.
+        return {"pool_size": 1, "max_overflow": 0, "pool_timeout": DB_POOL_TIMEOUT}
+    return {
+        "pool_size": DB_READ_POOL_SIZE if read else DB_POOL_SIZE,
+        "max_overflow": DB_READ_MAX_OVERFLOW if read else DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+def postgres_connect_args(url: str, statement_timeout_ms: int) -> dict:
+    # asyncpg takes server settings directly; libpq drivers take them as startup options
+    if "+asyncpg" in url:
+        return {"server_settings": {"statement_timeout": str(statement_timeout_ms),
+                                    "application_name": DB_APPLICATION_NAME}}
+    return {"options": f"-c statement_timeout={statement_timeout_ms}", "application_name": DB_APPLICATION_NAME}
+
+def engine_options(url: str, read: bool = False, statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS) -> dict:
+    """Keyword arguments for create_engine / create_async_engine on url."""
+    options = pool_options(url, read)
+    if url.startswith("sqlite"):
+        if "+aiosqlite" in url:
+            # aiosqlite defaults to NullPool, which opens a connection (and its
+            # thread) per session; keep them pooled like the sync engine does
+            options["poolclass"] = AsyncAdaptedQueuePool
+        else:
+            # Sessions are opened in one threadpool thread and can be closed in another
+            options["connect_args"] = {"check_same_thread": False}
+        return options
+    options.update(pool_pre_ping=DB_POOL_PRE_PING, pool_recycle=DB_POOL_RECYCLE, pool_use_lifo=True)
+    if url.startswith("postgresql"):
+        options["connect_args"] = postgres_connect_args(url, statement_timeout_ms)
+    return options
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+# Writes flush every column they change (ids come back via RETURNING), so
+# objects are still current after commit; don't expire them into a reload
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, read=True))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Sync and read-only, for background jobs that scan large tables: reading
+# through the write engine would hold the write lock for the whole scan
+read_engine = create_engine(
+    DATABASE_URL, **engine_options(DATABASE_URL, read=True, statement_timeout_ms=DB_JOB_STATEMENT_TIMEOUT_MS))
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=read_engine)
+
+if engine.dialect.name == "sqlite":
+    configure_sqlite(engine)
+if async_engine.dialect.name == "sqlite":
+    configure_sqlite(async_engine.sync_engine, read_only=True)
+if read_engine.dialect.name == "sqlite":
+    configure_sqlite(read_engine, read_only=True)
+metrics.instrument_engine(engine, "write")
+metrics.instrument_engine(async_engine.sync_engine, "read")
+metrics.instrument_engine(read_engine, "job_read")
 
 Base = declarative_base()
 
@@ -17,4 +151,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,415 @@
+"""Background jobs for operations too slow to run inside a request.
+
+A route submits a job, which is one row in the jobs table, and answers
+202 with it. The runner started with the app claims queued jobs and runs
+them on a process pool (JOB_EXECUTOR=thread for threads), so CPU-bound
+work doesn't take the GIL from the requests this process serves.
+Clients poll GET /jobs/{id} for status and progress.
+
+Each poll first counts queued and running jobs with a plain read, so an
+idle runner never takes the write lock. Claiming then happens in one
+write transaction. It counts running jobs per kind against JOB_LIMITS,
+then moves the oldest eligible queued job to running. Every
+JOB_REAP_SECONDS, while jobs are running, a runner also fails those
+whose worker stopped heartbeating. The
+table is shared, so every API worker can run a runner, and so can a
+standalone `python jobs.py`. Each job still starts once and the limits
+hold across all of them.
+
+A job function takes a JobContext and the job's params and returns a
+JSON-able result. It runs its own short transactions and calls
+ctx.progress between them, never inside one: on SQLite the progress
+write needs the write lock too.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+import models
+
+logger = logging.getLogger(__name__)
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    # "export=4,recompute_ratings=1"
+    pairs = (item.split("=", 1) for item in spec.split(",") if item.strip())
+    return {kind.strip(): int(limit) for kind, limit in pairs}
+
+JOB_RUNNER = os.getenv("JOB_RUNNER", "1") == "1"  # 0: this process only submits; another one runs jobs
+JOB_EXECUTOR = os.getenv("JOB_EXECUTOR", "process")  # process, thread
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # jobs one runner runs at a time
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+JOB_REAP_SECONDS = float(os.getenv("JOB_REAP_SECONDS", "30"))  # how often a runner looks for stale jobs
+JOB_PROGRESS_SECONDS = float(os.getenv("JOB_PROGRESS_SECONDS", "1"))  # at most one progress write per interval
+JOB_OUTPUT_DIR = os.getenv("JOB_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "tournament-jobs"))
+DEFAULT_LIMIT = 1
+# Running jobs per kind, across every runner
+JOB_LIMITS = {
+    "recompute_ratings": 1,
+    "rebuild_standings": 1,
+    "generate_bracket": 2,
+    "export": 2,
+    "archive_tournaments": 1,
+    **_parse_limits(os.getenv("JOB_LIMITS", "")),
+}
+
+JOB_DURATION = metrics.Histogram(
+    "job_duration_seconds", "Background job run time, claim to finish", ("kind", "status"),
+    (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+
+class JobContext:
+    """What a running job gets besides its params."""
+
+    def __init__(self, job_id: int, sessions, read_sessions):
+        self.job_id = job_id
+        self.sessions = sessions
+        self.read_sessions = read_sessions
+        self._last_progress = 0.0
+
+    def progress(self, done: int, total: Optional[int] = None):
+        now = time.monotonic()
+        if now - self._last_progress < JOB_PROGRESS_SECONDS:
+            return
+        self._last_progress = now
+        with self.sessions() as db:
+            db.execute(
+                update(models.Job).where(models.Job.id == self.job_id)
+                .values(progress=done, total=total, heartbeat_at=datetime.utcnow())
+            )
+            db.commit()
+
+def output_path(job_id: int) -> str:
+    return os.path.join(JOB_OUTPUT_DIR, f"job-{job_id}")
+
+# Job kinds. Imports are local: a pool process only loads what its jobs use.
+def _recompute_ratings(ctx: JobContext):
+    import ratings
+    with ctx.sessions() as db:
+        return ratings.recompute(db, ctx.progress)
+
+def _rebuild_standings(ctx: JobContext, tournament_id: Optional[int] = None):
+    import standings
+    with ctx.sessions() as db:
+        if tournament_id is not None:
+            tournament_ids = [tournament_id]
+        else:
+            tournament_ids = db.scalars(select(models.Tournament.id).order_by(models.Tournament.id)).all()
+            db.rollback()
+        changed = 0
+        for done, one in enumerate(tournament_ids, 1):
+            changed += standings.rebuild(db, one)  # commits
+            ctx.progress(done, len(tournament_ids))
+    return {"tournaments": len(tournament_ids), "changed": changed}
+
+def _generate_bracket(ctx: JobContext, tournament_id: int, bracket_format: str):
+    import crud
+    with ctx.sessions() as db:
+        # Checked when submitted too, but another job may have got there first.
+        # The row lock serializes bracket jobs on Postgres; SQLite's write lock already does.
+        db.get(models.Tournament, tournament_id, with_for_update=True)
+        if crud.tournament_has_matches(db, tournament_id):
+            raise ValueError("Bracket already generated")
+        # Live events only reach spectators from a thread runner; a pool
+        # process has no hub of its own
+        matches = crud.generate_bracket(db, tournament_id, bracket_format)
+        if matches is None:
+            raise ValueError("Tournament not found")
+    return {"matches": len(matches)}
+
+def _archive_tournaments(ctx: JobContext, older_than_days: Optional[int] = None):
+    import archive
+    with ctx.sessions() as db:
+        return archive.run(db, older_than_days, ctx.progress)
+
+def _export(ctx: JobContext, kind: str, format: str):
+    import bulk
+    os.makedirs(JOB_OUTPUT_DIR, exist_ok=True)
+    path, rows = output_path(ctx.job_id), 0
+    with ctx.read_sessions() as db, open(path + ".partial", "wb") as out:
+        out.write(bulk.header(kind, format))
+        for partition in db.execute(bulk.export_query(kind)).partitions():
+            out.write(bulk.encode(partition, format))
+            rows += len(partition)
+            ctx.progress(rows)
+    os.replace(path + ".partial", path)
+    return {"rows": rows, "filename": f"{kind}.{format}", "media_type": bulk.MEDIA_TYPES[format]}
+
+KINDS = {
+    "recompute_ratings": _recompute_ratings,
+    "rebuild_standings": _rebuild_standings,
+    "generate_bracket": _generate_bracket,
+    "export": _export,
+    "archive_tournaments": _archive_tournaments,
+}
+
+# Queue
+def submit(db: Session, kind: str, params: dict, user_id: Optional[int] = None) -> models.Job:
+    """Queue a job; commits, and wakes this process's runner."""
+    job = models.Job(kind=kind, params=params, status="queued", progress=0, created_by=user_id)
+    db.add(job)
+    db.commit()
+    runner.wake()
+    return job
+
+def pending(db: Session) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Queued and running job counts by kind.
+
+    A plain read: runners check it first, so an idle one never takes the
+    write lock.
+    """
+    counts = db.execute(
+        select(models.Job.status, models.Job.kind, func.count())
+        .where(models.Job.status.in_(("queued", "running")))
+        .group_by(models.Job.status, models.Job.kind)
+    ).all()
+    db.rollback()
+    queued = {kind: count for status, kind, count in counts if status == "queued"}
+    running = {kind: count for status, kind, count in counts if status == "running"}
+    return queued, running
+
+def claimable(queued: Dict[str, int], running: Dict[str, int]) -> bool:
+    return any(kind in KINDS and running.get(kind, 0) < JOB_LIMITS.get(kind, DEFAULT_LIMIT) for kind in queued)
+
+def reap_stale(db: Session) -> int:
+    """Fail running jobs whose worker stopped beating; commits."""
+    now = datetime.utcnow()
+    reaped = db.execute(
+        update(models.Job)
+        .where(models.Job.status == "running",
+               models.Job.heartbeat_at < now - timedelta(seconds=JOB_STALE_SECONDS))
+        .values(status="failed", error="Worker stopped while the job was running", finished_at=now)
+    ).rowcount
+    db.commit()
+    return reaped
+
+def claim(db: Session) -> Optional[models.Job]:
+    """Start the oldest queued job whose kind is under its limit; commits."""
+    now = datetime.utcnow()
+    running = dict(db.execute(
+        select(models.Job.kind, func.count()).where(models.Job.status == "running").group_by(models.Job.kind)
+    ).all())
+    full = [kind for kind in KINDS if running.get(kind, 0) >= JOB_LIMITS.get(kind, DEFAULT_LIMIT)]
+    # On SQLite the transaction holds the write lock, so runners claim one at
+    # a time. On Postgres SKIP LOCKED keeps two from claiming the same job,
+    # though both may count under a limit at once and briefly exceed it.
+    query = (
+        select(models.Job).where(models.Job.status == "queued", models.Job.kind.in_(list(KINDS)))
+        .order_by(models.Job.id).limit(1).with_for_update(skip_locked=True)
+    )
+    if full:
+        query = query.where(models.Job.kind.not_in(full))
+    job = db.scalars(query).first()
+    if job is not None:
+        job.status = "running"
+        job.started_at = job.heartbeat_at = now
+    db.commit()
+    return job
+
+def finish(sessions, job_id: int, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+    now = datetime.utcnow()
+    values = {"status": status, "result": result, "error": error, "finished_at": now, "heartbeat_at": now}
+    if status == "succeeded":
+        values["progress"] = func.coalesce(models.Job.total, models.Job.progress)
+    with sessions() as db:
+        db.execute(update(models.Job).where(models.Job.id == job_id).values(values))
+        db.commit()
+
+def execute(job_id: int, sessions=None, read_sessions=None) -> str:
+    """Run one claimed job to the end and record how it went; returns its final status.
+
+    Session factories that aren't given (always, in a pool process) are the
+    app's, which connect to DATABASE_URL like the parent's.
+    """
+    if sessions is None:
+        from database import SessionLocal
+        sessions = SessionLocal
+    if read_sessions is None:
+        from database import ReadSessionLocal
+        read_sessions = ReadSessionLocal
+    with sessions() as db:
+        job = db.get(models.Job, job_id)
+        kind, params = job.kind, job.params
+    try:
+        result = KINDS[kind](JobContext(job_id, sessions, read_sessions), **params)
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job_id, kind)
+        finish(sessions, job_id, "failed", error=str(e) or e.__class__.__name__)
+        return "failed"
+    finish(sessions, job_id, "succeeded", result=result)
+    return "succeeded"
+
+# Runner
+class JobRunner:
+    """Claims jobs into a pool of JOB_WORKERS and keeps their heartbeats going."""
+
+    def __init__(self, sessions=None, read_sessions=None, executor: str = JOB_EXECUTOR, workers: int = JOB_WORKERS):
+        # None: the app's session factories (resolved on first use, or in the pool process)
+        self._sessions, self._read_sessions = sessions, read_sessions
+        self.executor_kind = executor
+        self.workers = workers
+        self._executor = None
+        self._running: Dict[int, tuple] = {}  # job id -> (kind, started, future)
+        self._lock = threading.Lock()
+        self._last_heartbeat = self._last_reap = 0.0
+        self._loop = self._wakeup = self._task = None
+
+    @property
+    def sessions(self):
+        if self._sessions is None:
+            from database import SessionLocal
+            self._sessions = SessionLocal
+        return self._sessions
+
+    @property
+    def read_sessions(self):
+        if self._read_sessions is None:
+            from database import ReadSessionLocal
+            self._read_sessions = ReadSessionLocal
+        return self._read_sessions
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_kind == "process":
+                # spawn, not fork: a forked child would share this process's pooled connections
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="job")
+        return self._executor
+
+    def running(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def dispatch(self) -> int:
+        """Heartbeat running jobs, fail stale ones and claim queued ones into free workers.
+
+        Returns how many started. The write session is only used when there
+        is something to write.
+        """
+        with self.read_sessions() as read_db:
+            queued, running = pending(read_db)
+        started = 0
+        with self.sessions() as db:
+            self._heartbeat(db)
+            if running and time.monotonic() - self._last_reap >= JOB_REAP_SECONDS:
+                self._last_reap = time.monotonic()
+                if reap_stale(db):
+                    queued, running = pending(db)
+            if not claimable(queued, running):
+                return 0
+            while self.running() < self.workers:
+                job = claim(db)
+                if job is None:
+                    break
+                self._start(job)
+                started += 1
+        return started
+
+    def _start(self, job: models.Job):
+        if self.executor_kind == "process":
+            future = self._get_executor().submit(execute, job.id)
+        else:
+            future = self._get_executor().submit(execute, job.id, self.sessions, self.read_sessions)
+        with self._lock:
+            self._running[job.id] = (job.kind, time.perf_counter(), future)
+        future.add_done_callback(partial(self._finished, job.id))
+
+    def _finished(self, job_id: int, future: Future):
+        with self._lock:
+            kind, started, _ = self._running.pop(job_id)
+        if future.exception() is not None:
+            # The pool itself failed (say a worker process was killed), so execute never recorded it
+            logger.error("Job %s (%s) lost: %r", job_id, kind, future.exception())
+            finish(self.sessions, job_id, "failed", error="Job worker failed")
+            status = "failed"
+        else:
+            status = future.result()
+        JOB_DURATION.observe((kind, status), time.perf_counter() - started)
+        self.wake()
+
+    def _heartbeat(self, db: Session):
+        with self._lock:
+            job_ids = list(self._running)
+        if not job_ids or time.monotonic() - self._last_heartbeat < JOB_HEARTBEAT_SECONDS:
+            return
+        self._last_heartbeat = time.monotonic()
+        db.execute(update(models.Job).where(models.Job.id.in_(job_ids)).values(heartbeat_at=datetime.utcnow()))
+        db.commit()
+
+    def drain(self):
+        """Run jobs until none are queued or running here; blocks. For tests and scripts."""
+        while True:
+            self.dispatch()
+            with self._lock:
+                futures = [future for _, _, future in self._running.values()]
+            if not futures:
+                return
+            wait(futures, return_when=FIRST_COMPLETED)
+
+    # Event loop side
+    def wake(self):
+        """Dispatch now rather than at the next poll; safe from any thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await run_in_threadpool(self.dispatch)
+            except Exception:
+                logger.exception("Job dispatch failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = self._loop = None
+        if self._executor is not None:
+            # Jobs still running are failed by whichever runner next sees their heartbeat stop
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+runner = JobRunner()
+
+def _collect() -> list:
+    return JOB_DURATION.render() + metrics.gauge(
+        "jobs_running", "Jobs this process's runner is running", [({}, runner.running())])
+
+metrics.register_collector(_collect)
+
+if __name__ == "__main__":
+    # A runner on its own, for deployments that start the API with JOB_RUNNER=0
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        await runner.start()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
@@ -0,0 +1,203 @@
+"""Live tournament events over Server-Sent Events.
+
+crud publishes match and participation changes here, usually from a
+threadpool thread. Events are encoded once into an SSE frame and handed to
+the event loop. The hub there fans each frame out to every subscriber of
+that tournament.
+
+Each subscriber has a bounded queue. A spectator who falls LIVE_QUEUE_SIZE
+frames behind is dropped: they get a final `dropped` event telling them to
+reconnect and resync, so one slow client can't make memory grow without
+bound or slow down the rest.
+
+Set LIVE_BROKER_URL=tcp://host:port to share events between workers. Every
+worker then publishes to the stand-in broker, which can be run with
+`python live.py broker`, and delivers whatever the broker relays back.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Optional, Set
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "64"))
+LIVE_KEEPALIVE_SECONDS = float(os.getenv("LIVE_KEEPALIVE_SECONDS", "15"))
+LIVE_BROKER_URL = os.getenv("LIVE_BROKER_URL")
+
+DROPPED = "event: dropped\ndata: {}\n\n"
+
+def encode_event(event_type: str, payload: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(payload, separators=(',', ':'), default=str)}\n\n"
+
+class Subscriber:
+    def __init__(self, tournament_id: int, maxsize: int):
+        self.tournament_id = tournament_id
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+class InProcessBackend:
+    """Single worker: frames go straight to this process's hub."""
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    async def start(self):
+        pass
+
+    def publish(self, tournament_id: int, frame: str):
+        self.deliver(tournament_id, frame)
+
+    async def stop(self):
+        pass
+
+class BrokerBackend:
+    """Several workers: frames go through the broker, which relays them to all of them."""
+
+    def __init__(self, deliver, url: str):
+        self.deliver = deliver
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port
+        self.reader = self.writer = None
+        self._reader_task = None
+
+    async def start(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self._reader_task = asyncio.create_task(self._read())
+
+    async def _read(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                logger.warning("Live broker connection closed")
+                return
+            message = json.loads(line)
+            self.deliver(message["t"], message["f"])
+
+    def publish(self, tournament_id: int, frame: str):
+        self.writer.write(json.dumps({"t": tournament_id, "f": frame}).encode() + b"\n")
+
+    async def stop(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self.writer:
+            self.writer.close()
+
+class LiveHub:
+    def __init__(self, queue_size: int = LIVE_QUEUE_SIZE, broker_url: Optional[str] = LIVE_BROKER_URL):
+        self.queue_size = queue_size
+        self.subscribers: Dict[int, Set[Subscriber]] = {}
+        self.loop = None
+        self.dropped_count = 0
+        if broker_url:
+            self.backend = BrokerBackend(self.deliver, broker_url)
+        else:
+            self.backend = InProcessBackend(self.deliver)
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        await self.backend.start()
+
+    async def stop(self):
+        await self.backend.stop()
+        self.loop = None
+
+    def subscribe(self, tournament_id: int) -> Subscriber:
+        subscriber = Subscriber(tournament_id, self.queue_size)
+        self.subscribers.setdefault(tournament_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        group = self.subscribers.get(subscriber.tournament_id)
+        if group is not None:
+            group.discard(subscriber)
+            if not group:
+                del self.subscribers[subscriber.tournament_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(group) for group in self.subscribers.values())
+
+    def deliver(self, tournament_id: int, frame: str):
+        # Runs on the event loop
+        for subscriber in list(self.subscribers.get(tournament_id, ())):
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber):
+        self.unsubscribe(subscriber)
+        subscriber.dropped = True
+        self.dropped_count += 1
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(DROPPED)
+
+    def wants(self, tournament_id: int) -> bool:
+        # With a broker, spectators may be on another worker, so always publish
+        if self.loop is None:
+            return False
+        return isinstance(self.backend, BrokerBackend) or tournament_id in self.subscribers
+
+    def publish(self, tournament_id: int, event_type: str, payload: dict):
+        """Thread-safe; a no-op until the hub has been started."""
+        loop = self.loop
+        if loop is None:
+            return
+        frame = encode_event(event_type, payload)
+        loop.call_soon_threadsafe(self.backend.publish, tournament_id, frame)
+
+    async def stream(self, tournament_id: int):
+        # Subscribe only once the response starts, so an early disconnect can't leak
+        subscriber = self.subscribe(tournament_id)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), timeout=LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield frame
+                if frame is DROPPED:
+                    return
+        finally:
+            self.unsubscribe(subscriber)
+
+hub = LiveHub()
+
+def wants(tournament_id: int) -> bool:
+    return hub.wants(tournament_id)
+
+def publish(tournament_id: int, event_type: str, payload: dict):
+    hub.publish(tournament_id, event_type, payload)
+
+async def run_broker(host: str, port: int):
+    """Stand-in broker: relays every line it receives to every connected worker."""
+    workers = set()
+
+    async def handle(reader, writer):
+        workers.add(writer)
+        try:
+            while line := await reader.readline():
+                for worker in list(workers):
+                    worker.write(line)
+        finally:
+            workers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["broker"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(run_broker(args.host, args.port))
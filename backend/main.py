@@ -1,19 +1,26 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 from datetime import timedelta
-import uvicorn
+import os
 
-import crud, models, schemas, auth
-from database import SessionLocal, engine, get_db
-
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+import crud, async_crud, models, schemas, auth, live, versions, serialization, bulk, metrics, ratings, jobs, migrations
+from database import SessionLocal, engine, async_engine, get_db, get_async_db
+from pagination import encode_cursor, decode_cursor, encode_rating_cursor, decode_rating_cursor
 
 app = FastAPI(title="Cyber Tournament API", version="1.0.0")
 
+MAX_BATCH_SIZE = 1000
+MAX_PARTICIPANT_LOOKUP = 100
+# Serve /tournaments/ and /teams/ from plain rows instead of validated ORM objects
+FAST_LIST_RESPONSES = os.getenv("FAST_LIST_RESPONSES", "0") == "1"
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -21,15 +28,90 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
+# Added last, so it wraps (and times) everything else
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.on_event("startup")
+async def start_live_hub():
+    await live.hub.start()
+
+@app.on_event("shutdown")
+async def stop_live_hub():
+    await live.hub.stop()
+
+@app.on_event("startup")
+async def start_job_runner():
+    if jobs.JOB_RUNNER:
+        await jobs.runner.start()
+
+@app.on_event("shutdown")
+async def stop_job_runner():
+    await jobs.runner.stop()
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    # Pooled aiosqlite connections each own a worker thread; close them on exit
+    await async_engine.dispose()
+
+@app.exception_handler(auth.PasswordHashPoolBusy)
+async def password_hash_pool_busy_handler(request, exc: auth.PasswordHashPoolBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication is busy, try again shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(PoolTimeoutError)
+async def connection_pool_timeout_handler(request, exc: PoolTimeoutError):
+    # Every connection stayed checked out for DB_POOL_TIMEOUT: shed load rather than queue more
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, try again shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+def parse_cursor(after: Optional[str], decode=decode_cursor):
+    if after is None:
+        return None
+    try:
+        return decode(after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def set_next_cursor(response: Response, rows: list, limit: int, encode=encode_cursor):
+    # A full page means there may be more; hand back where to resume
+    if rows and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode(rows[-1])
+
+def accepted(job: models.Job) -> JSONResponse:
+    """202 for a queued job, pointing at where to follow it."""
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder(schemas.Job.model_validate(job)),
+        headers={"Location": f"/jobs/{job.id}"},
+    )
+
+async def check_version(request: Request, response: Response, db: AsyncSession, key: str) -> Optional[Response]:
+    """Set ETag / Last-Modified; returns a 304 to send instead if the client is up to date."""
+    version, updated_at = await versions.get(db, key)
+    headers = {"ETag": versions.etag(key, version), "Cache-Control": "no-cache"}
+    if updated_at is not None and versions.settled(updated_at):
+        headers["Last-Modified"] = versions.last_modified(updated_at)
+    if versions.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since"),
+                             headers["ETag"], updated_at):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
 
 # Authentication endpoints
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+    user = await async_crud.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -44,13 +126,21 @@ async def login_for_access_token(
 
 @app.post("/register", response_model=schemas.User)
 def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    try:
+        return crud.create_user(db=db, user=user)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics(request: Request):
+    if not metrics.scrape_allowed(request.client.host if request.client else None,
+                                  request.headers.get("authorization")):
+        raise HTTPException(status_code=403, detail="Not allowed to read metrics")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/metrics/hash-pool")
+def read_hash_pool_metrics(current_user: schemas.User = Depends(auth.get_current_active_user)):
+    return auth.get_hash_pool_stats()
 
 @app.get("/users/me", response_model=schemas.User)
 async def read_users_me(current_user: schemas.User = Depends(auth.get_current_active_user)):
@@ -66,18 +156,43 @@ def create_tournament(
     return crud.create_tournament(db=db, tournament=tournament, organizer_id=current_user.id)
 
 @app.get("/tournaments/", response_model=List[schemas.Tournament])
-def read_tournaments(
+async def read_tournaments(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     game: str = None,
-    db: Session = Depends(get_db)
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    tournaments = crud.get_tournaments(db, skip=skip, limit=limit, game=game)
+    if (not_modified := await check_version(request, response, db, versions.TOURNAMENTS)) is not None:
+        return not_modified
+    if FAST_LIST_RESPONSES:
+        rows = await async_crud.get_tournament_rows(db, skip=skip, limit=limit, game=game, after=parse_cursor(after))
+        set_next_cursor(response, rows, limit)
+        return serialization.rows_response(rows, response)
+    tournaments = await async_crud.get_tournaments(db, skip=skip, limit=limit, game=game, after=parse_cursor(after))
+    set_next_cursor(response, tournaments, limit)
     return tournaments
 
 @app.get("/tournaments/{tournament_id}", response_model=schemas.Tournament)
-def read_tournament(tournament_id: int, db: Session = Depends(get_db)):
-    db_tournament = crud.get_tournament(db, tournament_id=tournament_id)
+async def read_tournament(
+    tournament_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if (not_modified := await check_version(request, response, db, versions.tournament(tournament_id))) is not None:
+        return not_modified
+    db_tournament = (await async_crud.get_tournament(db, tournament_id=tournament_id)
+                     or await async_crud.get_archived_tournament(db, tournament_id))
+    if db_tournament is None:
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return db_tournament
+
+@app.get("/tournaments/{tournament_id}/full", response_model=schemas.TournamentFull)
+async def read_tournament_full(tournament_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_tournament = await async_crud.get_tournament_full(db, tournament_id=tournament_id)
     if db_tournament is None:
         raise HTTPException(status_code=404, detail="Tournament not found")
     return db_tournament
@@ -89,12 +204,11 @@ def update_tournament(
     current_user: schemas.User = Depends(auth.get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    # Check if user is the organizer
-    tournament = crud.get_tournament(db, tournament_id)
-    if not tournament or tournament.organizer_id != current_user.id:
+    # Only the organizer's row matches the UPDATE
+    tournament = crud.update_tournament(db, tournament_id, tournament_update.dict(), organizer_id=current_user.id)
+    if not tournament:
         raise HTTPException(status_code=403, detail="Not authorized")
-    
-    return crud.update_tournament(db, tournament_id, tournament_update.dict())
+    return tournament
 
 @app.delete("/tournaments/{tournament_id}")
 def delete_tournament(
@@ -110,6 +224,16 @@ def delete_tournament(
     crud.delete_tournament(db, tournament_id)
     return {"message": "Tournament deleted successfully"}
 
+@app.get("/search", response_model=List[schemas.SearchResult])
+async def search_entities(
+    q: str,
+    kind: Optional[Literal["tournament", "team"]] = None,
+    skip: int = 0,
+    limit: int = Query(20, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await async_crud.search_entities(db, q, kind=kind, skip=skip, limit=limit)
+
 # Team endpoints
 @app.post("/teams/", response_model=schemas.Team)
 def create_team(
@@ -117,11 +241,28 @@ def create_team(
     current_user: schemas.User = Depends(auth.get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    return crud.create_team(db=db, team=team)
+    try:
+        return crud.create_team(db=db, team=team)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/teams/", response_model=List[schemas.Team])
-def read_teams(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    teams = crud.get_teams(db, skip=skip, limit=limit)
+async def read_teams(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if (not_modified := await check_version(request, response, db, versions.TEAMS)) is not None:
+        return not_modified
+    if FAST_LIST_RESPONSES:
+        rows = await async_crud.get_team_rows(db, skip=skip, limit=limit, after=parse_cursor(after))
+        set_next_cursor(response, rows, limit)
+        return serialization.rows_response(rows, response)
+    teams = await async_crud.get_teams(db, skip=skip, limit=limit, after=parse_cursor(after))
+    set_next_cursor(response, teams, limit)
     return teams
 
 # Match endpoints
@@ -138,6 +279,108 @@ def create_match(
     
     return crud.create_match(db=db, match=match)
 
+@app.post("/tournaments/{tournament_id}/bracket", response_model=List[schemas.Match],
+          responses={202: {"model": schemas.Job}})
+def generate_bracket(
+    tournament_id: int,
+    bracket_create: schemas.BracketCreate,
+    background: bool = False,
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    tournament = crud.get_tournament(db, tournament_id)
+    if not tournament or tournament.organizer_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if crud.tournament_has_matches(db, tournament_id):
+        raise HTTPException(status_code=400, detail="Bracket already generated")
+    if background:
+        return accepted(jobs.submit(db, "generate_bracket", {
+            "tournament_id": tournament_id, "bracket_format": bracket_create.format}, current_user.id))
+    
+    try:
+        return crud.generate_bracket(db, tournament_id, bracket_create.format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/tournaments/{tournament_id}/live")
+async def tournament_live(tournament_id: int):
+    return StreamingResponse(
+        live.hub.stream(tournament_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/tournaments/{tournament_id}/standings", response_model=List[schemas.Standing])
+async def read_standings(tournament_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_standings(db, tournament_id)
+
+@app.post("/tournaments/{tournament_id}/standings/rebuild", response_model=schemas.StandingsRebuild,
+          responses={202: {"model": schemas.Job}})
+def rebuild_standings(
+    tournament_id: int,
+    background: bool = False,
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if not crud.get_tournament(db, tournament_id):
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    if background:
+        return accepted(jobs.submit(db, "rebuild_standings", {"tournament_id": tournament_id}, current_user.id))
+    return crud.rebuild_standings(db, tournament_id)
+
+@app.post("/standings/rebuild", status_code=202, response_model=schemas.Job)
+def rebuild_all_standings(
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    # Every tournament: always a job
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return accepted(jobs.submit(db, "rebuild_standings", {}, current_user.id))
+
+@app.post("/archive", status_code=202, response_model=schemas.Job)
+def archive_tournaments(
+    older_than_days: Optional[int] = Query(None, ge=1),
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    # Moves finished tournaments out of the hot tables (see archive.py): always a job
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return accepted(jobs.submit(db, "archive_tournaments", {"older_than_days": older_than_days}, current_user.id))
+
+# Rating endpoints
+@app.get("/leaderboard", response_model=List[schemas.LeaderboardEntry])
+async def read_leaderboard(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(50, ge=1, le=200),
+    min_matches: int = 1,
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if (not_modified := await check_version(request, response, db, versions.RATINGS)) is not None:
+        return not_modified
+    rows = await async_crud.get_leaderboard_rows(
+        db, skip=skip, limit=limit, min_matches=min_matches, after=parse_cursor(after, decode_rating_cursor))
+    set_next_cursor(response, rows, limit, encode_rating_cursor)
+    return serialization.rows_response(rows, response)
+
+@app.post("/ratings/recompute", response_model=schemas.RatingsRecompute, responses={202: {"model": schemas.Job}})
+def recompute_ratings(
+    background: bool = False,
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if background:
+        return accepted(jobs.submit(db, "recompute_ratings", {}, current_user.id))
+    return ratings.recompute(db)
+
 @app.put("/matches/{match_id}/score")
 def update_match_score(
     match_id: int,
@@ -146,17 +389,35 @@ def update_match_score(
     current_user: schemas.User = Depends(auth.get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    match = crud.get_match(db, match_id)
-    if not match:
+    found = crud.get_match_with_organizer(db, match_id)
+    if not found:
         raise HTTPException(status_code=404, detail="Match not found")
+    match, organizer_id = found
+    if match.team1_id is None or match.team2_id is None:
+        raise HTTPException(status_code=400, detail="Match teams are not decided yet")
     
     # Check if user has permission
-    tournament = crud.get_tournament(db, match.tournament_id)
-    if not tournament or tournament.organizer_id != current_user.id:
+    if organizer_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
     winner_id = match.team1_id if score1 > score2 else match.team2_id if score2 > score1 else None
-    return crud.update_match_score(db, match_id, score1, score2, winner_id)
+    if winner_id is None and match.bracket == "swiss":
+        # Pairing goes by wins, so the round can't close on a draw
+        raise HTTPException(status_code=400, detail="Swiss matches need a winner")
+    try:
+        return crud.update_match_score(db, match_id, score1, score2, winner_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.put("/matches/scores", response_model=List[schemas.ScoreBatchResult])
+def update_match_scores(
+    updates: List[schemas.ScoreUpdate],
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    if len(updates) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} items per batch")
+    return crud.batch_update_match_scores(db, updates, organizer_id=current_user.id)
 
 # Participation endpoints
 @app.post("/participations/", response_model=schemas.Participation)
@@ -165,14 +426,140 @@ def register_for_tournament(
     current_user: schemas.User = Depends(auth.get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    result = crud.register_team(db, participation)
+    try:
+        result = crud.register_team(db, participation)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not result:
         raise HTTPException(status_code=400, detail="Team already registered")
     return result
 
-@app.get("/tournaments/{tournament_id}/participants")
-def get_tournament_participants(tournament_id: int, db: Session = Depends(get_db)):
-    return crud.get_tournament_participants(db, tournament_id)
+@app.post("/participations/batch", response_model=List[schemas.ParticipationBatchResult])
+def register_for_tournaments(
+    participations: List[schemas.ParticipationCreate],
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    if len(participations) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} items per batch")
+    return crud.batch_register_teams(db, participations)
+
+@app.delete("/tournaments/{tournament_id}/participants/{team_id}")
+def withdraw_from_tournament(
+    tournament_id: int,
+    team_id: int,
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    tournament = crud.get_tournament(db, tournament_id)
+    if not tournament or tournament.organizer_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if crud.withdraw_team(db, tournament_id, team_id) is None:
+        raise HTTPException(status_code=404, detail="Team is not registered")
+    return {"message": "Team withdrawn"}
+
+@app.get("/tournaments/{tournament_id}/participants", response_model=List[schemas.Participation])
+async def get_tournament_participants(
+    tournament_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if (not_modified := await check_version(request, response, db, versions.participants(tournament_id))) is not None:
+        return not_modified
+    return await async_crud.get_tournament_participants(db, tournament_id)
+
+@app.get("/participations/", response_model=List[schemas.Participation])
+async def get_participants_for(
+    tournament_id: List[int] = Query([]),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Several tournaments' participants in one round trip, for clients that batch lookups
+    if not tournament_id:
+        raise HTTPException(status_code=400, detail="Pass at least one tournament_id")
+    if len(tournament_id) > MAX_PARTICIPANT_LOOKUP:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PARTICIPANT_LOOKUP} tournaments per request")
+    return await async_crud.get_participants_for(db, sorted(set(tournament_id)))
+
+# Bulk import / export
+@app.post("/import/{kind}", response_model=schemas.ImportResult)
+async def import_records(
+    kind: Literal["tournaments", "teams", "results"],
+    request: Request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    # The body is parsed as it arrives and inserted in chunks, never read whole
+    return await bulk.import_stream(db, kind, request.stream(), format, organizer_id=current_user.id)
+
+@app.get("/export/{kind}")
+async def export_records(
+    kind: Literal["tournaments", "teams", "results"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return StreamingResponse(
+        bulk.export_stream(db, kind, format),
+        media_type=bulk.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{format}"'},
+    )
+
+@app.post("/export/{kind}", status_code=202, response_model=schemas.Job)
+def export_records_job(
+    kind: Literal["tournaments", "teams", "results"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    # Same output as GET, written to a file to download from /jobs/{id}/download when done
+    return accepted(jobs.submit(db, "export", {"kind": kind, "format": format}, current_user.id))
+
+# Background jobs
+async def get_own_job(job_id: int, current_user: schemas.User, db: AsyncSession) -> models.Job:
+    job = await async_crud.get_job(db, job_id)
+    # Someone else's job is as good as missing
+    if not job or (job.created_by != current_user.id and not current_user.is_admin):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs", response_model=List[schemas.Job])
+async def read_jobs(
+    status: Optional[Literal["queued", "running", "succeeded", "failed"]] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await async_crud.get_user_jobs(db, current_user.id, status=status, limit=limit)
+
+@app.get("/jobs/{job_id}", response_model=schemas.Job)
+async def read_job(
+    job_id: int,
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await get_own_job(job_id, current_user, db)
+
+@app.get("/jobs/{job_id}/download")
+async def download_job_output(
+    job_id: int,
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    job = await get_own_job(job_id, current_user, db)
+    if job.kind != "export":
+        raise HTTPException(status_code=404, detail="Job has no output")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    path = jobs.output_path(job.id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Job output is no longer available")
+    return FileResponse(path, media_type=job.result["media_type"], filename=job.result["filename"])
 
 if __name__ == "__main__":
+    # Development server, reloading on changes; production runs serve.py
+    import uvicorn
+
+    migrations.upgrade(engine)
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
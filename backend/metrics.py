@@ -0,0 +1,273 @@
+"""Per-request performance metrics, served in the Prometheus text format.
+
+MetricsMiddleware times every request and labels it with its route
+template, so /tournaments/1 and /tournaments/2 share a series. Each
+request gets a RequestStats in a context variable. Engine events
+(instrument_engine, hooked up in database.py) and the password hashing
+wrappers in auth add to it. The context variable follows the request
+into the threadpool for sync routes and into aiosqlite for async ones.
+That is how every statement, and the time it took, is charged to the
+route that ran it.
+
+Requests slower than SLOW_REQUEST_MS are logged with their statements,
+grouped by SQL text, slowest first. Event streams stay open as long as
+their client does, so they are timed to their headers instead.
+
+/metrics shows queue depths and traffic, so it is only served to
+METRICS_ALLOW_IPS, or to anyone sending METRICS_TOKEN as a bearer token.
+"""
+import bisect
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+from sqlalchemy import event
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_STATEMENTS = 5  # statements shown per slow request
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_ALLOW_IPS = {ip.strip() for ip in os.getenv("METRICS_ALLOW_IPS", "127.0.0.1,::1").split(",") if ip.strip()}
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # empty: allowlisted addresses only
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+HASH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+logger = logging.getLogger("tournament.slow_requests")
+_lock = threading.Lock()
+
+class RequestStats:
+    """What one request spent, filled in while it runs."""
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.by_statement = {}  # SQL text -> [count, seconds]
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self.values = {}
+
+    def inc(self, labels: tuple = (), amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names, self.buckets = name, help, labels, buckets
+        self.values = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            for labels, series in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-1]!r}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency, until the last body chunk was sent",
+    ("method", "route"))
+REQUESTS = Counter("http_requests_total", "Requests by response status", ("method", "route", "status"))
+REQUEST_STATEMENTS = Counter(
+    "http_request_db_statements_total", "SQL statements executed on behalf of a route", ("method", "route"))
+REQUEST_DB_SECONDS = Counter(
+    "http_request_db_seconds_total", "Time spent executing SQL on behalf of a route", ("method", "route"))
+REQUEST_HASH_SECONDS = Counter(
+    "http_request_password_hash_seconds_total", "Time spent waiting for password hashing on behalf of a route",
+    ("method", "route"))
+STATEMENT_DURATION = Histogram(
+    "db_statement_duration_seconds", "Duration of single SQL statements", ("engine",), STATEMENT_BUCKETS)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "bcrypt hash or verify, including the wait for a pool worker",
+    ("operation",), HASH_BUCKETS)
+
+METRICS = [REQUEST_DURATION, REQUESTS, REQUEST_STATEMENTS, REQUEST_DB_SECONDS, REQUEST_HASH_SECONDS,
+           STATEMENT_DURATION, PASSWORD_HASH_DURATION]
+_collectors: List[Callable[[], List[str]]] = []
+
+def register_collector(collect: Callable[[], List[str]]):
+    """Add a function returning extra exposition lines, read at scrape time."""
+    _collectors.append(collect)
+
+def gauge(name: str, help: str, samples: list) -> List[str]:
+    """Exposition lines for a gauge from [(labels dict, value)]."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return lines
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+# Database
+def instrument_engine(engine, name: str):
+    """Time every statement on a (sync) engine and charge it to the current request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        record_statement(name, statement, time.perf_counter() - conn.info["metrics_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def drop_timer(exception_context):
+        started = exception_context.connection is not None and exception_context.connection.info.get("metrics_started")
+        if started:
+            started.pop()
+
+    def collect_pool():
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            return []
+        labels = {"engine": name}
+        return (
+            gauge("db_pool_checked_out", "Connections in use", [(labels, pool.checkedout())])
+            + gauge("db_pool_size", "Configured pool size", [(labels, pool.size())])
+            + gauge("db_pool_overflow", "Connections open beyond the pool size", [(labels, max(pool.overflow(), 0))])
+        )
+
+    register_collector(collect_pool)
+
+def record_statement(engine_name: str, statement: str, seconds: float):
+    STATEMENT_DURATION.observe((engine_name,), seconds)
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_seconds += seconds
+    entry = stats.by_statement.setdefault(statement, [0, 0.0])
+    entry[0] += 1
+    entry[1] += seconds
+
+# Password hashing
+@contextmanager
+def password_hash_timer(operation: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        PASSWORD_HASH_DURATION.observe((operation,), elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.hash_seconds += elapsed
+
+# Requests
+class MetricsMiddleware:
+    """ASGI middleware recording latency and the per-request DB and hashing cost."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+        headers_sent = None  # set for event streams only
+
+        async def send_with_status(message):
+            nonlocal status, headers_sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if any(name == b"content-type" and value.startswith(b"text/event-stream")
+                       for name, value in message.get("headers", ())):
+                    headers_sent = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one series so scanners can't blow up cardinality
+            record_request(scope["method"], route.path if route else "unmatched", status,
+                           (headers_sent or time.perf_counter()) - started, stats)
+
+def scrape_allowed(client_host: Optional[str], authorization: Optional[str]) -> bool:
+    if client_host in METRICS_ALLOW_IPS:
+        return True
+    return bool(METRICS_TOKEN) and secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}")
+
+def record_request(method: str, route: str, status: int, seconds: float, stats: RequestStats):
+    labels = (method, route)
+    REQUEST_DURATION.observe(labels, seconds)
+    REQUESTS.inc((method, route, str(status)))
+    if stats.statements:
+        REQUEST_STATEMENTS.inc(labels, stats.statements)
+        REQUEST_DB_SECONDS.inc(labels, stats.db_seconds)
+    if stats.hash_seconds:
+        REQUEST_HASH_SECONDS.inc(labels, stats.hash_seconds)
+    if seconds * 1000 >= SLOW_REQUEST_MS:
+        log_slow_request(method, route, status, seconds, stats)
+
+def _one_line(statement: str, limit: int = 300) -> str:
+    statement = re.sub(r"\s+", " ", statement).strip()
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+def log_slow_request(method: str, route: str, status: int, seconds: float, stats: RequestStats):
+    slowest = sorted(stats.by_statement.items(), key=lambda item: item[1][1], reverse=True)
+    breakdown = "".join(
+        f"\n  {count}x {total * 1000:.1f} ms  {_one_line(statement)}"
+        for statement, (count, total) in slowest[:SLOW_REQUEST_STATEMENTS]
+    )
+    logger.warning(
+        "Slow request %s %s -> %s in %.1f ms: %d statements, %.1f ms in the database, "
+        "%.1f ms hashing passwords%s",
+        method, route, status, seconds * 1000, stats.statements, stats.db_seconds * 1000,
+        stats.hash_seconds * 1000, breakdown,
+    )
@@ -0,0 +1,183 @@
+"""Schema migrations for databases created by earlier versions.
+
+create_all only adds missing tables. It never adds columns or indexes to
+tables that already exist. upgrade() runs create_all, then every
+migration newer than those recorded in schema_migrations, in order, each
+in its own transaction. A database created from scratch already matches
+the models, so it only gets the search index, which has no model, and is
+stamped as fully migrated. Nothing else creates schema: run upgrade()
+(serve.py does) before the app touches a new database.
+
+Migrations check before they add anything. That makes them safe on
+databases that create_all built before this module existed, which have
+some of the changes already. Append new migrations to MIGRATIONS; never
+renumber or edit one that has shipped.
+"""
+import logging
+import re
+from datetime import datetime
+
+from sqlalchemy import inspect, select
+from sqlalchemy.engine import Connection, Engine
+
+import models
+import search
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_ID = 720_001  # pg_advisory_xact_lock key held while a migration runs
+
+def _add_column(conn: Connection, table: str, column_sql: str):
+    name = column_sql.split()[0]
+    if name not in {column["name"] for column in inspect(conn).get_columns(table)}:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column_sql}")
+
+def _create_index(conn: Connection, name: str, table: str, *columns: str, unique: bool = False):
+    conn.exec_driver_sql(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    )
+
+def _bracket_columns(conn: Connection):
+    _add_column(conn, "tournaments", "bracket_format VARCHAR(30)")
+    for column_sql in (
+        "bracket VARCHAR(20)",
+        "position INTEGER",
+        "next_match_id INTEGER REFERENCES matches (id)",
+        "next_match_slot INTEGER",
+        "loser_next_match_id INTEGER REFERENCES matches (id)",
+        "loser_next_match_slot INTEGER",
+    ):
+        _add_column(conn, "matches", column_sql)
+
+def _keyset_indexes(conn: Connection):
+    _create_index(conn, "ix_tournaments_created_at_id", "tournaments", "created_at", "id")
+    _create_index(conn, "ix_tournaments_game_created_at_id", "tournaments", "game", "created_at", "id")
+    _create_index(conn, "ix_teams_created_at_id", "teams", "created_at", "id")
+
+def _registration_capacity(conn: Connection):
+    _add_column(conn, "participations", "status VARCHAR(20) NOT NULL DEFAULT 'registered'")
+    _add_column(conn, "tournaments", "waitlist BOOLEAN NOT NULL DEFAULT FALSE")
+    # Registration was check-then-insert before, so racing requests could double up; keep the first
+    conn.exec_driver_sql(
+        "DELETE FROM participations WHERE id NOT IN ("
+        "SELECT min(id) FROM participations GROUP BY tournament_id, team_id)"
+    )
+    if "registered_count" not in {column["name"] for column in inspect(conn).get_columns("tournaments")}:
+        conn.exec_driver_sql("ALTER TABLE tournaments ADD COLUMN registered_count INTEGER NOT NULL DEFAULT 0")
+        conn.exec_driver_sql(
+            "UPDATE tournaments SET registered_count = ("
+            "SELECT count(*) FROM participations"
+            " WHERE participations.tournament_id = tournaments.id AND participations.status = 'registered')"
+        )
+    _create_index(conn, "uq_participations_tournament_team", "participations", "tournament_id", "team_id", unique=True)
+
+def _ratings(conn: Connection):
+    unrated = "rating" not in {column["name"] for column in inspect(conn).get_columns("teams")}
+    _add_column(conn, "teams", "rating FLOAT NOT NULL DEFAULT 1500")
+    _add_column(conn, "teams", "rated_matches INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "matches", "rating_delta FLOAT")
+    _create_index(conn, "ix_teams_rating_id", "teams", "rating", "id")
+    if unrated:
+        logger.warning("Teams start unrated; run `python ratings.py` to rate the results already stored")
+
+def _query_indexes(conn: Connection):
+    _create_index(conn, "ix_tournaments_organizer_id", "tournaments", "organizer_id")
+    _create_index(conn, "ix_team_players_team_id", "team_players", "team_id")
+    _create_index(conn, "ix_team_players_user_id", "team_players", "user_id")
+    _create_index(conn, "ix_participations_team_id", "participations", "team_id")
+    _create_index(conn, "ix_participations_tournament_status_registered_at", "participations",
+                  "tournament_id", "status", "registered_at", "id")
+    _create_index(conn, "ix_matches_tournament_id_round", "matches", "tournament_id", "round")
+    _create_index(conn, "ix_jobs_created_by_id", "jobs", "created_by", "id")
+
+def _search_index(conn: Connection):
+    # Indexes the tournaments and teams already there
+    search.create_index(conn)
+
+def _autoincrement_ids(conn: Connection):
+    # SQLite hands out max(id) + 1, so once a table shrinks (a withdrawal, a
+    # standings rebuild) new rows could take ids already in the archive.
+    # AUTOINCREMENT never reuses one, and SQLite can only add it by rebuilding.
+    if conn.dialect.name != "sqlite":
+        return
+    for table in ("tournaments", "participations", "matches", "standings"):
+        create = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).scalar()
+        if "AUTOINCREMENT" in create.upper():
+            continue
+        indexes = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+        ).scalars().all()
+        create = re.sub(rf'^CREATE TABLE "?{table}"?', f"CREATE TABLE {table}_rebuilt", create)
+        create = re.sub(r"\bid INTEGER( NOT NULL)?( PRIMARY KEY)?", "id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT",
+                        create, count=1)
+        create = re.sub(r",\s*PRIMARY KEY \(id\)", "", create)
+        conn.exec_driver_sql(create)
+        conn.exec_driver_sql(f"INSERT INTO {table}_rebuilt SELECT * FROM {table}")
+        conn.exec_driver_sql(f"DROP TABLE {table}")
+        conn.exec_driver_sql(f"ALTER TABLE {table}_rebuilt RENAME TO {table}")
+        for index in indexes:
+            conn.exec_driver_sql(index)
+        # Carry on past every id handed out so far, archived ones included
+        conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+        conn.exec_driver_sql(
+            f"INSERT INTO sqlite_sequence (name, seq) SELECT ?, max("
+            f"(SELECT coalesce(max(id), 0) FROM {table}), (SELECT coalesce(max(id), 0) FROM archived_{table}))",
+            (table,),
+        )
+
+MIGRATIONS = [
+    (1, "bracket_columns", _bracket_columns),
+    (2, "keyset_indexes", _keyset_indexes),
+    (3, "registration_capacity", _registration_capacity),
+    (4, "ratings", _ratings),
+    (5, "query_indexes", _query_indexes),
+    (6, "search_index", _search_index),
+    (7, "autoincrement_ids", _autoincrement_ids),
+]
+
+def _applied(conn: Connection) -> set:
+    return set(conn.scalars(select(models.SchemaMigration.version)))
+
+def _record(conn: Connection, version: int, name: str):
+    conn.execute(models.SchemaMigration.__table__.insert().values(
+        version=version, name=name, applied_at=datetime.utcnow()))
+
+def _lock(conn: Connection):
+    # Another process may be upgrading too. SQLite's BEGIN IMMEDIATE already
+    # serializes us; Postgres needs a lock. Either way, check what's applied after.
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({MIGRATION_LOCK_ID})")
+
+def upgrade(engine: Engine) -> list:
+    """Bring the database up to the models; returns the names of the migrations run."""
+    fresh = not inspect(engine).has_table(models.Tournament.__tablename__)
+    models.Base.metadata.create_all(bind=engine)
+    if fresh:
+        with engine.begin() as conn:
+            _lock(conn)
+            # The one table without a model, so create_all left it out
+            search.create_index(conn)
+            applied = _applied(conn)
+            for version, name, _ in MIGRATIONS:
+                if version not in applied:
+                    _record(conn, version, name)
+        return []
+
+    ran = []
+    for version, name, migrate in MIGRATIONS:
+        with engine.begin() as conn:
+            _lock(conn)
+            if version in _applied(conn):
+                continue
+            migrate(conn)
+            _record(conn, version, name)
+        logger.info("Applied migration %d (%s)", version, name)
+        ran.append(name)
+    return ran
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    print(upgrade(engine) or "Up to date")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, Float, String, Boolean, DateTime, ForeignKey, Text, JSON, Index, Table, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -17,7 +17,6 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     tournaments = relationship("Tournament", back_populates="organizer")
-    participations = relationship("Participation", back_populates="player")
 
 class Tournament(Base):
     __tablename__ = "tournaments"
@@ -31,6 +30,10 @@ class Tournament(Base):
     start_date = Column(DateTime)
     end_date = Column(DateTime)
     status = Column(String(20), default="upcoming")  # upcoming, ongoing, completed
+    bracket_format = Column(String(30), nullable=True)  # single_elimination, double_elimination, round_robin, swiss
+    # Registered (not waitlisted) teams; kept in step by crud so a seat is claimed with one conditional UPDATE
+    registered_count = Column(Integer, default=0, nullable=False)
+    waitlist = Column(Boolean, default=False, nullable=False)  # queue registrations past max_teams instead of refusing
     organizer_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -38,6 +41,15 @@ class Tournament(Base):
     participations = relationship("Participation", back_populates="tournament")
     matches = relationship("Match", back_populates="tournament")
 
+    # Keyset pagination: (created_at, id), optionally narrowed by game
+    __table_args__ = (
+        Index("ix_tournaments_created_at_id", "created_at", "id"),
+        Index("ix_tournaments_game_created_at_id", "game", "created_at", "id"),
+        Index("ix_tournaments_organizer_id", "organizer_id"),
+        # Ids move to the archive with their rows, so must never be handed out twice
+        {"sqlite_autoincrement": True},
+    )
+
 class Team(Base):
     __tablename__ = "teams"
     
@@ -46,10 +58,19 @@ class Team(Base):
     tag = Column(String(10), unique=True)
     description = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Elo rating, maintained by ratings.py as matches finalize
+    rating = Column(Float, default=1500.0, nullable=False)
+    rated_matches = Column(Integer, default=0, nullable=False)
     
     participations = relationship("Participation", back_populates="team")
     players = relationship("TeamPlayer", back_populates="team")
 
+    __table_args__ = (
+        Index("ix_teams_created_at_id", "created_at", "id"),
+        # Leaderboard keyset pagination, read backwards: (rating, id) descending
+        Index("ix_teams_rating_id", "rating", "id"),
+    )
+
 class TeamPlayer(Base):
     __tablename__ = "team_players"
     
@@ -62,6 +83,11 @@ class TeamPlayer(Base):
     team = relationship("Team", back_populates="players")
     user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_team_players_team_id", "team_id"),
+        Index("ix_team_players_user_id", "user_id"),
+    )
+
 class Participation(Base):
     __tablename__ = "participations"
     
@@ -70,10 +96,19 @@ class Participation(Base):
     team_id = Column(Integer, ForeignKey("teams.id"))
     registered_at = Column(DateTime, default=datetime.utcnow)
     final_position = Column(Integer)
+    status = Column(String(20), default="registered", nullable=False)  # registered, waitlisted
     
     tournament = relationship("Tournament", back_populates="participations")
     team = relationship("Team", back_populates="participations")
 
+    __table_args__ = (
+        UniqueConstraint("tournament_id", "team_id", name="uq_participations_tournament_team"),
+        Index("ix_participations_team_id", "team_id"),
+        # Seeding and waitlist promotion: one tournament's registered (or waitlisted) teams in signup order
+        Index("ix_participations_tournament_status_registered_at", "tournament_id", "status", "registered_at", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
 class Match(Base):
     __tablename__ = "matches"
     
@@ -87,5 +122,100 @@ class Match(Base):
     winner_id = Column(Integer, ForeignKey("teams.id"), nullable=True)
     match_date = Column(DateTime)
     status = Column(String(20), default="scheduled")  # scheduled, ongoing, completed
+    bracket = Column(String(20), nullable=True)  # winners, losers, grand_final, round_robin, swiss
+    position = Column(Integer, nullable=True)
+    # Where the winner (and, in double elimination, the loser) plays next
+    next_match_id = Column(Integer, ForeignKey("matches.id"), nullable=True)
+    next_match_slot = Column(Integer, nullable=True)  # 1 -> team1, 2 -> team2
+    loser_next_match_id = Column(Integer, ForeignKey("matches.id"), nullable=True)
+    loser_next_match_slot = Column(Integer, nullable=True)
+    rating_delta = Column(Float, nullable=True)  # team1's rating change from this result; team2's is the negative
+    
+    tournament = relationship("Tournament", back_populates="matches")
+    team1 = relationship("Team", foreign_keys=[team1_id])
+    team2 = relationship("Team", foreign_keys=[team2_id])
+    winner = relationship("Team", foreign_keys=[winner_id])
+
+    __table_args__ = (
+        # A tournament's matches, and bracket lookups by round within one
+        Index("ix_matches_tournament_id_round", "tournament_id", "round"),
+        {"sqlite_autoincrement": True},
+    )
+
+class Standing(Base):
+    __tablename__ = "standings"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tournament_id = Column(Integer, ForeignKey("tournaments.id"), nullable=False)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    played = Column(Integer, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    losses = Column(Integer, default=0, nullable=False)
+    maps_won = Column(Integer, default=0, nullable=False)
+    maps_lost = Column(Integer, default=0, nullable=False)
+    points = Column(Integer, default=0, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("tournament_id", "team_id", name="uq_standings_tournament_team"),
+        {"sqlite_autoincrement": True},
+    )
+    
+    @property
+    def map_differential(self):
+        return self.maps_won - self.maps_lost
+
+# Archive tier (see archive.py): the same columns as the live tables, minus
+# defaults and foreign keys, since rows are copied in exactly as they were
+def _archive_table(table, *indexes):
+    return Table(
+        f"archived_{table.name}", Base.metadata,
+        *(Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable,
+                 autoincrement=False)
+          for column in table.columns),
+        *indexes,
+    )
+
+archived_tournaments = _archive_table(Tournament.__table__)
+archived_participations = _archive_table(
+    Participation.__table__, Index("ix_archived_participations_tournament_id", "tournament_id"))
+archived_matches = _archive_table(Match.__table__, Index("ix_archived_matches_tournament_id", "tournament_id"))
+archived_standings = _archive_table(Standing.__table__, Index("ix_archived_standings_tournament_id", "tournament_id"))
+
+class ResourceVersion(Base):
+    __tablename__ = "resource_versions"
     
-    tournament = relationship("Tournament", back_populates="matches")
\ No newline at end of file
+    # e.g. "tournaments", "tournament:5", "teams", "participants:5"
+    key = Column(String(100), primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    
+    version = Column(Integer, primary_key=True)  # see migrations.MIGRATIONS
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # see jobs.KINDS
+    params = Column(JSON, nullable=False)
+    status = Column(String(20), default="queued", nullable=False)  # queued, running, succeeded, failed
+    progress = Column(Integer, default=0, nullable=False)
+    total = Column(Integer, nullable=True)  # unknown until the job reports it
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # a running job whose worker stops beating is failed
+
+    __table_args__ = (
+        # Claiming takes the oldest queued job; limits count running ones by kind
+        Index("ix_jobs_status_kind_id", "status", "kind", "id"),
+        # GET /jobs: a user's jobs, newest first
+        Index("ix_jobs_created_by_id", "created_by", "id"),
+    )
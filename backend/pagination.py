@@ -0,0 +1,35 @@
+import base64
+import json
+from datetime import datetime
+
+# Keyset pagination cursors. A cursor is the (created_at, id) of the last row
+# on a page, packed into an opaque url-safe token so clients can't depend on it.
+# The leaderboard pages by (rating, id) instead.
+
+def _pack(values: list) -> str:
+    payload = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _unpack(cursor: str) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+def encode_cursor(row) -> str:
+    return _pack([row.created_at.isoformat(), row.id])
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, row_id = _unpack(cursor)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def encode_rating_cursor(row) -> str:
+    return _pack([row.rating, row.id])
+
+def decode_rating_cursor(cursor: str):
+    try:
+        rating, row_id = _unpack(cursor)
+        return float(rating), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
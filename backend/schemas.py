@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 
 # User Schemas
@@ -31,6 +31,15 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+# What anyone may see of a user, e.g. a tournament's organizer
+class PublicUser(BaseModel):
+    id: int
+    username: str
+    full_name: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -47,6 +56,7 @@ class TournamentBase(BaseModel):
     prize_pool: int = 0
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
+    waitlist: bool = False
 
 class TournamentCreate(TournamentBase):
     pass
@@ -54,6 +64,8 @@ class TournamentCreate(TournamentBase):
 class Tournament(TournamentBase):
     id: int
     status: str
+    bracket_format: Optional[str] = None
+    registered_count: int = 0
     organizer_id: int
     created_at: datetime
     
@@ -61,7 +73,7 @@ class Tournament(TournamentBase):
         from_attributes = True
 
 class TournamentWithOrganizer(Tournament):
-    organizer: User
+    organizer: PublicUser
 
 # Team Schemas
 class TeamBase(BaseModel):
@@ -94,15 +106,40 @@ class MatchCreate(MatchBase):
 
 class Match(MatchBase):
     id: int
+    # Bracket matches are created before their teams are known
+    team1_id: Optional[int] = None
+    team2_id: Optional[int] = None
     winner_id: Optional[int] = None
     status: str
+    bracket: Optional[str] = None
+    position: Optional[int] = None
+    next_match_id: Optional[int] = None
+    next_match_slot: Optional[int] = None
+    loser_next_match_id: Optional[int] = None
+    loser_next_match_slot: Optional[int] = None
     
     class Config:
         from_attributes = True
 
+class ScoreUpdate(BaseModel):
+    match_id: int
+    score1: int
+    score2: int
+
+class BatchItemResult(BaseModel):
+    index: int
+    ok: bool
+    detail: Optional[str] = None
+
+class ScoreBatchResult(BatchItemResult):
+    match: Optional[Match] = None
+
+class BracketCreate(BaseModel):
+    format: Literal["single_elimination", "double_elimination", "round_robin", "swiss"]
+
 class MatchWithTeams(Match):
-    team1: Team
-    team2: Team
+    team1: Optional[Team] = None
+    team2: Optional[Team] = None
     winner: Optional[Team] = None
 
 # Participation Schemas
@@ -117,10 +154,96 @@ class Participation(ParticipationBase):
     id: int
     registered_at: datetime
     final_position: Optional[int] = None
+    status: str = "registered"
     
     class Config:
         from_attributes = True
 
-class ParticipationWithDetails(Participation):
+class ParticipationBatchResult(BatchItemResult):
+    participation: Optional[Participation] = None
+
+class ParticipationWithTeam(Participation):
+    team: Team
+
+class ParticipationWithDetails(ParticipationWithTeam):
     tournament: Tournament
-    team: Team
\ No newline at end of file
+
+class TournamentFull(TournamentWithOrganizer):
+    participations: List[ParticipationWithTeam]
+    matches: List[MatchWithTeams]
+
+# Search Schemas
+class SearchResult(BaseModel):
+    kind: Literal["tournament", "team"]
+    id: int
+    name: str
+    tag: Optional[str] = None
+    score: float
+    
+    class Config:
+        from_attributes = True
+
+# Standings Schemas
+class Standing(BaseModel):
+    tournament_id: int
+    team_id: int
+    played: int
+    wins: int
+    losses: int
+    maps_won: int
+    maps_lost: int
+    map_differential: int
+    points: int
+    
+    class Config:
+        from_attributes = True
+
+class StandingsRebuild(BaseModel):
+    changed: int
+    standings: List[Standing]
+
+# Rating Schemas
+class LeaderboardEntry(BaseModel):
+    id: int
+    name: str
+    tag: Optional[str] = None
+    rating: float
+    rated_matches: int
+    
+    class Config:
+        from_attributes = True
+
+class RatingsRecompute(BaseModel):
+    matches: int
+    teams: int
+    waves: int
+    seconds: float
+
+# Bulk import Schemas
+class ImportIssue(BaseModel):
+    line: int
+    detail: str
+
+class ImportResult(BaseModel):
+    kind: str
+    imported: int
+    failed: int
+    # The first bulk.MAX_REPORTED_ERRORS failures; `failed` counts them all
+    errors: List[ImportIssue]
+
+# Job Schemas
+class Job(BaseModel):
+    id: int
+    kind: str
+    params: dict
+    status: str
+    progress: int
+    total: Optional[int] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
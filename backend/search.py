@@ -0,0 +1,157 @@
+"""Full-text search over tournaments and teams.
+
+On SQLite the index is an FTS5 table with name, tag and description
+columns. Each row's rowid encodes what it indexes: id * 2 for a
+tournament, id * 2 + 1 for a team. Updates and deletes therefore go
+straight to the row, and results need no join. The table has no model,
+so create_all doesn't build it: migrations does, through create_index.
+crud keeps the index in step with every create, update and delete, in
+the same transaction.
+
+Queries match every term. The last term also matches as a prefix, which is
+what type-ahead needs. Results are ranked by bm25, with name weighted over
+tag over description. Ranking covers the newest SEARCH_CANDIDATES matches
+of each kind, which keeps very common terms cheap on large indexes; results
+past that window aren't reachable, by paging or otherwise. Other databases
+fall back to a plain, unranked name prefix match.
+"""
+import os
+import re
+from typing import Optional
+from sqlalchemy import text, select, literal, union_all
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+import models
+
+KINDS = ("tournament", "team")
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "1000"))
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+CREATE_INDEX = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    name, tag, description,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3 4'
+)
+"""
+# Seed an index created over existing data (a no-op on empty tables)
+BACKFILL_INDEX = """
+INSERT INTO search_index(rowid, name, tag, description)
+SELECT id * 2, name, NULL, description FROM tournaments
+WHERE NOT EXISTS (SELECT 1 FROM search_index)
+UNION ALL
+SELECT id * 2 + 1, name, tag, description FROM teams
+WHERE NOT EXISTS (SELECT 1 FROM search_index)
+"""
+RANK_WEIGHTS = "bm25(search_index, 10.0, 5.0, 1.0)"
+
+def create_index(conn: Connection):
+    """Create the index if it's missing and seed it from existing rows."""
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(CREATE_INDEX)
+        conn.exec_driver_sql(BACKFILL_INDEX)
+
+def drop_index(conn: Connection):
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("DROP TABLE IF EXISTS search_index")
+
+def _rowid(kind: str, ref_id: int) -> int:
+    return ref_id * 2 + KINDS.index(kind)
+
+def _enabled(db) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+def _put(db: Session, kind: str, ref_id: int, name: str, tag: Optional[str], description: Optional[str]):
+    params = {"rowid": _rowid(kind, ref_id), "name": name, "tag": tag, "description": description}
+    # Usually re-indexing an existing row: one UPDATE, with an INSERT only if it was missing
+    result = db.execute(
+        text("UPDATE search_index SET name = :name, tag = :tag, description = :description WHERE rowid = :rowid"),
+        params,
+    )
+    if result.rowcount == 0:
+        db.execute(
+            text("INSERT INTO search_index(rowid, name, tag, description) VALUES (:rowid, :name, :tag, :description)"),
+            params,
+        )
+
+def index_tournament(db: Session, tournament: models.Tournament):
+    if _enabled(db):
+        _put(db, "tournament", tournament.id, tournament.name, None, tournament.description)
+
+def index_team(db: Session, team: models.Team):
+    if _enabled(db):
+        _put(db, "team", team.id, team.name, team.tag, team.description)
+
+def index_many(db: Session, kind: str, rows):
+    """Index new (id, name, tag, description) rows with one executemany."""
+    params = [
+        {"rowid": _rowid(kind, ref_id), "name": name, "tag": tag, "description": description}
+        for ref_id, name, tag, description in rows
+    ]
+    if params and _enabled(db):
+        db.execute(
+            text("INSERT INTO search_index(rowid, name, tag, description) VALUES (:rowid, :name, :tag, :description)"),
+            params,
+        )
+
+def remove(db: Session, kind: str, ref_id: int):
+    if _enabled(db):
+        db.execute(text("DELETE FROM search_index WHERE rowid = :rowid"), {"rowid": _rowid(kind, ref_id)})
+
+def rebuild(db: Session):
+    """Re-index every tournament and team, e.g. after rows were loaded around crud."""
+    if _enabled(db):
+        db.execute(text("DELETE FROM search_index"))
+        db.execute(text(BACKFILL_INDEX))
+
+def match_expression(q: str) -> Optional[str]:
+    """User text -> FTS5 query: every term quoted, the last one as a prefix."""
+    terms = TOKEN.findall(q)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+def search_query(q: str, kind: Optional[str] = None, skip: int = 0, limit: int = 20, dialect: str = "sqlite"):
+    """Statement yielding (kind, id, name, tag, score) rows, best first; None if q has no terms."""
+    expression = match_expression(q)
+    if expression is None:
+        return None
+    if dialect != "sqlite":
+        return _fallback_query(TOKEN.findall(q), kind, skip, limit)
+
+    # Rank only the newest matches of each kind, so neither kind's ids can
+    # crowd the other out. FTS5 streams a MATCH in rowid order and stops at
+    # the LIMIT, so a common term or a one-letter prefix costs
+    # SEARCH_CANDIDATES rows per kind rather than every row that contains it.
+    # The window doesn't depend on skip, so pages never re-rank; they end with it.
+    windows = " UNION ALL ".join(f"""
+        SELECT * FROM (
+            SELECT rowid, name, tag, {RANK_WEIGHTS} AS bm25_score
+            FROM search_index
+            WHERE search_index MATCH :expression AND search_index.rowid % 2 = {KINDS.index(one)}
+            ORDER BY rowid DESC
+            LIMIT :candidates
+        )""" for one in (KINDS if kind is None else (kind,)))
+    return text(f"""
+        SELECT CASE rowid % 2 WHEN 0 THEN 'tournament' ELSE 'team' END AS kind,
+               rowid / 2 AS id, name, tag, -bm25_score AS score
+        FROM ({windows})
+        ORDER BY bm25_score, rowid DESC
+        LIMIT :limit OFFSET :skip
+    """).bindparams(expression=expression, candidates=SEARCH_CANDIDATES, limit=limit, skip=skip)
+
+def _fallback_query(terms: list, kind: Optional[str], skip: int, limit: int):
+    pattern = " ".join(terms) + "%"
+    selects = []
+    if kind in (None, "tournament"):
+        selects.append(select(
+            literal("tournament").label("kind"), models.Tournament.id, models.Tournament.name,
+            literal(None).label("tag"), literal(0.0).label("score"),
+        ).where(models.Tournament.name.ilike(pattern)))
+    if kind in (None, "team"):
+        selects.append(select(
+            literal("team").label("kind"), models.Team.id, models.Team.name,
+            models.Team.tag, literal(0.0).label("score"),
+        ).where(models.Team.name.ilike(pattern)))
+    query = union_all(*selects).subquery()
+    return select(query).order_by(query.c.name).offset(skip).limit(limit)
@@ -0,0 +1,46 @@
+"""Fast path for list responses.
+
+The normal list routes load ORM instances, validate each one through its
+response schema and then JSON-encode the result. The fast path selects only
+the schema's columns as plain rows and dumps them in one call. orjson is
+used when it is installed, and the standard library otherwise.
+
+Only use it for flat schemas whose fields map one-to-one onto columns, so
+the rows already have the shape the schema would produce.
+"""
+import json
+from datetime import date, datetime
+from typing import Iterable, List, Type
+from pydantic import BaseModel
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+def columns(model, schema: Type[BaseModel]) -> list:
+    """The model's columns for every field of schema, in field order."""
+    return [getattr(model, name) for name in schema.model_fields]
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(items: List[dict]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(items)
+    return json.dumps(items, separators=(",", ":"), default=_default).encode()
+
+def rows_response(rows: Iterable, response: Response) -> Response:
+    """Serialize SQLAlchemy rows, keeping headers already set on response."""
+    headers = {
+        name: value for name, value in response.headers.items()
+        if name not in ("content-length", "content-type")
+    }
+    return Response(
+        content=dumps([row._asdict() for row in rows]),
+        media_type="application/json",
+        headers=headers,
+    )
@@ -0,0 +1,47 @@
+"""Production entry point.
+
+Brings the schema up to date once, in this process, then starts uvicorn
+with WEB_CONCURRENCY worker processes. The workers only import the app:
+none of them touches the schema, so they can't race each other on DDL,
+and boot time doesn't grow with it. This process never imports the app.
+
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 8000] [--skip-migrations]
+
+Run `python migrations.py` on its own to migrate ahead of a deploy.
+"""
+import argparse
+import logging
+import os
+
+import uvicorn
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+
+def migrate():
+    # Imported here so the supervisor only holds a connection while migrating
+    import migrations
+    from database import engine
+
+    ran = migrations.upgrade(engine)
+    engine.dispose()
+    return ran
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--skip-migrations", action="store_true", help="the schema was migrated separately")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.skip_migrations:
+        ran = migrate()
+        logging.getLogger(__name__).info("Migrations run: %s", ", ".join(ran) or "none")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers,
+                app_dir=os.path.dirname(os.path.abspath(__file__)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Per-tournament standings, maintained incrementally.
+
+Each completed match with two teams contributes a win or loss, its map
+score and points to both teams' rows. A Swiss bye (completed, with no
+second team) counts as a win for the team that got it. A score change applies only the
+difference between the match's old and new contribution. It does that with
+one upsert, so reading standings never has to look at matches. `rebuild`
+recomputes a tournament from its matches and reports how many rows
+drifted.
+"""
+from typing import Optional
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+import models
+
+POINTS_PER_WIN = 3
+COUNTERS = ("played", "wins", "losses", "maps_won", "maps_lost", "points")
+
+def match_state(match: models.Match) -> tuple:
+    return (match.tournament_id, match.team1_id, match.team2_id,
+            match.score1, match.score2, match.winner_id, match.status)
+
+def _contribution(state: Optional[tuple]) -> dict:
+    if state is None:
+        return {}
+    tournament_id, team1_id, team2_id, score1, score2, winner_id, status = state
+    if status != "completed" or winner_id is None or team1_id is None:
+        return {}
+    if team2_id is None:
+        return {(tournament_id, team1_id): {**dict.fromkeys(COUNTERS, 0), "played": 1, "wins": 1,
+                                            "points": POINTS_PER_WIN}}
+    result = {}
+    for team_id, won, lost in ((team1_id, score1, score2), (team2_id, score2, score1)):
+        is_winner = team_id == winner_id
+        result[(tournament_id, team_id)] = {
+            "played": 1,
+            "wins": int(is_winner),
+            "losses": int(not is_winner),
+            "maps_won": won or 0,
+            "maps_lost": lost or 0,
+            "points": POINTS_PER_WIN if is_winner else 0,
+        }
+    return result
+
+def tally(states) -> dict:
+    """Sum match states into {(tournament_id, team_id): counters}."""
+    totals = {}
+    for state in states:
+        for key, contribution in _contribution(state).items():
+            row = totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for c in COUNTERS:
+                row[c] += contribution[c]
+    return totals
+
+def _upsert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def apply_match_delta(db: Session, old_state: Optional[tuple], new_state: Optional[tuple]):
+    """Add new_state's contribution and take away old_state's."""
+    old, new = _contribution(old_state), _contribution(new_state)
+    zero = dict.fromkeys(COUNTERS, 0)
+    add(db, {
+        key: {c: new.get(key, zero)[c] - old.get(key, zero)[c] for c in COUNTERS}
+        for key in old.keys() | new.keys()
+    })
+
+def add(db: Session, totals: dict):
+    """Add {(tournament_id, team_id): counters} onto the stored rows, in one upsert."""
+    rows = [
+        {"tournament_id": key[0], "team_id": key[1], **row}
+        for key, row in totals.items() if any(row.values())
+    ]
+    if not rows:
+        return
+
+    insert = _upsert(db)
+    stmt = insert(models.Standing).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Standing.tournament_id, models.Standing.team_id],
+        set_={c: getattr(models.Standing, c) + getattr(stmt.excluded, c) for c in COUNTERS},
+    )
+    db.execute(stmt)
+
+def standings_query(tournament_id: int):
+    return (
+        select(models.Standing)
+        .where(models.Standing.tournament_id == tournament_id)
+        .order_by(
+            models.Standing.points.desc(),
+            (models.Standing.maps_won - models.Standing.maps_lost).desc(),
+            models.Standing.wins.desc(),
+            models.Standing.team_id,
+        )
+    )
+
+def get_standings(db: Session, tournament_id: int):
+    return db.scalars(standings_query(tournament_id)).all()
+
+def rebuild(db: Session, tournament_id: int) -> int:
+    """Recompute from matches; returns how many rows were added, changed or removed."""
+    matches = db.execute(
+        select(models.Match.tournament_id, models.Match.team1_id, models.Match.team2_id,
+               models.Match.score1, models.Match.score2, models.Match.winner_id, models.Match.status)
+        .where(models.Match.tournament_id == tournament_id)
+    )
+    totals = {team_id: row for (_, team_id), row in tally(tuple(state) for state in matches).items()}
+
+    current = {
+        s.team_id: {c: getattr(s, c) for c in COUNTERS}
+        for s in db.scalars(select(models.Standing).where(models.Standing.tournament_id == tournament_id))
+    }
+    zero = dict.fromkeys(COUNTERS, 0)
+    changed = sum(
+        1 for team_id in current.keys() | totals.keys()
+        if current.get(team_id, zero) != totals.get(team_id, zero)
+    )
+
+    db.execute(delete(models.Standing).where(models.Standing.tournament_id == tournament_id))
+    if totals:
+        db.execute(
+            models.Standing.__table__.insert(),
+            [{"tournament_id": tournament_id, "team_id": team_id, **row} for team_id, row in totals.items()],
+        )
+    db.commit()
+    return changed
@@ -1,20 +1,87 @@
+import asyncio
+import json
+import os
 import pytest
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
-from main import app, get_db
-from database import Base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from main import app, get_db, get_async_db, MAX_PARTICIPANT_LOOKUP
+from database import Base, configure_sqlite
 import models
 import schemas
 import crud
+import async_crud
+import auth
+import live
+import metrics
+import jobs
+import migrations
+import versions
+import search
+import standings
+import database
+import serve
 from auth import get_password_hash
 
 # Test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+read_engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=read_engine)
+# Same WAL profile and read/write split as the app's engines
+configure_sqlite(engine)
+configure_sqlite(async_engine.sync_engine, read_only=True)
+configure_sqlite(read_engine, read_only=True)
+metrics.instrument_engine(engine, "write")
+metrics.instrument_engine(async_engine.sync_engine, "read")
 
-Base.metadata.create_all(bind=engine)
+# Every distinct statement the app runs during the suite, with its first parameters, for TestQueryPlans
+executed_statements = {}
+
+def issued_by_test() -> bool:
+    # The nearest frame outside the libraries decides; async statements run on
+    # a greenlet whose stack stops in SQLAlchemy, and those are always the app's
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if "site-packages" not in filename and "/lib/python" not in filename:
+            return filename == __file__
+        frame = frame.f_back
+    return False
+
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    if statement in executed_statements or issued_by_test():
+        return
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    executed_statements[statement] = parameters
+
+for recorded_engine in (engine, async_engine.sync_engine, read_engine):
+    event.listen(recorded_engine, "before_cursor_execute", record_statement)
+
+migrations.upgrade(engine)
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    # Every test starts from empty tables so fixtures like test_user can be reused
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        search.drop_index(conn)
+    migrations.upgrade(engine)
+    auth.user_cache.clear()
+    yield
 
 def override_get_db():
     try:
@@ -23,7 +90,12 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 client = TestClient(app)
 
@@ -170,5 +242,1817 @@ class TestTeams:
         data = response.json()
         assert data["name"] == team_data["name"]
 
+class TestAsyncReads:
+    def test_async_read_paths(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        tournament = client.post("/tournaments/", json=test_tournament, headers=headers).json()
+        team = client.post("/teams/", json={"name": "Async Team", "tag": "AT"}, headers=headers).json()
+        client.post("/participations/", json={"tournament_id": tournament["id"], "team_id": team["id"]}, headers=headers)
+
+        assert client.get(f"/tournaments/{tournament['id']}").json()["name"] == test_tournament["name"]
+        assert client.get("/teams/").json()[0]["id"] == team["id"]
+        participants = client.get(f"/tournaments/{tournament['id']}/participants").json()
+        assert [p["team_id"] for p in participants] == [team["id"]]
+
+    def test_bad_login_rejected(self):
+        client.post("/register", json=test_user)
+        response = client.post("/token", data={"username": test_user["username"], "password": "wrongpass"})
+        assert response.status_code == 401
+
+class TestHashPool:
+    def test_login_rejected_when_pool_saturated(self, monkeypatch):
+        client.post("/register", json=test_user)
+        full = auth.PASSWORD_HASH_WORKERS + auth.PASSWORD_HASH_QUEUE
+        monkeypatch.setitem(auth.hash_pool_stats, "in_flight", full)
+
+        response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(auth.PASSWORD_HASH_RETRY_AFTER)
+
+    def test_pool_metrics(self):
+        client.post("/register", json=test_user)
+        assert client.get("/metrics/hash-pool").status_code == 401
+        token = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        }).json()["access_token"]
+        stats = client.get("/metrics/hash-pool", headers={"Authorization": f"Bearer {token}"}).json()
+        assert stats["peak_in_flight"] >= 1
+        assert stats["workers"] == auth.PASSWORD_HASH_WORKERS
+        assert stats["queue_limit"] == auth.PASSWORD_HASH_QUEUE
+
+class TestUserCache:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    def test_resolved_user_is_cached(self):
+        assert client.get("/users/me", headers=self.headers).status_code == 200
+
+        # A change that bypasses crud is only seen once the entry expires
+        db = TestingSessionLocal()
+        db.query(models.User).update({"full_name": "Changed Elsewhere"})
+        db.commit()
+        db.close()
+        assert client.get("/users/me", headers=self.headers).json()["full_name"] == test_user["full_name"]
+
+    def test_deactivation_through_crud_invalidates(self):
+        user_id = client.get("/users/me", headers=self.headers).json()["id"]
+
+        db = TestingSessionLocal()
+        crud.deactivate_user(db, user_id)
+        db.close()
+
+        response = client.get("/users/me", headers=self.headers)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Inactive user"
+
+    def test_cache_is_bounded_and_expires(self, monkeypatch):
+        cache = auth.UserCache(maxsize=2, ttl=10)
+        cache.set(("a", 1), "A")
+        cache.set(("b", 1), "B")
+        cache.get(("a", 1))
+        cache.set(("c", 1), "C")
+        assert len(cache) == 2
+        assert cache.get(("b", 1)) is None
+        assert cache.get(("a", 1)) == "A"
+
+        monkeypatch.setattr(auth.time, "monotonic", lambda: 1e12)
+        assert cache.get(("a", 1)) is None
+
+class TestBracket:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        self.tournament_id = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+
+    def register_teams(self, count):
+        db = TestingSessionLocal()
+        for i in range(count):
+            team = crud.create_team(db, schemas.TeamCreate(name=f"Team {i}", tag=f"T{i}"))
+            crud.register_team(db, schemas.ParticipationCreate(tournament_id=self.tournament_id, team_id=team.id))
+        db.close()
+
+    def generate(self, bracket_format):
+        return client.post(
+            f"/tournaments/{self.tournament_id}/bracket",
+            json={"format": bracket_format},
+            headers=self.headers,
+        )
+
+    def play_out(self):
+        # Team 1 wins every match until nothing playable is left
+        played = 0
+        while True:
+            db = TestingSessionLocal()
+            playable = [
+                m for m in crud.get_tournament_matches(db, self.tournament_id)
+                if m.status == "scheduled" and m.team1_id and m.team2_id
+            ]
+            db.close()
+            if not playable:
+                return played
+            for match in playable:
+                response = client.put(f"/matches/{match.id}/score", params={"score1": 2, "score2": 0}, headers=self.headers)
+                assert response.status_code == 200
+                played += 1
+
+    def test_single_elimination_advances_winners(self):
+        self.register_teams(5)
+        matches = self.generate("single_elimination").json()
+        assert len(matches) == 4
+
+        assert self.play_out() == 4
+        db = TestingSessionLocal()
+        final = [m for m in crud.get_tournament_matches(db, self.tournament_id) if m.next_match_id is None][0]
+        assert final.status == "completed"
+        db.close()
+
+    def test_double_elimination_plays_to_grand_final(self):
+        self.register_teams(6)
+        matches = self.generate("double_elimination").json()
+        assert len(matches) == 10
+        assert self.play_out() == 10
+
+        db = TestingSessionLocal()
+        grand_final = [m for m in crud.get_tournament_matches(db, self.tournament_id) if m.bracket == "grand_final"][0]
+        assert grand_final.status == "completed"
+        assert grand_final.team2_id is not None
+        db.close()
+
+    def test_round_robin(self):
+        self.register_teams(5)
+        matches = self.generate("round_robin").json()
+        assert len(matches) == 10
+        assert {m["round"] for m in matches} == {1, 2, 3, 4, 5}
+
+    def test_swiss_pairs_next_round_when_round_completes(self):
+        self.register_teams(4)
+        assert len(self.generate("swiss").json()) == 2
+        assert self.play_out() == 4
+
+        db = TestingSessionLocal()
+        rounds = {m.round for m in crud.get_tournament_matches(db, self.tournament_id)}
+        db.close()
+        assert rounds == {1, 2}
+
+    def test_swiss_rejects_draws(self):
+        self.register_teams(4)
+        first, second = self.generate("swiss").json()
+        response = client.put(f"/matches/{first['id']}/score", params={"score1": 1, "score2": 1}, headers=self.headers)
+        assert response.status_code == 400
+        results = client.put("/matches/scores", headers=self.headers, json=[
+            {"match_id": first["id"], "score1": 1, "score2": 1}, {"match_id": second["id"], "score1": 2, "score2": 0}
+        ]).json()
+        assert [r["ok"] for r in results] == [False, True]
+        assert results[0]["detail"] == "Swiss matches need a winner"
+
+        # Once the round has a winner everywhere, the next one is paired
+        assert client.put(f"/matches/{first['id']}/score", params={"score1": 2, "score2": 1},
+                          headers=self.headers).status_code == 200
+        rounds = {m["round"] for m in client.get(f"/tournaments/{self.tournament_id}/full").json()["matches"]}
+        assert rounds == {1, 2}
+
+    def test_swiss_byes_count_as_wins(self):
+        self.register_teams(3)
+        matches = self.generate("swiss").json()
+        bye = next(m for m in matches if m["team2_id"] is None)
+        rows = {s["team_id"]: s for s in client.get(f"/tournaments/{self.tournament_id}/standings").json()}
+        assert (rows[bye["team1_id"]]["wins"], rows[bye["team1_id"]]["points"]) == (1, standings.POINTS_PER_WIN)
+
+        played = next(m for m in matches if m["team2_id"] is not None)
+        client.put(f"/matches/{played['id']}/score", params={"score1": 2, "score2": 0}, headers=self.headers)
+        # Round 2 hands the bye to someone else, and a rebuild agrees with the running totals
+        second_bye = next(m for m in client.get(f"/tournaments/{self.tournament_id}/full").json()["matches"]
+                          if m["round"] == 2 and m["team2_id"] is None)
+        assert second_bye["team1_id"] != bye["team1_id"]
+        rows = {s["team_id"]: s for s in client.get(f"/tournaments/{self.tournament_id}/standings").json()}
+        assert sum(row["wins"] for row in rows.values()) == 3
+        assert len(rows) == 3
+        db = TestingSessionLocal()
+        assert standings.rebuild(db, self.tournament_id) == 0
+        db.close()
+
+    def test_corrections_reseed_until_the_next_match_starts(self):
+        self.register_teams(4)
+        matches = self.generate("single_elimination").json()
+        first, second = [m for m in matches if m["round"] == 1]
+        final_id = first["next_match_id"]
+        slot = f"team{first['next_match_slot']}_id"
+        score = lambda match_id, score1, score2: client.put(
+            f"/matches/{match_id}/score", params={"score1": score1, "score2": score2}, headers=self.headers)
+        final = lambda: next(m for m in client.get(f"/tournaments/{self.tournament_id}/full").json()["matches"]
+                             if m["id"] == final_id)
+
+        assert score(first["id"], 2, 0).status_code == 200
+        assert final()[slot] == first["team1_id"]
+        assert score(first["id"], 0, 2).status_code == 200  # corrected: the other team goes through
+        assert final()[slot] == first["team2_id"]
+        assert score(first["id"], 1, 1).status_code == 200  # no winner any more
+        assert final()[slot] is None
+
+        assert score(first["id"], 2, 0).status_code == 200
+        assert score(second["id"], 2, 0).status_code == 200
+        assert score(final_id, 1, 0).status_code == 200
+        response = score(first["id"], 0, 2)
+        assert response.status_code == 409
+        assert final()[slot] == first["team1_id"]
+        # Same winner, different map score: nothing downstream changes
+        assert score(first["id"], 3, 1).status_code == 200
+        batch = client.put("/matches/scores", json=[{"match_id": first["id"], "score1": 0, "score2": 2}],
+                           headers=self.headers).json()
+        assert batch[0] == {"index": 0, "ok": False, "detail": "Next match has already started", "match": None}
+
+    def test_bracket_only_generated_once(self):
+        self.register_teams(4)
+        assert self.generate("single_elimination").status_code == 200
+        assert self.generate("single_elimination").status_code == 400
+
+    def test_large_bracket_generation_is_fast(self):
+        db = TestingSessionLocal()
+        db.execute(models.Team.__table__.insert(), [{"name": f"Team {i}", "tag": f"T{i}"} for i in range(1024)])
+        db.execute(models.Participation.__table__.insert(), [
+            {"tournament_id": self.tournament_id, "team_id": i + 1} for i in range(1024)
+        ])
+        db.commit()
+
+        start = time.perf_counter()
+        crud.generate_bracket(db, self.tournament_id, "double_elimination")
+        elapsed = time.perf_counter() - start
+        assert len(crud.get_tournament_matches(db, self.tournament_id)) == 2046
+        db.close()
+        assert elapsed < 1.0
+
+class TestBatchWrites:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        self.tournament_id = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+        self.team_ids = [
+            client.post("/teams/", json={"name": f"Team {i}", "tag": f"T{i}"}, headers=self.headers).json()["id"]
+            for i in range(4)
+        ]
+
+    def test_batch_registration_reports_each_item(self):
+        client.post("/participations/", json={"tournament_id": self.tournament_id, "team_id": self.team_ids[0]}, headers=self.headers)
+        response = client.post("/participations/batch", json=[
+            {"tournament_id": self.tournament_id, "team_id": self.team_ids[0]},
+            {"tournament_id": self.tournament_id, "team_id": self.team_ids[1]},
+            {"tournament_id": self.tournament_id, "team_id": self.team_ids[1]},
+            {"tournament_id": 999, "team_id": self.team_ids[2]},
+            {"tournament_id": self.tournament_id, "team_id": 999},
+            {"tournament_id": self.tournament_id, "team_id": self.team_ids[2]},
+        ], headers=self.headers)
+        assert response.status_code == 200
+        results = response.json()
+        assert [r["ok"] for r in results] == [False, True, False, False, False, True]
+        assert results[0]["detail"] == "Team already registered"
+        assert results[3]["detail"] == "Tournament not found"
+        assert results[4]["detail"] == "Team not found"
+        assert results[1]["participation"]["team_id"] == self.team_ids[1]
+
+        participants = client.get(f"/tournaments/{self.tournament_id}/participants").json()
+        assert sorted(p["team_id"] for p in participants) == sorted(self.team_ids[:3])
+
+    def test_batch_scores_apply_valid_items(self):
+        match_ids = [
+            client.post("/matches/", json={
+                "tournament_id": self.tournament_id, "team1_id": a, "team2_id": b
+            }, headers=self.headers).json()["id"]
+            for a, b in [(self.team_ids[0], self.team_ids[1]), (self.team_ids[2], self.team_ids[3])]
+        ]
+
+        # A second organizer's tournament: its match must be refused
+        other = {**test_user, "username": "other", "email": "other@example.com"}
+        client.post("/register", json=other)
+        other_token = client.post("/token", data={"username": "other", "password": other["password"]}).json()["access_token"]
+        other_headers = {"Authorization": f"Bearer {other_token}"}
+        other_tournament = client.post("/tournaments/", json=test_tournament, headers=other_headers).json()["id"]
+        foreign_match = client.post("/matches/", json={
+            "tournament_id": other_tournament, "team1_id": self.team_ids[0], "team2_id": self.team_ids[2]
+        }, headers=other_headers).json()["id"]
+
+        response = client.put("/matches/scores", json=[
+            {"match_id": match_ids[0], "score1": 2, "score2": 1},
+            {"match_id": foreign_match, "score1": 2, "score2": 0},
+            {"match_id": 999, "score1": 1, "score2": 0},
+            {"match_id": match_ids[1], "score1": 0, "score2": 2},
+        ], headers=self.headers)
+        assert response.status_code == 200
+        results = response.json()
+        assert [r["ok"] for r in results] == [True, False, False, True]
+        assert results[1]["detail"] == "Not authorized"
+        assert results[0]["match"]["winner_id"] == self.team_ids[0]
+        assert results[3]["match"]["winner_id"] == self.team_ids[3]
+        assert results[3]["match"]["status"] == "completed"
+
+class TestStandings:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        self.tournament_id = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+        self.team_ids = [
+            client.post("/teams/", json={"name": f"Team {i}", "tag": f"T{i}"}, headers=self.headers).json()["id"]
+            for i in range(3)
+        ]
+
+    def play(self, team1_id, team2_id, score1, score2):
+        match_id = client.post("/matches/", json={
+            "tournament_id": self.tournament_id, "team1_id": team1_id, "team2_id": team2_id
+        }, headers=self.headers).json()["id"]
+        client.put(f"/matches/{match_id}/score", params={"score1": score1, "score2": score2}, headers=self.headers)
+        return match_id
+
+    def standings(self):
+        return {s["team_id"]: s for s in client.get(f"/tournaments/{self.tournament_id}/standings").json()}
+
+    def test_standings_follow_results(self):
+        a, b, c = self.team_ids
+        self.play(a, b, 2, 0)
+        self.play(b, c, 2, 1)
+
+        table = client.get(f"/tournaments/{self.tournament_id}/standings").json()
+        assert [s["team_id"] for s in table] == [a, b, c]
+        by_team = self.standings()
+        assert by_team[a]["points"] == 3 and by_team[a]["map_differential"] == 2
+        assert by_team[b]["wins"] == 1 and by_team[b]["losses"] == 1 and by_team[b]["map_differential"] == -1
+        assert by_team[c]["played"] == 1 and by_team[c]["points"] == 0
+
+    def test_score_correction_applies_delta(self):
+        a, b, _ = self.team_ids
+        match_id = self.play(a, b, 2, 0)
+        client.put(f"/matches/{match_id}/score", params={"score1": 1, "score2": 2}, headers=self.headers)
+
+        by_team = self.standings()
+        assert by_team[a]["wins"] == 0 and by_team[a]["losses"] == 1 and by_team[a]["played"] == 1
+        assert by_team[b]["wins"] == 1 and by_team[b]["maps_won"] == 2 and by_team[b]["maps_lost"] == 1
+
+    def test_rebuild_requires_admin_and_repairs_drift(self):
+        a, b, _ = self.team_ids
+        self.play(a, b, 2, 0)
+        url = f"/tournaments/{self.tournament_id}/standings/rebuild"
+        assert client.post(url, headers=self.headers).status_code == 403
+
+        db = TestingSessionLocal()
+        user = crud.get_user_by_username(db, test_user["username"])
+        crud.update_user(db, user.id, {"is_admin": True})
+        db.query(models.Standing).filter(models.Standing.team_id == a).update({"wins": 7})
+        db.commit()
+        db.close()
+
+        response = client.post(url, headers=self.headers)
+        assert response.status_code == 200
+        assert response.json()["changed"] == 1
+        assert self.standings()[a]["wins"] == 1
+        assert client.post(url, headers=self.headers).json()["changed"] == 0
+
+class TestLiveHub:
+    def test_fan_out_to_tournament_subscribers(self):
+        async def scenario():
+            hub = live.LiveHub(queue_size=4, broker_url=None)
+            await hub.start()
+            first, second, other = hub.subscribe(1), hub.subscribe(1), hub.subscribe(2)
+            hub.publish(1, "match", {"id": 7})
+            await asyncio.sleep(0)
+            assert first.queue.get_nowait() == second.queue.get_nowait() == 'event: match\ndata: {"id":7}\n\n'
+            assert other.queue.empty()
+        asyncio.run(scenario())
+
+    def test_slow_subscriber_is_dropped(self):
+        async def scenario():
+            hub = live.LiveHub(queue_size=2, broker_url=None)
+            await hub.start()
+            slow, fast = hub.subscribe(1), hub.subscribe(1)
+            for i in range(3):
+                hub.publish(1, "match", {"id": i})
+                await asyncio.sleep(0)
+                fast.queue.get_nowait()
+            assert slow.dropped and not fast.dropped
+            assert slow.queue.get_nowait() is live.DROPPED
+            assert hub.subscriber_count() == 1
+        asyncio.run(scenario())
+
+    def test_score_update_is_published(self, monkeypatch):
+        client.post("/register", json=test_user)
+        token = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        }).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        tournament_id = client.post("/tournaments/", json=test_tournament, headers=headers).json()["id"]
+        team_ids = [client.post("/teams/", json={"name": f"Team {i}", "tag": f"T{i}"}, headers=headers).json()["id"] for i in range(2)]
+        match_id = client.post("/matches/", json={
+            "tournament_id": tournament_id, "team1_id": team_ids[0], "team2_id": team_ids[1]
+        }, headers=headers).json()["id"]
+
+        async def scenario():
+            hub = live.LiveHub(broker_url=None)
+            monkeypatch.setattr(live, "hub", hub)
+            await hub.start()
+            subscriber = hub.subscribe(tournament_id)
+            db = TestingSessionLocal()
+            await asyncio.to_thread(crud.update_match_score, db, match_id, 2, 0, team_ids[0])
+            db.close()
+            frame = await asyncio.wait_for(subscriber.queue.get(), timeout=1)
+            assert frame.startswith("event: match\n")
+            assert f'"winner_id":{team_ids[0]}' in frame
+        asyncio.run(scenario())
+
+class TestPagination:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    def test_tournaments_cursor_walks_all_pages(self):
+        for i in range(5):
+            client.post("/tournaments/", json={**test_tournament, "name": f"T{i}"}, headers=self.headers)
+
+        seen = []
+        response = client.get("/tournaments/", params={"limit": 2})
+        while True:
+            assert response.status_code == 200
+            seen.extend(t["name"] for t in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            response = client.get("/tournaments/", params={"limit": 2, "after": cursor})
+
+        assert seen == [f"T{i}" for i in range(5)]
+
+    def test_cursor_matches_skip_limit(self):
+        for i in range(4):
+            client.post("/teams/", json={"name": f"Team {i}", "tag": f"T{i}"}, headers=self.headers)
+
+        first = client.get("/teams/", params={"limit": 2})
+        by_cursor = client.get("/teams/", params={"limit": 2, "after": first.headers["X-Next-Cursor"]})
+        by_skip = client.get("/teams/", params={"limit": 2, "skip": 2})
+        assert by_cursor.json() == by_skip.json()
+        assert [t["name"] for t in by_cursor.json()] == ["Team 2", "Team 3"]
+
+    def test_cursor_with_game_filter(self):
+        for i, game in enumerate(["CS:GO", "Dota 2", "CS:GO", "CS:GO"]):
+            client.post("/tournaments/", json={**test_tournament, "name": f"T{i}", "game": game}, headers=self.headers)
+
+        first = client.get("/tournaments/", params={"limit": 2, "game": "CS:GO"})
+        assert [t["name"] for t in first.json()] == ["T0", "T2"]
+        second = client.get("/tournaments/", params={"limit": 2, "game": "CS:GO", "after": first.headers["X-Next-Cursor"]})
+        assert [t["name"] for t in second.json()] == ["T3"]
+        assert "X-Next-Cursor" not in second.headers
+
+    def test_invalid_cursor(self):
+        response = client.get("/tournaments/", params={"after": "not-a-cursor"})
+        assert response.status_code == 400
+
+class TestConditionalGet:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        self.tournament_id = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+
+    def backdate_versions(self, seconds=5):
+        db = TestingSessionLocal()
+        db.query(models.ResourceVersion).update({"updated_at": datetime.utcnow() - timedelta(seconds=seconds)})
+        db.commit()
+        db.close()
+
+    def test_unchanged_tournament_returns_304_without_querying(self, monkeypatch):
+        self.backdate_versions()
+        first = client.get(f"/tournaments/{self.tournament_id}")
+        etag = first.headers["ETag"]
+        assert "Last-Modified" in first.headers
+
+        async def fail(*args, **kwargs):
+            raise AssertionError("304 should not load the tournament")
+        monkeypatch.setattr(async_crud, "get_tournament", fail)
+        response = client.get(f"/tournaments/{self.tournament_id}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+        response = client.get(f"/tournaments/{self.tournament_id}",
+                              headers={"If-Modified-Since": first.headers["Last-Modified"]})
+        assert response.status_code == 304
+
+    def test_last_modified_waits_for_its_second_to_end(self):
+        # A write later in the same second would carry the same one-second date
+        url = f"/tournaments/{self.tournament_id}"
+        assert "Last-Modified" not in client.get(url).headers
+        now = format_datetime(datetime.utcnow().replace(tzinfo=timezone.utc), usegmt=True)
+        assert client.get(url, headers={"If-Modified-Since": now}).status_code == 200
+
+        self.backdate_versions()
+        last_modified = client.get(url).headers["Last-Modified"]
+        client.put(url, json={**test_tournament, "name": "Renamed"}, headers=self.headers)
+        response = client.get(url, headers={"If-Modified-Since": last_modified})
+        assert response.status_code == 200 and response.json()["name"] == "Renamed"
+
+    def test_writes_change_the_etag(self):
+        detail = client.get(f"/tournaments/{self.tournament_id}").headers["ETag"]
+        listing = client.get("/tournaments/").headers["ETag"]
+        teams = client.get("/teams/").headers["ETag"]
+        participants = client.get(f"/tournaments/{self.tournament_id}/participants").headers["ETag"]
+
+        client.put(f"/tournaments/{self.tournament_id}", json={**test_tournament, "name": "Renamed"}, headers=self.headers)
+        response = client.get(f"/tournaments/{self.tournament_id}", headers={"If-None-Match": detail})
+        assert response.status_code == 200
+        assert response.json()["name"] == "Renamed"
+        assert client.get("/tournaments/", headers={"If-None-Match": listing}).status_code == 200
+
+        team_id = client.post("/teams/", json={"name": "Team", "tag": "T"}, headers=self.headers).json()["id"]
+        assert client.get("/teams/", headers={"If-None-Match": teams}).status_code == 200
+
+        url = f"/tournaments/{self.tournament_id}/participants"
+        assert client.get(url, headers={"If-None-Match": participants}).status_code == 304
+        client.post("/participations/", json={"tournament_id": self.tournament_id, "team_id": team_id}, headers=self.headers)
+        response = client.get(url, headers={"If-None-Match": participants})
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+
+class TestFastListResponses:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        for i in range(3):
+            client.post("/tournaments/", json={
+                **test_tournament, "name": f"T{i}", "description": None,
+                "start_date": "2030-01-02T03:04:05.123456",
+            }, headers=self.headers)
+            client.post("/teams/", json={"name": f"Team {i}", "tag": f"T{i}"}, headers=self.headers)
+        # Last-Modified is only sent once the write's second is over
+        db = TestingSessionLocal()
+        db.query(models.ResourceVersion).update({"updated_at": datetime.utcnow() - timedelta(seconds=5)})
+        db.commit()
+        db.close()
+
+    @pytest.mark.parametrize("url", ["/tournaments/", "/teams/"])
+    def test_fast_path_matches_schema_output(self, monkeypatch, url):
+        import main
+        slow = client.get(url, params={"limit": 2})
+        monkeypatch.setattr(main, "FAST_LIST_RESPONSES", True)
+        fast = client.get(url, params={"limit": 2})
+
+        assert fast.status_code == 200
+        assert fast.headers["content-type"] == "application/json"
+        assert fast.json() == slow.json()
+        assert list(fast.json()[0]) == list(slow.json()[0])
+        for header in ("X-Next-Cursor", "ETag", "Last-Modified"):
+            assert fast.headers[header] == slow.headers[header]
+
+class TestTournamentFull:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    def create_tournament(self, team_count):
+        tournament_id = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+        team_ids = [
+            client.post("/teams/", json={"name": f"T{tournament_id}-{i}", "tag": f"{tournament_id}-{i}"},
+                        headers=self.headers).json()["id"]
+            for i in range(team_count)
+        ]
+        client.post("/participations/batch", json=[
+            {"tournament_id": tournament_id, "team_id": team_id} for team_id in team_ids
+        ], headers=self.headers)
+        client.post(f"/tournaments/{tournament_id}/bracket", json={"format": "round_robin"}, headers=self.headers)
+        return tournament_id
+
+    def fetch_counting_statements(self, tournament_id):
+        statements = []
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+        try:
+            response = client.get(f"/tournaments/{tournament_id}/full")
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+        return response, statements
+
+    def test_full_tournament_payload(self):
+        tournament_id = self.create_tournament(4)
+        response, _ = self.fetch_counting_statements(tournament_id)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["organizer"]["username"] == test_user["username"]
+        # Public endpoint: only what anyone may see of the organizer
+        assert set(data["organizer"]) == {"id", "username", "full_name"}
+        assert len(data["participations"]) == 4
+        assert all(p["team"]["id"] == p["team_id"] for p in data["participations"])
+        assert len(data["matches"]) == 6
+        assert all(m["team1"]["id"] == m["team1_id"] and m["team2"]["id"] == m["team2_id"] for m in data["matches"])
+
+        assert client.get("/tournaments/9999/full").status_code == 404
+
+    def test_statement_count_does_not_grow_with_size(self):
+        small = self.create_tournament(2)
+        large = self.create_tournament(12)
+        for tournament_id in (small, large):
+            response, statements = self.fetch_counting_statements(tournament_id)
+            assert response.status_code == 200
+            # tournament + organizer, participations + teams, matches + teams
+            assert len(statements) == 3, statements
+
+class TestSearch:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    def create_tournament(self, name, description=None):
+        return client.post("/tournaments/", json={**test_tournament, "name": name, "description": description},
+                           headers=self.headers).json()["id"]
+
+    def search(self, q, **params):
+        response = client.get("/search", params={"q": q, **params})
+        assert response.status_code == 200
+        return [(r["kind"], r["name"]) for r in response.json()]
+
+    def test_prefix_match_ranks_names_first(self):
+        self.create_tournament("Weekly Cup", "Open to summer league teams")
+        self.create_tournament("Summer Championship")
+        client.post("/teams/", json={"name": "Sumo", "tag": "SUM"}, headers=self.headers)
+
+        assert self.search("summ") == [("tournament", "Summer Championship"), ("tournament", "Weekly Cup")]
+        assert self.search("sum", kind="team") == [("team", "Sumo")]
+        assert self.search("summer champ") == [("tournament", "Summer Championship")]
+        assert self.search('"') == []
+
+    def test_index_follows_updates_and_deletes(self):
+        tournament_id = self.create_tournament("Spring Open")
+        client.put(f"/tournaments/{tournament_id}", json={**test_tournament, "name": "Autumn Open"}, headers=self.headers)
+        assert self.search("spring") == []
+        assert self.search("autumn") == [("tournament", "Autumn Open")]
+
+        client.delete(f"/tournaments/{tournament_id}", headers=self.headers)
+        assert self.search("autumn") == []
+
+    def test_pagination(self):
+        for i in range(5):
+            self.create_tournament(f"Cup {i}")
+        first = self.search("cup", limit=3)
+        second = self.search("cup", limit=3, skip=3)
+        assert len(first) == 3 and len(second) == 2
+        assert not set(first) & set(second)
+
+    def test_pages_stay_inside_one_window_per_kind(self, monkeypatch):
+        import search
+        monkeypatch.setattr(search, "SEARCH_CANDIDATES", 3)
+        for i in range(5):
+            self.create_tournament(f"Cup {i}")
+        for i in range(8):
+            client.post("/teams/", json={"name": f"Cup Team {i}"}, headers=self.headers)
+
+        ranked = self.search("cup", limit=100)
+        # The newer, higher-id teams don't push the tournaments out
+        assert sorted(kind for kind, _ in ranked) == ["team"] * 3 + ["tournament"] * 3
+        paged, skip = [], 0
+        while page := self.search("cup", limit=2, skip=skip):
+            paged += page
+            skip += 2
+        assert paged == ranked
+
+class TestDatabaseProfile:
+    def test_write_engine_uses_wal(self):
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+            assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() > 0
+
+    def test_read_engine_rejects_writes(self):
+        async def scenario():
+            async with async_engine.connect() as conn:
+                assert (await conn.exec_driver_sql("PRAGMA query_only")).scalar() == 1
+                with pytest.raises(OperationalError):
+                    await conn.exec_driver_sql("DELETE FROM tournaments")
+        asyncio.run(scenario())
+
+    def test_open_reader_does_not_block_commits(self):
+        read_engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+        configure_sqlite(read_engine, read_only=True)
+        db = TestingSessionLocal()
+        for i in range(3):
+            crud.create_team(db, schemas.TeamCreate(name=f"Team {i}", tag=f"T{i}"))
+        try:
+            with read_engine.connect() as conn:
+                # A half-read result keeps the reader's statement, and its snapshot, open
+                rows = conn.exec_driver_sql("SELECT name FROM teams ORDER BY id")
+                assert rows.fetchone()[0] == "Team 0"
+
+                started = time.perf_counter()
+                crud.create_team(db, schemas.TeamCreate(name="Team 3", tag="T3"))
+                assert time.perf_counter() - started < 1  # no wait on busy_timeout
+
+                assert [row[0] for row in rows] == ["Team 1", "Team 2"]
+        finally:
+            db.close()
+            read_engine.dispose()
+
+    def test_postgres_engine_options(self):
+        options = database.engine_options("postgresql://app@db/tournaments", statement_timeout_ms=2500)
+        assert options["pool_pre_ping"] is True
+        assert options["pool_recycle"] == database.DB_POOL_RECYCLE
+        assert options["pool_use_lifo"] is True
+        assert options["pool_size"] == database.DB_POOL_SIZE
+        assert options["max_overflow"] == database.DB_MAX_OVERFLOW
+        assert options["connect_args"]["options"] == "-c statement_timeout=2500"
+
+        options = database.engine_options("postgresql+asyncpg://app@db/tournaments", read=True)
+        assert options["pool_size"] == database.DB_READ_POOL_SIZE
+        settings = options["connect_args"]["server_settings"]
+        assert settings["statement_timeout"] == str(database.DB_STATEMENT_TIMEOUT_MS)
+
+    def test_sqlite_engine_options(self):
+        options = database.engine_options("sqlite:///./x.db")
+        assert options["pool_size"] == 1 and options["max_overflow"] == 0
+        assert options["connect_args"] == {"check_same_thread": False}
+        assert "pool_pre_ping" not in options
+        assert database.engine_options("sqlite+aiosqlite:///./x.db", read=True)["poolclass"] is AsyncAdaptedQueuePool
+
+    def test_exhausted_pool_sheds_load(self):
+        busy_engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False},
+                                    pool_size=1, max_overflow=0, pool_timeout=0.1)
+        configure_sqlite(busy_engine)
+        BusySession = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=busy_engine)
+
+        def busy_get_db():
+            with BusySession() as db:
+                yield db
+
+        client.post("/register", json=test_user)
+        token = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        }).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        app.dependency_overrides[get_db] = busy_get_db
+        try:
+            with busy_engine.connect():  # holds the only connection
+                response = client.post("/teams/", json={"name": "Busy", "tag": "BSY"}, headers=headers)
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "1"
+            assert client.post("/teams/", json={"name": "Busy", "tag": "BSY"}, headers=headers).status_code == 200
+        finally:
+            app.dependency_overrides[get_db] = override_get_db
+            busy_engine.dispose()
+
+@pytest.fixture
+def postgres_url():
+    # Local profile: point TEST_POSTGRES_URL at a throwaway database, e.g.
+    #   createdb tournament_test
+    #   TEST_POSTGRES_URL=postgresql://localhost/tournament_test pytest -k Postgres
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    pytest.importorskip("psycopg2")
+    return url
+
+class TestPostgres:
+    def test_migrations_and_writes(self, postgres_url):
+        pg_engine = create_engine(postgres_url, **database.engine_options(postgres_url))
+        try:
+            Base.metadata.drop_all(bind=pg_engine)
+            migrations.upgrade(pg_engine)
+            migrations.upgrade(pg_engine)  # a second run finds nothing to do
+            with sessionmaker(bind=pg_engine, expire_on_commit=False)() as db:
+                user = crud.create_user(db, schemas.UserCreate(**test_user))
+                tournament = crud.create_tournament(db, schemas.TournamentCreate(**test_tournament), user.id)
+                assert crud.get_tournament(db, tournament.id).name == test_tournament["name"]
+        finally:
+            Base.metadata.drop_all(bind=pg_engine)
+            pg_engine.dispose()
+
+    def test_statement_timeout(self, postgres_url):
+        pg_engine = create_engine(postgres_url, **database.engine_options(postgres_url, statement_timeout_ms=100))
+        try:
+            with pg_engine.connect() as conn:
+                assert conn.exec_driver_sql("SHOW statement_timeout").scalar() == "100ms"
+                with pytest.raises(OperationalError):
+                    conn.exec_driver_sql("SELECT pg_sleep(1)")
+        finally:
+            pg_engine.dispose()
+
+    def test_pre_ping_replaces_dropped_connections(self, postgres_url):
+        pg_engine = create_engine(postgres_url, **database.engine_options(postgres_url))
+        try:
+            with pg_engine.connect() as conn:
+                pid = conn.exec_driver_sql("SELECT pg_backend_pid()").scalar()
+            with create_engine(postgres_url).connect() as admin:
+                admin.exec_driver_sql(f"SELECT pg_terminate_backend({pid})")
+            with pg_engine.connect() as conn:
+                assert conn.exec_driver_sql("SELECT pg_backend_pid()").scalar() != pid
+        finally:
+            pg_engine.dispose()
+
+class TestBulk:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    def import_records(self, kind, body, format="ndjson"):
+        response = client.post(f"/import/{kind}", params={"format": format}, content=body, headers=self.headers)
+        assert response.status_code == 200
+        return response.json()
+
+    def test_ndjson_import_reports_bad_lines(self, monkeypatch):
+        import bulk
+        monkeypatch.setattr(bulk, "CHUNK_SIZE", 2)
+        teams_etag = client.get("/teams/").headers["etag"]
+        body = "\n".join([
+            '{"name": "Alpha", "tag": "ALP"}',
+            '{"name": "Bravo"}',
+            '',
+            '{"tag": "NONAME"}',
+            'not json',
+            '{"name": "Charlie", "description": "Imported"}',
+        ])
+        report = self.import_records("teams", body)
+        assert report["imported"] == 3
+        assert report["failed"] == 2
+        assert [e["line"] for e in report["errors"]] == [4, 5]
+        assert "name" in report["errors"][0]["detail"]
+
+        assert [t["name"] for t in client.get("/teams/").json()] == ["Alpha", "Bravo", "Charlie"]
+        assert client.get("/teams/").headers["etag"] != teams_etag
+        assert [r["name"] for r in client.get("/search", params={"q": "charl"}).json()] == ["Charlie"]
+
+    def test_csv_import_with_quoted_newlines(self):
+        body = (
+            "name,game,description,max_teams\r\n"
+            'Spring Cup,CS:GO,"Two\nlines, one comma",16\r\n'
+            "Summer Cup,Dota 2,,\r\n"
+            "Broken Cup,Dota 2,,many\r\n"
+        )
+        report = self.import_records("tournaments", body, format="csv")
+        assert report["imported"] == 2
+        assert report["errors"][0]["line"] == 5
+
+        tournaments = client.get("/tournaments/").json()
+        assert [t["description"] for t in tournaments] == ["Two\nlines, one comma", None]
+        assert tournaments[1]["max_teams"] == 16  # schema default
+        assert {t["organizer_id"] for t in tournaments} == {client.get("/users/me", headers=self.headers).json()["id"]}
+
+    def test_results_import_updates_standings(self):
+        tournament_id = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+        teams = [client.post("/teams/", json={"name": f"Team {i}"}, headers=self.headers).json()["id"] for i in range(2)]
+        body = "\n".join([
+            f'{{"tournament_id": {tournament_id}, "team1_id": {teams[0]}, "team2_id": {teams[1]}, "score1": 2, "score2": 1}}',
+            f'{{"tournament_id": {tournament_id}, "team1_id": {teams[0]}, "team2_id": {teams[1]}, "score1": 0, "score2": 2}}',
+            f'{{"tournament_id": {tournament_id}, "team1_id": {teams[0]}, "team2_id": 999, "score1": 2, "score2": 0}}',
+            f'{{"tournament_id": 999, "team1_id": {teams[0]}, "team2_id": {teams[1]}}}',
+        ])
+        report = self.import_records("results", body)
+        assert report["imported"] == 2
+        assert [e["detail"] for e in report["errors"]] == ["Team not found", "Tournament not found"]
+
+        standings = client.get(f"/tournaments/{tournament_id}/standings").json()
+        assert [(s["team_id"], s["wins"], s["maps_won"]) for s in standings] == [(teams[1], 1, 3), (teams[0], 1, 2)]
+
+    def test_export_round_trip(self):
+        for name in ("Alpha", "Bravo"):
+            client.post("/teams/", json={"name": name, "description": "Line one\nline two"}, headers=self.headers)
+
+        response = client.get("/export/teams", headers=self.headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = response.text.splitlines()
+        assert [json.loads(line)["name"] for line in lines] == ["Alpha", "Bravo"]
+
+        csv_export = client.get("/export/teams", params={"format": "csv"}, headers=self.headers).text
+        assert csv_export.splitlines()[0] == "name,tag,description,id,created_at"
+        report = self.import_records("teams", csv_export, format="csv")
+        assert report["failed"] == 2
+        assert report["errors"][0] == {"line": 2, "detail": "Team name already exists"}
+
+        report = self.import_records("teams", csv_export.replace("Alpha", "Charlie").replace("Bravo", "Delta"), format="csv")
+        assert report == {"kind": "teams", "imported": 2, "failed": 0, "errors": []}
+        assert [t["description"] for t in client.get("/teams/").json()] == ["Line one\nline two"] * 4
+
+    def test_requires_auth(self):
+        assert client.post("/import/teams", content='{"name": "Alpha"}').status_code == 401
+        assert client.get("/export/teams").status_code == 401
+
+class TestWriteRoundTrips:
+    def statements(self, request):
+        """Run request(); return the SQL it sent through the write engine."""
+        seen = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            seen.append(statement)
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            response = request()
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert response.status_code == 200, response.text
+        return response.json(), seen
+
+    def test_statement_counts(self):
+        _, sql = self.statements(lambda: client.post("/register", json=test_user))
+        assert len(sql) == 2  # BEGIN, INSERT .. RETURNING
+        token = client.post("/token", data={"username": test_user["username"], "password": test_user["password"]})
+        headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+
+        tournament, sql = self.statements(lambda: client.post("/tournaments/", json=test_tournament, headers=headers))
+        assert len(sql) == 4  # BEGIN, INSERT, search index, versions
+        updated, sql = self.statements(lambda: client.put(
+            f"/tournaments/{tournament['id']}", json={**test_tournament, "name": "Renamed"}, headers=headers))
+        assert len(sql) == 4 and "RETURNING" in sql[1]  # no SELECT before or after
+        assert updated["name"] == "Renamed" and updated["created_at"] == tournament["created_at"]
+
+        team, sql = self.statements(lambda: client.post("/teams/", json={"name": "Alpha"}, headers=headers))
+        assert len(sql) == 4
+        other = client.post("/teams/", json={"name": "Bravo"}, headers=headers).json()
+        _, sql = self.statements(lambda: client.post(
+            "/participations/", json={"tournament_id": tournament["id"], "team_id": team["id"]}, headers=headers))
+        assert len(sql) == 4  # BEGIN, duplicate check, versions, INSERT
+
+        match, sql = self.statements(lambda: client.post("/matches/", json={
+            "tournament_id": tournament["id"], "team1_id": team["id"], "team2_id": other["id"]}, headers=headers))
+        assert len(sql) == 3  # BEGIN, organizer check, INSERT
+        scored, sql = self.statements(lambda: client.put(
+            f"/matches/{match['id']}/score", params={"score1": 2, "score2": 0}, headers=headers))
+        # BEGIN, match + organizer, standings, both teams, versions, UPDATE teams (ratings), UPDATE match
+        assert len(sql) == 7
+        assert scored["winner_id"] == team["id"] and scored["status"] == "completed"
+
+    def test_unique_conflicts_are_reported(self):
+        assert client.post("/register", json=test_user).status_code == 200
+        response = client.post("/register", json=test_user)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Username already registered"
+        response = client.post("/register", json={**test_user, "username": "someone_else"})
+        assert response.json()["detail"] == "Email already registered"
+
+        token = client.post("/token", data={"username": test_user["username"], "password": test_user["password"]})
+        headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+        client.post("/teams/", json={"name": "Alpha", "tag": "ALP"}, headers=headers)
+        assert client.post("/teams/", json={"name": "Alpha"}, headers=headers).json()["detail"] == "Team name already exists"
+        assert client.post("/teams/", json={"name": "Bravo", "tag": "ALP"}, headers=headers).json()["detail"] == "Team tag already exists"
+        assert client.post("/teams/", json={"name": "Bravo", "tag": "BRV"}, headers=headers).status_code == 200
+
+    def test_update_by_someone_else_changes_nothing(self):
+        client.post("/register", json=test_user)
+        client.post("/register", json={**test_user, "username": "intruder", "email": "intruder@example.com"})
+        tokens = [
+            client.post("/token", data={"username": name, "password": test_user["password"]}).json()["access_token"]
+            for name in (test_user["username"], "intruder")
+        ]
+        tournament_id = client.post("/tournaments/", json=test_tournament,
+                                    headers={"Authorization": f"Bearer {tokens[0]}"}).json()["id"]
+        response = client.put(f"/tournaments/{tournament_id}", json={**test_tournament, "name": "Hijacked"},
+                              headers={"Authorization": f"Bearer {tokens[1]}"})
+        assert response.status_code == 403
+        assert client.get(f"/tournaments/{tournament_id}").json()["name"] == test_tournament["name"]
+
+class TestRegistrationCapacity:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    def setup_event(self, teams, **tournament):
+        tournament_id = client.post("/tournaments/", json={**test_tournament, **tournament}, headers=self.headers).json()["id"]
+        team_ids = [client.post("/teams/", json={"name": f"Team {i}"}, headers=self.headers).json()["id"] for i in range(teams)]
+        return tournament_id, team_ids
+
+    def register(self, tournament_id, team_id):
+        return client.post("/participations/", json={"tournament_id": tournament_id, "team_id": team_id}, headers=self.headers)
+
+    def test_full_tournament_refuses_registration(self):
+        tournament_id, team_ids = self.setup_event(3, max_teams=2)
+        assert [self.register(tournament_id, t).status_code for t in team_ids[:2]] == [200, 200]
+        response = self.register(tournament_id, team_ids[2])
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Tournament is full"
+        assert self.register(tournament_id, team_ids[0]).json()["detail"] == "Team already registered"
+        assert client.get(f"/tournaments/{tournament_id}").json()["registered_count"] == 2
+
+    def test_waitlist_fills_freed_seats(self):
+        tournament_id, team_ids = self.setup_event(4, max_teams=2, waitlist=True)
+        statuses = [self.register(tournament_id, t).json()["status"] for t in team_ids]
+        assert statuses == ["registered", "registered", "waitlisted", "waitlisted"]
+
+        response = client.delete(f"/tournaments/{tournament_id}/participants/{team_ids[0]}", headers=self.headers)
+        assert response.status_code == 200
+        participants = {p["team_id"]: p["status"] for p in client.get(f"/tournaments/{tournament_id}/participants").json()}
+        assert participants == {team_ids[1]: "registered", team_ids[2]: "registered", team_ids[3]: "waitlisted"}
+        assert client.get(f"/tournaments/{tournament_id}").json()["registered_count"] == 2
+
+        # More seats move the rest of the waitlist up
+        client.put(f"/tournaments/{tournament_id}", json={**test_tournament, "max_teams": 4, "waitlist": True},
+                   headers=self.headers)
+        participants = client.get(f"/tournaments/{tournament_id}/participants").json()
+        assert {p["status"] for p in participants} == {"registered"}
+
+        # Waitlisted teams don't get into the bracket
+        tournament_id, team_ids = self.setup_event(0, max_teams=2, waitlist=True)
+        teams = [client.post("/teams/", json={"name": f"Late {i}"}, headers=self.headers).json()["id"] for i in range(3)]
+        for team_id in teams:
+            self.register(tournament_id, team_id)
+        matches = client.post(f"/tournaments/{tournament_id}/bracket", json={"format": "single_elimination"},
+                              headers=self.headers).json()
+        assert {matches[0]["team1_id"], matches[0]["team2_id"]} == set(teams[:2])
+
+    def test_batch_respects_capacity(self):
+        strict_id, team_ids = self.setup_event(4, max_teams=2)
+        waitlist_id, _ = self.setup_event(0, max_teams=1, waitlist=True)
+        response = client.post("/participations/batch", json=[
+            {"tournament_id": tournament_id, "team_id": team_id}
+            for tournament_id in (strict_id, waitlist_id) for team_id in team_ids[:3]
+        ], headers=self.headers)
+        results = response.json()
+        assert [r["ok"] for r in results[:3]] == [True, True, False]
+        assert results[2]["detail"] == "Tournament is full"
+        assert [r["participation"]["status"] for r in results[3:]] == ["registered", "waitlisted", "waitlisted"]
+        assert client.get(f"/tournaments/{strict_id}").json()["registered_count"] == 2
+        assert client.get(f"/tournaments/{waitlist_id}").json()["registered_count"] == 1
+
+    @pytest.mark.parametrize("waitlist", [False, True])
+    def test_concurrent_registrations(self, waitlist):
+        import random
+        import threading
+        tournament_id, team_ids = self.setup_event(40, max_teams=8, waitlist=waitlist)
+        outcomes = []
+
+        def captain(seed):
+            # Every thread tries every team, in its own order, on its own connection
+            db = TestingSessionLocal()
+            order = team_ids[:]
+            random.Random(seed).shuffle(order)
+            try:
+                for team_id in order:
+                    try:
+                        result = crud.register_team(db, schemas.ParticipationCreate(tournament_id=tournament_id, team_id=team_id))
+                        outcomes.append(result.status if result else "duplicate")
+                    except ValueError as e:
+                        outcomes.append(str(e))
+            finally:
+                db.close()
+
+        threads = [threading.Thread(target=captain, args=(seed,)) for seed in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        db = TestingSessionLocal()
+        rows = db.query(models.Participation).filter(models.Participation.tournament_id == tournament_id).all()
+        registered_count = db.get(models.Tournament, tournament_id).registered_count
+        db.close()
+        registered = [p for p in rows if p.status == "registered"]
+        assert len({p.team_id for p in rows}) == len(rows)  # no duplicates
+        assert len(registered) == registered_count == 8
+        assert outcomes.count("registered") == 8
+        if waitlist:
+            assert len(rows) == 40 and outcomes.count("waitlisted") == 32
+        else:
+            assert len(rows) == 8 and outcomes.count("Tournament is full") > 0
+        assert len(outcomes) == 16 * 40
+
+    def test_participants_for_several_tournaments(self):
+        first, team_ids = self.setup_event(3)
+        second = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+        for team_id in team_ids:
+            self.register(first, team_id)
+        self.register(second, team_ids[0])
+
+        rows = client.get("/participations/", params={"tournament_id": [second, first, second]}).json()
+        assert [(row["tournament_id"], row["team_id"]) for row in rows] == sorted(
+            [(first, team_id) for team_id in team_ids] + [(second, team_ids[0])])
+        assert client.get("/participations/").status_code == 400
+        too_many = client.get("/participations/", params={"tournament_id": list(range(MAX_PARTICIPANT_LOOKUP + 1))})
+        assert too_many.status_code == 400
+
+def metric_value(text, sample):
+    for line in text.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.split()[-1])
+    return 0.0
+
+class TestRatings:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        self.tournament_id = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+        self.team_ids = [
+            client.post("/teams/", json={"name": f"Team {i}", "tag": f"T{i}"}, headers=self.headers).json()["id"]
+            for i in range(6)
+        ]
+
+    def play(self, team1_id, team2_id, score1, score2, day=1):
+        match_id = client.post("/matches/", json={
+            "tournament_id": self.tournament_id, "team1_id": team1_id, "team2_id": team2_id,
+            "match_date": f"2024-01-{day:02d}T12:00:00",
+        }, headers=self.headers).json()["id"]
+        self.score(match_id, score1, score2)
+        return match_id
+
+    def score(self, match_id, score1, score2):
+        response = client.put(f"/matches/{match_id}/score", params={"score1": score1, "score2": score2},
+                              headers=self.headers)
+        assert response.status_code == 200
+
+    def ratings(self):
+        return {e["id"]: e for e in client.get("/leaderboard", params={"min_matches": 0}).json()}
+
+    def test_results_move_ratings(self):
+        a, b = self.team_ids[:2]
+        match_id = self.play(a, b, 2, 0)
+        table = self.ratings()
+        assert table[a]["rating"] == pytest.approx(1516) and table[b]["rating"] == pytest.approx(1484)
+        assert table[a]["rated_matches"] == 1
+
+        self.score(match_id, 2, 1)  # same winner, nothing to redo
+        assert self.ratings()[a]["rating"] == pytest.approx(1516)
+        self.score(match_id, 0, 2)  # corrected: the first result is taken back
+        table = self.ratings()
+        assert table[a]["rating"] == pytest.approx(1484) and table[b]["rating"] == pytest.approx(1516)
+        assert table[a]["rated_matches"] == 1
+        self.score(match_id, 1, 1)  # no longer final
+        table = self.ratings()
+        assert table[a]["rating"] == pytest.approx(1500) and table[a]["rated_matches"] == 0
+
+    def test_recompute_replays_history_by_date(self):
+        import random
+        import ratings
+        rng = random.Random(7)
+        games = []
+        for day in range(1, 29):
+            a, b = rng.sample(self.team_ids, 2)
+            won = rng.random() < 0.5
+            games.append((day, a, b, won))
+        # Score them out of date order so the incremental ratings differ from a replay
+        for day, a, b, won in reversed(games):
+            self.play(a, b, 2 if won else 0, 0 if won else 2, day=day)
+
+        expected = dict.fromkeys(self.team_ids, ratings.INITIAL_RATING)
+        for _, a, b, won in games:
+            delta = ratings.rating_delta(expected[a], expected[b], won)
+            expected[a] += delta
+            expected[b] -= delta
+
+        url = "/ratings/recompute"
+        assert client.post(url, headers=self.headers).status_code == 403
+        db = TestingSessionLocal()
+        crud.update_user(db, crud.get_user_by_username(db, test_user["username"]).id, {"is_admin": True})
+        db.close()
+        response = client.post(url, headers=self.headers)
+        assert response.status_code == 200
+        assert response.json()["matches"] == len(games) and response.json()["teams"] == len(self.team_ids)
+        assert response.json()["waves"] < len(games)
+        table = self.ratings()
+        for team_id, rating in expected.items():
+            assert table[team_id]["rating"] == pytest.approx(rating)
+
+        # Every stored delta now matches the replay, so a correction undoes exactly
+        db = TestingSessionLocal()
+        stored = sum(d for (d,) in db.query(models.Match.rating_delta).filter(models.Match.team1_id == self.team_ids[0]))
+        stored -= sum(d for (d,) in db.query(models.Match.rating_delta).filter(models.Match.team2_id == self.team_ids[0]))
+        db.close()
+        assert ratings.INITIAL_RATING + stored == pytest.approx(expected[self.team_ids[0]])
+
+    def test_recompute_with_teams_created_meanwhile(self, monkeypatch):
+        import ratings
+        a, b = self.team_ids[:2]
+        self.play(a, b, 2, 0)
+        current = versions.current
+        checks = []
+
+        def create_team_after_check(db, key):
+            version = current(db, key)
+            checks.append(key)
+            if len(checks) == 2:
+                # Postgres runs read committed without a lock here, so a team can land
+                # between the final version check and the write
+                db.execute(models.Team.__table__.insert().values(name="Latecomer", tag="LATE"))
+            return version
+        monkeypatch.setattr(versions, "current", create_team_after_check)
+
+        db = TestingSessionLocal()
+        assert ratings.recompute(db)["teams"] == len(self.team_ids) + 1
+        db.close()
+        table = self.ratings()
+        latecomer = max(table)
+        assert table[latecomer]["rating"] == ratings.INITIAL_RATING and table[latecomer]["rated_matches"] == 0
+        assert table[a]["rating"] == pytest.approx(1516)
+
+    def test_leaderboard_pages_by_rating(self):
+        a, b, c, d = self.team_ids[:4]
+        self.play(a, b, 2, 0)
+        self.play(c, d, 2, 0)
+        self.play(a, c, 2, 0)
+
+        full = client.get("/leaderboard").json()
+        assert [e["id"] for e in full][0] == a and len(full) == 4  # unplayed teams are left out
+        assert [e["rating"] for e in full] == sorted((e["rating"] for e in full), reverse=True)
+
+        seen, after = [], None
+        while True:
+            response = client.get("/leaderboard", params={"limit": 3, **({"after": after} if after else {})})
+            seen += response.json()
+            after = response.headers.get("X-Next-Cursor")
+            if after is None:
+                break
+        assert seen == full
+        assert client.get("/leaderboard", params={"after": "garbage"}).status_code == 400
+
+        etag = client.get("/leaderboard").headers["ETag"]
+        assert client.get("/leaderboard", headers={"If-None-Match": etag}).status_code == 304
+        self.play(b, d, 2, 0)
+        assert client.get("/leaderboard", headers={"If-None-Match": etag}).status_code == 200
+
+    def test_imported_results_are_rated(self):
+        a, b = self.team_ids[:2]
+        lines = "\n".join(json.dumps({"tournament_id": self.tournament_id, "team1_id": a, "team2_id": b,
+                                       "score1": 2, "score2": 0}) for _ in range(2))
+        response = client.post("/import/results", content=lines, headers=self.headers)
+        assert response.json()["imported"] == 2
+        table = self.ratings()
+        # The second win counts for less: a was already the favourite
+        first = 16.0
+        second = 32 * (1 - 1 / (1 + 10 ** ((1484 - 1516) / 400)))
+        assert table[a]["rating"] == pytest.approx(1500 + first + second)
+        assert table[b]["rated_matches"] == 2
+
+class TestJobs:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        db = TestingSessionLocal()
+        crud.update_user(db, crud.get_user_by_username(db, test_user["username"]).id, {"is_admin": True})
+        db.close()
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        self.runner = jobs.JobRunner(TestingSessionLocal, TestingReadSessionLocal, executor="thread")
+
+    def job(self, job_id):
+        response = client.get(f"/jobs/{job_id}", headers=self.headers)
+        assert response.status_code == 200
+        return response.json()
+
+    def test_recompute_runs_in_background(self):
+        team_ids = [client.post("/teams/", json={"name": f"Team {i}"}, headers=self.headers).json()["id"]
+                    for i in range(2)]
+        tournament_id = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+        match_id = client.post("/matches/", json={
+            "tournament_id": tournament_id, "team1_id": team_ids[0], "team2_id": team_ids[1]}, headers=self.headers).json()["id"]
+        client.put(f"/matches/{match_id}/score", params={"score1": 2, "score2": 0}, headers=self.headers)
+
+        response = client.post("/ratings/recompute", params={"background": True}, headers=self.headers)
+        assert response.status_code == 202
+        job = response.json()
+        assert response.headers["Location"] == f"/jobs/{job['id']}"
+        assert job["status"] == "queued" and job["kind"] == "recompute_ratings"
+
+        self.runner.drain()
+        job = self.job(job["id"])
+        assert job["status"] == "succeeded"
+        assert job["result"]["matches"] == 1 and job["progress"] == job["total"] == 2
+        assert job["started_at"] is not None and job["finished_at"] is not None
+        assert [j["id"] for j in client.get("/jobs", headers=self.headers).json()] == [job["id"]]
+
+    def test_export_job_output_downloads(self):
+        for name in ("Alpha", "Bravo"):
+            client.post("/teams/", json={"name": name}, headers=self.headers)
+        response = client.post("/export/teams", params={"format": "csv"}, headers=self.headers)
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        assert client.get(f"/jobs/{job_id}/download", headers=self.headers).status_code == 409
+
+        self.runner.drain()
+        assert self.job(job_id)["result"]["rows"] == 2
+        download = client.get(f"/jobs/{job_id}/download", headers=self.headers)
+        assert download.status_code == 200
+        assert download.headers["content-disposition"] == 'attachment; filename="teams.csv"'
+        assert download.text == client.get("/export/teams", params={"format": "csv"}, headers=self.headers).text
+
+    def test_failures_are_recorded(self):
+        tournament_id = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+        team_ids = [client.post("/teams/", json={"name": f"Team {i}"}, headers=self.headers).json()["id"]
+                    for i in range(2)]
+        for team_id in team_ids:
+            client.post("/participations/", json={"tournament_id": tournament_id, "team_id": team_id}, headers=self.headers)
+        submit = lambda: client.post(f"/tournaments/{tournament_id}/bracket", params={"background": True},
+                                     json={"format": "single_elimination"}, headers=self.headers)
+        first, second = submit(), submit()
+        assert first.status_code == second.status_code == 202
+
+        self.runner.drain()
+        # Both run at once; whichever writes second fails
+        results = sorted((self.job(r.json()["id"]) for r in (first, second)), key=lambda job: job["status"])
+        assert [job["status"] for job in results] == ["failed", "succeeded"]
+        assert results[0]["error"] == "Bracket already generated"
+
+    def test_limits_and_stale_jobs(self):
+        db = TestingSessionLocal()
+        first = jobs.submit(db, "recompute_ratings", {})
+        second = jobs.submit(db, "recompute_ratings", {})
+        export = jobs.submit(db, "export", {"kind": "teams", "format": "ndjson"})
+        assert jobs.claim(db).id == first.id
+        # One recompute at a time: the other kind goes first
+        assert jobs.claim(db).id == export.id
+        assert jobs.claim(db) is None
+
+        db.query(models.Job).filter(models.Job.id == first.id).update({"heartbeat_at": datetime.utcnow() - timedelta(hours=1)})
+        db.commit()
+        assert jobs.claim(db) is None
+        assert jobs.reap_stale(db) == 1
+        assert jobs.claim(db).id == second.id
+        stale = db.get(models.Job, first.id)
+        db.refresh(stale)
+        assert stale.status == "failed" and stale.error == "Worker stopped while the job was running"
+        db.close()
+
+    def test_idle_runner_stays_off_the_write_lock(self):
+        writes = []
+        listener = lambda *args: writes.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            assert self.runner.dispatch() == 0
+            assert writes == []
+
+            # Another runner's job, still beating: looked at only every JOB_REAP_SECONDS
+            db = TestingSessionLocal()
+            job = jobs.submit(db, "recompute_ratings", {})
+            db.query(models.Job).filter(models.Job.id == job.id).update(
+                {"status": "running", "heartbeat_at": datetime.utcnow()})
+            db.commit()
+            db.close()
+            writes.clear()
+            self.runner.dispatch()
+            reaps = len(writes)
+            assert reaps and any("UPDATE jobs" in statement for statement in writes)
+            self.runner.dispatch()
+            assert len(writes) == reaps
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+    def test_jobs_are_private(self):
+        job_id = client.post("/standings/rebuild", headers=self.headers).json()["id"]
+        client.post("/register", json={**test_user, "username": "other", "email": "other@example.com"})
+        token = client.post("/token", data={"username": "other", "password": test_user["password"]}).json()["access_token"]
+        other = {"Authorization": f"Bearer {token}"}
+        assert client.get(f"/jobs/{job_id}", headers=other).status_code == 404
+        assert client.get("/jobs", headers=other).json() == []
+        assert client.post("/standings/rebuild", headers=other).status_code == 403
+
+    def test_process_pool_runs_jobs(self, monkeypatch):
+        # Pool processes connect through database.py, so point it at the test database
+        monkeypatch.setenv("DATABASE_URL", SQLALCHEMY_DATABASE_URL)
+        client.post("/tournaments/", json=test_tournament, headers=self.headers)
+        job_id = client.post("/standings/rebuild", headers=self.headers).json()["id"]
+        runner = jobs.JobRunner(TestingSessionLocal, TestingReadSessionLocal, executor="process", workers=1)
+        try:
+            runner.drain()
+        finally:
+            asyncio.run(runner.stop())
+        job = self.job(job_id)
+        assert job["status"] == "succeeded" and job["result"] == {"tournaments": 1, "changed": 0}
+
+class TestArchive:
+    def setup_method(self):
+        client.post("/register", json=test_user)
+        db = TestingSessionLocal()
+        crud.update_user(db, crud.get_user_by_username(db, test_user["username"]).id, {"is_admin": True})
+        db.close()
+        login_response = client.post("/token", data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        })
+        self.headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        self.team_ids = [client.post("/teams/", json={"name": f"Team {i}"}, headers=self.headers).json()["id"]
+                         for i in range(4)]
+
+    def played_tournament(self, **fields):
+        tournament_id = client.post("/tournaments/", json={**test_tournament, **fields}, headers=self.headers).json()["id"]
+        client.post("/participations/batch", headers=self.headers,
+                    json=[{"tournament_id": tournament_id, "team_id": t} for t in self.team_ids])
+        matches = client.post(f"/tournaments/{tournament_id}/bracket", json={"format": "round_robin"},
+                              headers=self.headers).json()
+        client.put("/matches/scores", json=[{"match_id": m["id"], "score1": 2, "score2": 0} for m in matches],
+                   headers=self.headers)
+        return tournament_id
+
+    def test_finished_tournaments_move_to_the_archive(self, monkeypatch):
+        import archive
+        monkeypatch.setattr(archive, "ARCHIVE_PAUSE_SECONDS", 0)
+        long_ago = (datetime.utcnow() - timedelta(days=400)).isoformat()
+        old = self.played_tournament(end_date=long_ago)
+        completed = self.played_tournament()
+        db = TestingSessionLocal()
+        db.query(models.Tournament).filter(models.Tournament.id == completed).update({
+            "status": "completed", "created_at": datetime.utcnow() - timedelta(days=400)})
+        db.commit()
+        db.close()
+        recent = self.played_tournament(end_date=datetime.utcnow().isoformat())
+        before = {t: client.get(f"/tournaments/{t}").json() for t in (old, completed)}
+        rated = {e["id"]: e for e in client.get("/leaderboard").json()}
+
+        assert client.post("/archive", params={"older_than_days": 30}).status_code == 401
+        response = client.post("/archive", params={"older_than_days": 30}, headers=self.headers)
+        assert response.status_code == 202
+        jobs.JobRunner(TestingSessionLocal, TestingReadSessionLocal, executor="thread").drain()
+        job = client.get(f"/jobs/{response.json()['id']}", headers=self.headers).json()
+        assert job["status"] == "succeeded", job["error"]
+        assert {k: v for k, v in job["result"].items() if k != "seconds"} == {
+            "tournaments": 2, "standings": 8, "participations": 8, "matches": 12}
+
+        # Gone from the hot tables, still there by id
+        assert [t["id"] for t in client.get("/tournaments/").json()] == [recent]
+        for tournament_id, body in before.items():
+            assert client.get(f"/tournaments/{tournament_id}").json() == body
+            assert client.get(f"/tournaments/{tournament_id}/standings").json() == []
+        assert client.get("/tournaments/999999").status_code == 404
+
+        # Archived results still count towards ratings
+        assert client.post("/ratings/recompute", headers=self.headers).json()["matches"] == 18
+        after = {e["id"]: e for e in client.get("/leaderboard").json()}
+        for team_id, entry in rated.items():
+            assert after[team_id]["rated_matches"] == entry["rated_matches"]
+            assert after[team_id]["rating"] == pytest.approx(entry["rating"])
+
+        db = TestingSessionLocal()
+        assert archive.run(db, 30)["tournaments"] == 0
+        db.close()
+
+    def test_archived_ids_are_not_handed_out_again(self, monkeypatch):
+        import archive
+        monkeypatch.setattr(archive, "ARCHIVE_PAUSE_SECONDS", 0)
+        only = self.played_tournament(end_date=(datetime.utcnow() - timedelta(days=400)).isoformat())
+        db = TestingSessionLocal()
+        assert archive.run(db, 30)["tournaments"] == 1
+        db.close()
+        assert self.played_tournament() > only
+        assert client.get(f"/tournaments/{only}").status_code == 200
+
+    def test_archives_after_a_withdrawal(self, monkeypatch):
+        import archive
+        monkeypatch.setattr(archive, "ARCHIVE_PAUSE_SECONDS", 0)
+        live = client.post("/tournaments/", json=test_tournament, headers=self.headers).json()["id"]
+        client.post("/participations/", json={"tournament_id": live, "team_id": self.team_ids[0]}, headers=self.headers)
+        old = self.played_tournament(end_date=(datetime.utcnow() - timedelta(days=400)).isoformat())
+        client.post("/participations/", json={"tournament_id": live, "team_id": self.team_ids[1]}, headers=self.headers)
+        db = TestingSessionLocal()
+        assert archive.run(db, 30)["tournaments"] == 1
+
+        # The live table shrinks below ids already in the archive
+        client.delete(f"/tournaments/{live}/participants/{self.team_ids[1]}", headers=self.headers)
+        rejoined = client.post("/participations/", json={"tournament_id": live, "team_id": self.team_ids[1]},
+                               headers=self.headers).json()
+        archived_ids = set(db.scalars(select(models.archived_participations.c.id)))
+        assert rejoined["id"] not in archived_ids
+
+        db.query(models.Tournament).filter(models.Tournament.id == live).update(
+            {"end_date": datetime.utcnow() - timedelta(days=400)})
+        db.commit()
+        moved = archive.run(db, 30)
+        db.close()
+        assert (moved["tournaments"], moved["participations"]) == (1, 2)
+        for tournament_id in (live, old):
+            assert client.get(f"/tournaments/{tournament_id}").status_code == 200
+
+class TestMetrics:
+    def setup_method(self):
+        self.token = metrics.METRICS_TOKEN
+        metrics.METRICS_TOKEN = "scrape-token"
+
+    def teardown_method(self):
+        metrics.METRICS_TOKEN = self.token
+
+    def scrape(self):
+        response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        return response.text
+
+    def test_requests_are_labelled_by_route(self):
+        client.post("/register", json=test_user)
+        token = client.post("/token", data={"username": test_user["username"], "password": test_user["password"]})
+        headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+        tournament_id = client.post("/tournaments/", json=test_tournament, headers=headers).json()["id"]
+
+        route = 'method="GET",route="/tournaments/{tournament_id}"'
+        before = self.scrape()
+        client.get(f"/tournaments/{tournament_id}")
+        client.get("/tournaments/999")
+        after = self.scrape()
+
+        for status in ("200", "404"):
+            sample = f'http_requests_total{{{route},status="{status}"}}'
+            assert metric_value(after, sample) - metric_value(before, sample) == 1
+        assert metric_value(after, f"http_request_duration_seconds_count{{{route}}}") - \
+            metric_value(before, f"http_request_duration_seconds_count{{{route}}}") == 2
+        # Version check and the row itself, for each request
+        assert metric_value(after, f"http_request_db_statements_total{{{route}}}") - \
+            metric_value(before, f"http_request_db_statements_total{{{route}}}") >= 3
+        assert metric_value(after, f'password_hash_duration_seconds_count{{operation="verify"}}') >= 1
+        assert 'db_pool_checked_out{engine="write"}' in after
+
+    def test_unmatched_paths_share_a_series(self):
+        before = metric_value(self.scrape(), 'http_requests_total{method="GET",route="unmatched",status="404"}')
+        client.get("/no/such/path/1")
+        client.get("/no/such/path/2")
+        after = metric_value(self.scrape(), 'http_requests_total{method="GET",route="unmatched",status="404"}')
+        assert after - before == 2
+
+    def test_scrapes_need_an_allowed_address_or_the_token(self, monkeypatch):
+        assert client.get("/metrics").status_code == 403
+        assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+        monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+        assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 403
+        monkeypatch.setattr(metrics, "METRICS_ALLOW_IPS", {"testclient"})
+        assert "password_hash_pool_in_flight" in client.get("/metrics").text
+
+    def test_event_streams_are_timed_to_their_headers(self, monkeypatch, caplog):
+        monkeypatch.setattr(metrics, "SLOW_REQUEST_MS", 50)
+
+        def app_sending(content_type):
+            async def app(scope, receive, send):
+                await send({"type": "http.response.start", "status": 200,
+                            "headers": [(b"content-type", content_type)]})
+                await asyncio.sleep(0.1)  # a spectator watching, then leaving
+                await send({"type": "http.response.body", "body": b""})
+            return metrics.MetricsMiddleware(app)
+
+        async def noop(message):
+            pass
+
+        scope = {"type": "http", "method": "GET", "path": "/"}
+        with caplog.at_level("WARNING", logger="tournament.slow_requests"):
+            asyncio.run(app_sending(b"text/event-stream")(scope, None, noop))
+            assert not caplog.records
+            asyncio.run(app_sending(b"text/plain")(scope, None, noop))
+            assert len(caplog.records) == 1
+
+    def test_slow_requests_are_logged_with_statements(self, monkeypatch, caplog):
+        monkeypatch.setattr(metrics, "SLOW_REQUEST_MS", 0)
+        with caplog.at_level("WARNING", logger="tournament.slow_requests"):
+            client.get("/tournaments/")
+        message = caplog.records[-1].getMessage()
+        assert message.startswith("Slow request GET /tournaments/ -> 200")
+        assert "SELECT tournaments.id" in message
+
 if __name__ == "__main__":
-    pytest.main([__file__, "-v"])
\ No newline at end of file
+    pytest.main([__file__, "-v"])
+
+# The schema as the first release created it
+BASELINE_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL, email VARCHAR(100) NOT NULL,
+    hashed_password VARCHAR(255) NOT NULL, full_name VARCHAR(100), bio TEXT, is_active BOOLEAN, is_admin BOOLEAN,
+    created_at DATETIME);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE TABLE teams (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL UNIQUE, tag VARCHAR(10) UNIQUE,
+    description TEXT, created_at DATETIME);
+CREATE TABLE team_players (id INTEGER PRIMARY KEY, team_id INTEGER REFERENCES teams (id),
+    user_id INTEGER REFERENCES users (id), is_captain BOOLEAN, joined_at DATETIME);
+CREATE TABLE tournaments (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, game VARCHAR(50) NOT NULL,
+    description TEXT, max_teams INTEGER, prize_pool INTEGER, start_date DATETIME, end_date DATETIME,
+    status VARCHAR(20), organizer_id INTEGER REFERENCES users (id), created_at DATETIME);
+CREATE TABLE matches (id INTEGER PRIMARY KEY, tournament_id INTEGER REFERENCES tournaments (id), round INTEGER,
+    team1_id INTEGER REFERENCES teams (id), team2_id INTEGER REFERENCES teams (id), score1 INTEGER,
+    score2 INTEGER, winner_id INTEGER REFERENCES teams (id), match_date DATETIME, status VARCHAR(20));
+CREATE TABLE participations (id INTEGER PRIMARY KEY, tournament_id INTEGER REFERENCES tournaments (id),
+    team_id INTEGER REFERENCES teams (id), registered_at DATETIME, final_position INTEGER);
+CREATE INDEX ix_users_id ON users (id);
+CREATE INDEX ix_teams_id ON teams (id);
+CREATE INDEX ix_team_players_id ON team_players (id);
+CREATE INDEX ix_tournaments_id ON tournaments (id);
+CREATE INDEX ix_matches_id ON matches (id);
+CREATE INDEX ix_participations_id ON participations (id);
+INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'old', 'old@example.com', 'x');
+INSERT INTO tournaments (id, name, game, max_teams, organizer_id) VALUES (1, 'Old Cup', 'CS:GO', 8, 1);
+INSERT INTO teams (id, name) VALUES (1, 'Old A'), (2, 'Old B');
+INSERT INTO participations (tournament_id, team_id) VALUES (1, 1), (1, 2), (1, 2);
+INSERT INTO matches (tournament_id, round, team1_id, team2_id, score1, score2, winner_id, status)
+    VALUES (1, 1, 1, 2, 2, 0, 1, 'completed');
+"""
+
+class TestMigrations:
+    def upgraded_engine(self, path, schema=None):
+        old_engine = create_engine(f"sqlite:///{path}")
+        configure_sqlite(old_engine)
+        if schema:
+            with old_engine.begin() as conn:
+                for statement in schema.split(";"):
+                    if statement.strip():
+                        conn.exec_driver_sql(statement)
+        return old_engine
+
+    def assert_matches_models(self, conn):
+        from sqlalchemy import inspect
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            assert {column.name for column in table.columns} <= columns, table.name
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            assert {index.name for index in table.indexes} <= indexes, table.name
+
+    def test_upgrades_a_first_release_database(self, tmp_path):
+        old_engine = self.upgraded_engine(tmp_path / "old.db", BASELINE_SCHEMA)
+        assert migrations.upgrade(old_engine) == [name for _, name, _ in migrations.MIGRATIONS]
+        with old_engine.connect() as conn:
+            self.assert_matches_models(conn)
+            # The duplicate registration is gone and the count matches what's left
+            assert conn.exec_driver_sql("SELECT count(*) FROM participations").scalar() == 2
+            assert conn.exec_driver_sql("SELECT registered_count, waitlist FROM tournaments").one() == (2, 0)
+            assert conn.exec_driver_sql("SELECT rating FROM teams WHERE id = 1").scalar() == 1500
+            # Rebuilt to never reuse ids, carrying on from the last one
+            for table in ("tournaments", "participations", "matches", "standings"):
+                assert "AUTOINCREMENT" in conn.exec_driver_sql(
+                    "SELECT sql FROM sqlite_master WHERE name = ?", (table,)).scalar()
+            assert conn.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = 'participations'").scalar() == 2
+            # Rows from before the search index are searchable
+            assert conn.exec_driver_sql(
+                "SELECT rowid FROM search_index WHERE search_index MATCH 'old' ORDER BY rowid").scalars().all() == [2, 3, 5]
+        assert migrations.upgrade(old_engine) == []
+        old_engine.dispose()
+
+    def test_new_database_is_only_stamped(self, tmp_path):
+        new_engine = self.upgraded_engine(tmp_path / "new.db")
+        assert migrations.upgrade(new_engine) == []
+        with new_engine.connect() as conn:
+            self.assert_matches_models(conn)
+            applied = conn.exec_driver_sql("SELECT version FROM schema_migrations ORDER BY version").scalars().all()
+            assert conn.exec_driver_sql("SELECT count(*) FROM search_index").scalar() == 0
+        assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+        new_engine.dispose()
+
+# Seconds a worker may take to import the app (measured around 0.9s)
+STARTUP_BUDGET_SECONDS = 3.0
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestStartup:
+    def test_import_stays_within_budget(self, tmp_path):
+        db_path = tmp_path / "startup.db"
+        script = (
+            "import json, sys, time\n"
+            "started = time.perf_counter()\n"
+            "import main\n"
+            "print(json.dumps({'seconds': time.perf_counter() - started,\n"
+            "                  'deferred': [m for m in ('jose', 'passlib', 'bcrypt', 'numpy') if m in sys.modules]}))\n"
+        )
+        result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True,
+                                env={**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"}, timeout=60)
+        assert result.returncode == 0, result.stderr
+        report = json.loads(result.stdout.splitlines()[-1])
+        assert report["deferred"] == []
+        assert report["seconds"] < STARTUP_BUDGET_SECONDS
+        # No schema work at import: the launcher migrates, once, before workers fork
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall() == []
+
+    def test_launcher_migrates_before_starting_workers(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(database, "engine", engine)
+        monkeypatch.setattr(migrations, "upgrade", lambda upgraded: calls.append(("upgrade", upgraded)) or [])
+        monkeypatch.setattr(serve.uvicorn, "run", lambda app, **options: calls.append(("run", app, options["workers"])))
+        serve.main(["--workers", "3"])
+        assert calls == [("upgrade", engine), ("run", "main:app", 3)]
+
+        calls.clear()
+        serve.main(["--workers", "3", "--skip-migrations"])
+        assert calls == [("run", "main:app", 3)]
+
+    def test_launcher_migration_boots_a_new_database(self, tmp_path):
+        # In a fresh interpreter, so nothing the tests import can build schema on the side
+        db_path = tmp_path / "new.db"
+        script = (
+            "import serve\n"
+            "serve.migrate()\n"
+            "import crud, schemas\n"
+            "from database import SessionLocal\n"
+            "with SessionLocal() as db:\n"
+            "    crud.create_team(db, schemas.TeamCreate(name='Fresh Team', tag='FRSH'))\n"
+        )
+        result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True,
+                                env={**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"}, timeout=60)
+        assert result.returncode == 0, result.stderr
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT rowid FROM search_index WHERE search_index MATCH 'fresh'").fetchall() == [(3,)]
+
+# Filtered statements that read all (or nearly all) of a table on purpose
+INTENDED_SCANS = (
+    "FROM matches WHERE matches.status = ? AND matches.winner_id IS NOT NULL",  # ratings.recompute: every result
+    "UPDATE matches SET rating_delta=? WHERE matches.rating_delta IS NOT NULL",  # ...and clearing the rest
+    "INSERT INTO search_index(rowid, name, tag, description) SELECT id * 2",  # search.create_index: every row
+)
+
+def table_scans(conn, statement, parameters) -> list:
+    """Tables the statement reads in full, per SQLite's EXPLAIN QUERY PLAN.
+
+    Walking a whole index ("SCAN t USING INDEX") is allowed: that is a keyset
+    page or an ordered read stopped by LIMIT. Unfiltered statements, such as
+    exports, are allowed too, since no index could help them.
+    """
+    flat = " ".join(statement.split())
+    if " WHERE " not in flat or any(marker in flat for marker in INTENDED_SCANS):
+        return []
+    plan = conn.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    return [detail for *_, detail in plan
+            if detail.startswith("SCAN ") and " USING " not in detail
+            and "VIRTUAL TABLE" not in detail and "CONSTANT ROW" not in detail and "(subquery" not in detail]
+
+class TestQueryPlans:
+    """No query the app ran in this session may fall back to a table scan.
+
+    Runs last, over every statement recorded so far. It first drives the main
+    routes itself, so it also holds when run alone.
+    """
+    def exercise_routes(self):
+        client.post("/register", json=test_user)
+        db = TestingSessionLocal()
+        db.query(models.User).update({"is_admin": True})
+        db.commit()
+        db.close()
+        token = client.post("/token", data={"username": test_user["username"], "password": test_user["password"]}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        team_ids = [client.post("/teams/", json={"name": f"Plan {i}", "tag": f"P{i}"}, headers=headers).json()["id"]
+                    for i in range(6)]
+        swiss = client.post("/tournaments/", json=test_tournament, headers=headers).json()["id"]
+        capped = client.post("/tournaments/", json={**test_tournament, "max_teams": 2, "waitlist": True}, headers=headers).json()["id"]
+        client.post("/participations/batch", json=[{"tournament_id": swiss, "team_id": t} for t in team_ids], headers=headers)
+        for team_id in team_ids[:3]:
+            client.post("/participations/", json={"tournament_id": capped, "team_id": team_id}, headers=headers)
+        client.delete(f"/tournaments/{capped}/participants/{team_ids[0]}", headers=headers)
+
+        matches = client.post(f"/tournaments/{swiss}/bracket", json={"format": "swiss"}, headers=headers).json()
+        playable = [m for m in matches if m["team1_id"] and m["team2_id"]]
+        client.put(f"/matches/{playable[0]['id']}/score", params={"score1": 2, "score2": 0}, headers=headers)
+        client.put("/matches/scores", json=[{"match_id": m["id"], "score1": 0, "score2": 2} for m in playable[1:]], headers=headers)
+
+        for url in (f"/tournaments/{swiss}", f"/tournaments/{swiss}/full", f"/tournaments/{swiss}/standings",
+                    f"/tournaments/{swiss}/participants", "/tournaments/?game=CS:GO", "/teams/", "/leaderboard",
+                    "/search?q=plan", "/jobs", "/export/teams"):
+            client.get(url, headers=headers)
+        client.get("/participations/", params={"tournament_id": [swiss, capped]})
+        client.post(f"/tournaments/{swiss}/standings/rebuild", headers=headers)
+        client.delete(f"/tournaments/{capped}", headers=headers)
+
+    def test_no_table_scans(self):
+        self.exercise_routes()
+        conn = sqlite3.connect("test.db")
+        try:
+            scans = {}
+            for statement, parameters in executed_statements.items():
+                if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")):
+                    if found := table_scans(conn, statement, parameters):
+                        scans[" ".join(statement.split())] = found
+        finally:
+            conn.close()
+        assert not scans, json.dumps(scans, indent=2)
@@ -0,0 +1,95 @@
+"""Version counters behind the ETag / Last-Modified headers of read endpoints.
+
+crud bumps the counters of whatever a write changes, inside the same
+transaction, so a version never moves without its data. A conditional GET
+reads only the counter row. When the client's ETag still matches, the route
+answers 304 before it runs the real query or serializes anything.
+
+The counters live in the database rather than in memory, so every worker
+sees the same versions.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+
+TOURNAMENTS = "tournaments"
+TEAMS = "teams"
+RATINGS = "ratings"
+
+def tournament(tournament_id: int) -> str:
+    return f"tournament:{tournament_id}"
+
+def participants(tournament_id: int) -> str:
+    return f"participants:{tournament_id}"
+
+def _insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def bump(db: Session, *keys: str):
+    """Advance each key's version; call before the write's commit."""
+    now = datetime.utcnow()
+    insert = _insert(db)
+    stmt = insert(models.ResourceVersion).values(
+        [{"key": key, "version": 1, "updated_at": now} for key in dict.fromkeys(keys)]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.ResourceVersion.key],
+        set_={"version": models.ResourceVersion.version + 1, "updated_at": now},
+    )
+    db.execute(stmt)
+
+def current(db: Session, key: str) -> int:
+    """The key's version, from the write session (for optimistic checks)."""
+    return db.scalar(select(models.ResourceVersion.version).where(models.ResourceVersion.key == key)) or 0
+
+async def get(db: AsyncSession, key: str) -> Tuple[int, Optional[datetime]]:
+    row = (await db.execute(
+        select(models.ResourceVersion.version, models.ResourceVersion.updated_at)
+        .where(models.ResourceVersion.key == key)
+    )).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+def etag(key: str, version: int) -> str:
+    return f'W/"{key}:{version}"'
+
+def last_modified(updated_at: datetime) -> str:
+    return format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+
+def settled(updated_at: datetime) -> bool:
+    """Whether the second updated_at falls in is over.
+
+    Until it is, another write can land in the same second, and a
+    one-second Last-Modified couldn't tell the two apart.
+    """
+    return updated_at.replace(microsecond=0) < datetime.utcnow().replace(microsecond=0)
+
+def _strip_weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+def not_modified(if_none_match: Optional[str], if_modified_since: Optional[str],
+                 current_etag: str, updated_at: Optional[datetime]) -> bool:
+    # If-None-Match wins when both are sent (RFC 9110 13.2.2)
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        wanted = _strip_weak(current_etag)
+        return any(_strip_weak(tag.strip()) == wanted for tag in if_none_match.split(","))
+    if if_modified_since is not None and updated_at is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        # HTTP dates have one-second resolution, so only a settled second
+        # can be compared; clients that also send the ETag get the exact answer above
+        return settled(updated_at) and updated_at.replace(microsecond=0) <= since
+    return False
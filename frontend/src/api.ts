@@ -13,6 +13,12 @@ export interface User {
     created_at: string;
 }
 
+export interface PublicUser {
+    id: number;
+    username: string;
+    full_name?: string;
+}
+
 export interface Tournament {
     id: number;
     name: string;
@@ -23,6 +29,9 @@ export interface Tournament {
     start_date?: string;
     end_date?: string;
     status: string;
+    bracket_format?: BracketFormat;
+    registered_count: number;
+    waitlist: boolean;
     organizer_id: number;
     created_at: string;
 }
@@ -39,23 +48,89 @@ export interface Match {
     id: number;
     tournament_id: number;
     round: number;
-    team1_id: number;
-    team2_id: number;
+    team1_id: number | null;
+    team2_id: number | null;
     score1: number;
     score2: number;
     winner_id?: number;
     match_date?: string;
     status: string;
+    bracket?: string;
+    position?: number;
+    next_match_id?: number;
+    next_match_slot?: number;
+    loser_next_match_id?: number;
+    loser_next_match_slot?: number;
+}
+
+export interface BatchItemResult {
+    index: number;
+    ok: boolean;
+    detail?: string;
+}
+
+export interface ScoreBatchResult extends BatchItemResult {
+    match?: Match;
+}
+
+export interface ParticipationBatchResult extends BatchItemResult {
+    participation?: Participation;
 }
 
+export type BracketFormat = 'single_elimination' | 'double_elimination' | 'round_robin' | 'swiss';
+
 export interface Participation {
     id: number;
     tournament_id: number;
     team_id: number;
     registered_at: string;
     final_position?: number;
+    status: 'registered' | 'waitlisted';
+}
+
+export interface MatchWithTeams extends Match {
+    team1: Team | null;
+    team2: Team | null;
+    winner: Team | null;
+}
+
+export interface ParticipationWithTeam extends Participation {
+    team: Team;
 }
 
+export interface TournamentFull extends Tournament {
+    organizer: PublicUser;
+    participations: ParticipationWithTeam[];
+    matches: MatchWithTeams[];
+}
+
+export interface SearchResult {
+    kind: 'tournament' | 'team';
+    id: number;
+    name: string;
+    tag?: string;
+    score: number;
+}
+
+export interface Standing {
+    tournament_id: number;
+    team_id: number;
+    played: number;
+    wins: number;
+    losses: number;
+    maps_won: number;
+    maps_lost: number;
+    map_differential: number;
+    points: number;
+}
+
+export type LiveEvent =
+    | { type: 'match'; action: 'created' | 'updated'; match: Match }
+    | { type: 'participation'; action: 'created'; participation: Participation }
+    | { type: 'participation'; action: 'withdrawn'; team_id: number }
+    | { type: 'bracket'; action: 'generated'; format: string }
+    | { type: 'dropped' };
+
 export interface LoginCredentials {
     username: string;
     password: string;
@@ -71,9 +146,57 @@ export interface TokenResponse {
     token_type: string;
 }
 
+export interface Page<T> {
+    items: T[];
+    nextCursor: string | null;
+}
+
+interface CachedResponse {
+    etag: string;
+    data: any;
+    headers: Record<string, any>;
+}
+
+// A cached GET is served as-is while fresh. Once stale it is still served,
+// but revalidated in the background. Past that, callers wait for the network.
+interface CachePolicy {
+    fresh: number;
+    stale: number;
+}
+
+const CACHE_POLICIES = {
+    tournaments: { fresh: 30_000, stale: 300_000 },
+    tournament: { fresh: 10_000, stale: 120_000 },
+    teams: { fresh: 60_000, stale: 600_000 },
+    participants: { fresh: 10_000, stale: 120_000 },
+    standings: { fresh: 5_000, stale: 60_000 },
+};
+
+// Participant lookups made within this window go out as one request
+const PARTICIPANT_BATCH_MS = 10;
+const MAX_PARTICIPANT_LOOKUP = 100;
+
+interface CacheEntry {
+    value: any;
+    fetchedAt: number;
+}
+
+interface PendingLookup {
+    tournamentId: number;
+    resolve: (participants: Participation[]) => void;
+    reject: (error: any) => void;
+}
+
 class ApiClient {
     private token: string | null = null;
     private user: User | null = null;
+    // Last response per URL for conditional GETs, keyed by URL + params
+    private responseCache = new Map<string, CachedResponse>();
+    // Values handed to callers, and the requests still out, under the same keys
+    private entries = new Map<string, CacheEntry>();
+    private inflight = new Map<string, Promise<any>>();
+    private pendingParticipants: PendingLookup[] = [];
+    private participantTimer: ReturnType<typeof setTimeout> | null = null;
 
     constructor() {
         // Load token from localStorage
@@ -106,6 +229,7 @@ class ApiClient {
         this.user = user;
         localStorage.setItem('auth_token', token);
         localStorage.setItem('user', JSON.stringify(user));
+        this.clearCache();
     }
 
     clearAuth() {
@@ -113,6 +237,101 @@ class ApiClient {
         this.user = null;
         localStorage.removeItem('auth_token');
         localStorage.removeItem('user');
+        this.clearCache();
+    }
+
+    private cacheKey(url: string, params?: Record<string, any>): string {
+        return url + '?' + new URLSearchParams(
+            Object.entries(params ?? {})
+                .filter(([, value]) => value !== undefined && value !== null)
+                .sort(([a], [b]) => a.localeCompare(b))
+        ).toString();
+    }
+
+    // Serve key by policy; concurrent callers share one request. When a stale
+    // value is returned, onRefresh gets the revalidated one if it differs.
+    private cached<T>(key: string, policy: CachePolicy, load: () => Promise<T>, onRefresh?: (value: T) => void): Promise<T> {
+        const entry = this.entries.get(key);
+        const age = entry ? Date.now() - entry.fetchedAt : Infinity;
+        if (entry && age < policy.fresh) {
+            return Promise.resolve(entry.value);
+        }
+        if (entry && age < policy.stale) {
+            this.revalidate(key, load).then(
+                (value) => { if (onRefresh && value !== entry.value) onRefresh(value); },
+                () => {},  // Keep serving the stale value; the next caller retries
+            );
+            return Promise.resolve(entry.value);
+        }
+        return this.revalidate(key, load);
+    }
+
+    private revalidate<T>(key: string, load: () => Promise<T>): Promise<T> {
+        const running = this.inflight.get(key);
+        if (running) {
+            return running;
+        }
+        const request: Promise<T> = load()
+            .then((value) => {
+                // Invalidated while out: the answer may predate the write, so don't keep it
+                if (this.inflight.get(key) === request) {
+                    this.entries.set(key, { value, fetchedAt: Date.now() });
+                }
+                return value;
+            })
+            .finally(() => {
+                if (this.inflight.get(key) === request) {
+                    this.inflight.delete(key);
+                }
+            });
+        this.inflight.set(key, request);
+        return request;
+    }
+
+    // Drop cached values (and forget requests in flight) under any of the URL prefixes
+    private invalidate(...prefixes: string[]) {
+        for (const cache of [this.entries, this.inflight]) {
+            for (const key of [...cache.keys()]) {
+                if (prefixes.some((prefix) => key.startsWith(prefix))) {
+                    cache.delete(key);
+                }
+            }
+        }
+    }
+
+    // The tournament itself, its full view, participants and standings; optionally the list too
+    private invalidateTournament(tournamentId: number, list = false) {
+        const prefixes = [`${API_BASE_URL}/tournaments/${tournamentId}?`, `${API_BASE_URL}/tournaments/${tournamentId}/`];
+        if (list) {
+            prefixes.push(`${API_BASE_URL}/tournaments?`, `page:${API_BASE_URL}/tournaments?`);
+        }
+        this.invalidate(...prefixes);
+    }
+
+    private clearCache() {
+        this.entries.clear();
+        this.inflight.clear();
+    }
+
+    // GET with If-None-Match; on 304 the cached body (and headers) are returned
+    private async conditionalGet(url: string, params?: Record<string, any>): Promise<{ data: any; headers: Record<string, any> }> {
+        const key = this.cacheKey(url, params);
+        const cached = this.responseCache.get(key);
+        const headers = cached ? { ...this.headers, 'If-None-Match': cached.etag } : this.headers;
+
+        const response = await axios.get(url, {
+            headers,
+            params,
+            validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+        });
+        if (response.status === 304 && cached) {
+            return cached;
+        }
+        const etag = response.headers['etag'];
+        if (etag) {
+            this.responseCache.set(key, { etag, data: response.data, headers: response.headers });
+        }
+        return response;
     }
 
     get isAuthenticated(): boolean {
@@ -162,22 +381,40 @@ class ApiClient {
         limit?: number;
         game?: string;
     }): Promise<Tournament[]> {
-        const response = await axios.get(
-            `${API_BASE_URL}/tournaments`,
-            { 
-                headers: this.headers,
-                params 
-            }
-        );
-        return response.data;
+        const url = `${API_BASE_URL}/tournaments`;
+        return this.cached(this.cacheKey(url, params), CACHE_POLICIES.tournaments,
+            async () => (await this.conditionalGet(url, params)).data);
+    }
+
+    async getTournamentsPage(params?: {
+        after?: string;
+        limit?: number;
+        game?: string;
+    }, onRefresh?: (page: Page<Tournament>) => void): Promise<Page<Tournament>> {
+        const url = `${API_BASE_URL}/tournaments`;
+        // Keyed apart from getTournaments: the cached value here is a Page
+        return this.cached('page:' + this.cacheKey(url, params), CACHE_POLICIES.tournaments, async () => {
+            const response = await this.conditionalGet(url, params);
+            return {
+                items: response.data,
+                nextCursor: response.headers['x-next-cursor'] ?? null,
+            };
+        }, onRefresh);
     }
 
     async getTournament(id: number): Promise<Tournament> {
-        const response = await axios.get(
-            `${API_BASE_URL}/tournaments/${id}`,
-            { headers: this.headers }
-        );
-        return response.data;
+        const url = `${API_BASE_URL}/tournaments/${id}`;
+        return this.cached(this.cacheKey(url), CACHE_POLICIES.tournament,
+            async () => (await this.conditionalGet(url)).data);
+    }
+
+    // Tournament with organizer, participants and matches in one request
+    async getTournamentFull(id: number): Promise<TournamentFull> {
+        const url = `${API_BASE_URL}/tournaments/${id}/full`;
+        return this.cached(this.cacheKey(url), CACHE_POLICIES.tournament, async () => {
+            const response = await axios.get(url, { headers: this.headers });
+            return response.data;
+        });
     }
 
     async createTournament(tournament: Omit<Tournament, 'id' | 'status' | 'organizer_id' | 'created_at'>): Promise<Tournament> {
@@ -186,6 +423,7 @@ class ApiClient {
             tournament,
             { headers: this.headers }
         );
+        this.invalidate(`${API_BASE_URL}/tournaments?`, `page:${API_BASE_URL}/tournaments?`);
         return response.data;
     }
 
@@ -195,6 +433,7 @@ class ApiClient {
             tournament,
             { headers: this.headers }
         );
+        this.invalidateTournament(id, true);
         return response.data;
     }
 
@@ -203,29 +442,56 @@ class ApiClient {
             `${API_BASE_URL}/tournaments/${id}`,
             { headers: this.headers }
         );
+        this.invalidateTournament(id, true);
     }
 
-    // Team endpoints
-    async getTeams(params?: {
+    // Ranked full-text search; the last word matches as a prefix, for type-ahead
+    async search(q: string, params?: {
+        kind?: 'tournament' | 'team';
         skip?: number;
         limit?: number;
-    }): Promise<Team[]> {
+    }): Promise<SearchResult[]> {
         const response = await axios.get(
-            `${API_BASE_URL}/teams`,
-            { 
+            `${API_BASE_URL}/search`,
+            {
                 headers: this.headers,
-                params 
+                params: { q, ...params }
             }
         );
         return response.data;
     }
 
+    // Team endpoints
+    async getTeams(params?: {
+        skip?: number;
+        limit?: number;
+    }, onRefresh?: (teams: Team[]) => void): Promise<Team[]> {
+        const url = `${API_BASE_URL}/teams`;
+        return this.cached(this.cacheKey(url, params), CACHE_POLICIES.teams,
+            async () => (await this.conditionalGet(url, params)).data, onRefresh);
+    }
+
+    async getTeamsPage(params?: {
+        after?: string;
+        limit?: number;
+    }): Promise<Page<Team>> {
+        const url = `${API_BASE_URL}/teams`;
+        return this.cached('page:' + this.cacheKey(url, params), CACHE_POLICIES.teams, async () => {
+            const response = await this.conditionalGet(url, params);
+            return {
+                items: response.data,
+                nextCursor: response.headers['x-next-cursor'] ?? null,
+            };
+        });
+    }
+
     async createTeam(team: Omit<Team, 'id' | 'created_at'>): Promise<Team> {
         const response = await axios.post(
             `${API_BASE_URL}/teams/`,
             team,
             { headers: this.headers }
         );
+        this.invalidate(`${API_BASE_URL}/teams?`, `page:${API_BASE_URL}/teams?`);
         return response.data;
     }
 
@@ -236,6 +502,17 @@ class ApiClient {
             match,
             { headers: this.headers }
         );
+        this.invalidateTournament(match.tournament_id);
+        return response.data;
+    }
+
+    async generateBracket(tournamentId: number, format: BracketFormat): Promise<Match[]> {
+        const response = await axios.post(
+            `${API_BASE_URL}/tournaments/${tournamentId}/bracket`,
+            { format },
+            { headers: this.headers }
+        );
+        this.invalidateTournament(tournamentId, true);
         return response.data;
     }
 
@@ -248,9 +525,50 @@ class ApiClient {
                 params: { score1, score2 }
             }
         );
+        this.invalidateTournament(response.data.tournament_id);
         return response.data;
     }
 
+    async updateMatchScores(updates: { match_id: number; score1: number; score2: number }[]): Promise<ScoreBatchResult[]> {
+        const response = await axios.put(
+            `${API_BASE_URL}/matches/scores`,
+            updates,
+            { headers: this.headers }
+        );
+        const results: ScoreBatchResult[] = response.data;
+        for (const tournamentId of new Set(results.flatMap((result) => result.match ? [result.match.tournament_id] : []))) {
+            this.invalidateTournament(tournamentId);
+        }
+        return results;
+    }
+
+    async getStandings(tournamentId: number): Promise<Standing[]> {
+        const url = `${API_BASE_URL}/tournaments/${tournamentId}/standings`;
+        return this.cached(this.cacheKey(url), CACHE_POLICIES.standings, async () => {
+            const response = await axios.get(url, { headers: this.headers });
+            return response.data;
+        });
+    }
+
+    // Live updates (Server-Sent Events). Returns a function that closes the stream.
+    subscribeToTournament(tournamentId: number, onEvent: (event: LiveEvent) => void): () => void {
+        const source = new EventSource(`${API_BASE_URL}/tournaments/${tournamentId}/live`);
+        for (const type of ['match', 'participation', 'bracket'] as const) {
+            source.addEventListener(type, (message) => {
+                // Someone else changed the tournament; cached reads of it are out of date
+                this.invalidateTournament(tournamentId, type !== 'match');
+                onEvent({ type, ...JSON.parse((message as MessageEvent).data) });
+            });
+        }
+        // The server drops spectators that fall too far behind; resync and reconnect
+        source.addEventListener('dropped', () => {
+            source.close();
+            this.invalidateTournament(tournamentId, true);
+            onEvent({ type: 'dropped' });
+        });
+        return () => source.close();
+    }
+
     // Participation endpoints
     async registerForTournament(tournamentId: number, teamId: number): Promise<Participation> {
         const response = await axios.post(
@@ -258,16 +576,77 @@ class ApiClient {
             { tournament_id: tournamentId, team_id: teamId },
             { headers: this.headers }
         );
+        this.invalidateTournament(tournamentId, true);
         return response.data;
     }
 
-    async getTournamentParticipants(tournamentId: number): Promise<Participation[]> {
-        const response = await axios.get(
-            `${API_BASE_URL}/tournaments/${tournamentId}/participants`,
+    async registerForTournaments(registrations: { tournament_id: number; team_id: number }[]): Promise<ParticipationBatchResult[]> {
+        const response = await axios.post(
+            `${API_BASE_URL}/participations/batch`,
+            registrations,
             { headers: this.headers }
         );
+        for (const tournamentId of new Set(registrations.map((registration) => registration.tournament_id))) {
+            this.invalidateTournament(tournamentId, true);
+        }
         return response.data;
     }
+
+    // Lookups for different tournaments made together are sent as one request
+    async getTournamentParticipants(tournamentId: number, onRefresh?: (participants: Participation[]) => void): Promise<Participation[]> {
+        const url = `${API_BASE_URL}/tournaments/${tournamentId}/participants`;
+        return this.cached(this.cacheKey(url), CACHE_POLICIES.participants,
+            () => this.queueParticipantLookup(tournamentId), onRefresh);
+    }
+
+    async getParticipantsFor(tournamentIds: number[]): Promise<Map<number, Participation[]>> {
+        const lists = await Promise.all(tournamentIds.map((id) => this.getTournamentParticipants(id)));
+        return new Map(tournamentIds.map((id, i) => [id, lists[i]]));
+    }
+
+    private queueParticipantLookup(tournamentId: number): Promise<Participation[]> {
+        return new Promise((resolve, reject) => {
+            this.pendingParticipants.push({ tournamentId, resolve, reject });
+            if (this.pendingParticipants.length >= MAX_PARTICIPANT_LOOKUP) {
+                this.flushParticipantLookups();
+            } else if (!this.participantTimer) {
+                this.participantTimer = setTimeout(() => this.flushParticipantLookups(), PARTICIPANT_BATCH_MS);
+            }
+        });
+    }
+
+    private async flushParticipantLookups() {
+        if (this.participantTimer) {
+            clearTimeout(this.participantTimer);
+            this.participantTimer = null;
+        }
+        // Each tournament is queued at most once: cached() shares lookups already in flight
+        const waiting = this.pendingParticipants;
+        this.pendingParticipants = [];
+        try {
+            if (waiting.length === 1) {
+                // On its own, the per-tournament route can answer 304
+                const response = await this.conditionalGet(`${API_BASE_URL}/tournaments/${waiting[0].tournamentId}/participants`);
+                waiting[0].resolve(response.data);
+                return;
+            }
+            const response = await axios.get(`${API_BASE_URL}/participations/`, {
+                headers: this.headers,
+                params: new URLSearchParams(waiting.map((lookup) => ['tournament_id', String(lookup.tournamentId)])),
+            });
+            const byTournament = new Map<number, Participation[]>(waiting.map((lookup) => [lookup.tournamentId, []]));
+            for (const participation of response.data as Participation[]) {
+                byTournament.get(participation.tournament_id)?.push(participation);
+            }
+            for (const lookup of waiting) {
+                lookup.resolve(byTournament.get(lookup.tournamentId)!);
+            }
+        } catch (error) {
+            for (const lookup of waiting) {
+                lookup.reject(error);
+            }
+        }
+    }
 }
 
 export const api = new ApiClient();
\ No newline at end of file
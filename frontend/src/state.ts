@@ -1,11 +1,13 @@
 import { reactive, readonly } from 'vue';
-import { api, User, Tournament, Team, Match } from './api';
+import { api, User, Tournament, Team, Match, Participation, SearchResult } from './api';
 
 interface AppState {
     user: User | null;
     tournaments: Tournament[];
+    tournamentsCursor: string | null;
     teams: Team[];
     matches: Match[];
+    searchResults: SearchResult[];
     isLoading: boolean;
     error: string | null;
 }
@@ -13,21 +15,34 @@ interface AppState {
 const state: AppState = reactive({
     user: api.currentUser,
     tournaments: [],
+    tournamentsCursor: null,
     teams: [],
     matches: [],
+    searchResults: [],
     isLoading: false,
     error: null,
 });
 
 export const appState = readonly(state);
 
+let searchSequence = 0;
+
 export const mutations = {
     setUser(user: User | null) {
         state.user = user;
     },
 
     setTournaments(tournaments: Tournament[]) {
-        state.tournaments = tournaments;
+        // A copy: the array may be the api cache's, and later mutations push into it
+        state.tournaments = [...tournaments];
+    },
+
+    appendTournaments(tournaments: Tournament[]) {
+        state.tournaments.push(...tournaments);
+    },
+
+    setTournamentsCursor(cursor: string | null) {
+        state.tournamentsCursor = cursor;
     },
 
     addTournament(tournament: Tournament) {
@@ -45,8 +60,12 @@ export const mutations = {
         state.tournaments = state.tournaments.filter(t => t.id !== id);
     },
 
+    setSearchResults(results: SearchResult[]) {
+        state.searchResults = results;
+    },
+
     setTeams(teams: Team[]) {
-        state.teams = teams;
+        state.teams = [...teams];
     },
 
     addTeam(team: Team) {
@@ -127,8 +146,10 @@ export const actions = {
         api.clearAuth();
         mutations.setUser(null);
         mutations.setTournaments([]);
+        mutations.setTournamentsCursor(null);
         mutations.setTeams([]);
         mutations.setMatches([]);
+        mutations.setSearchResults([]);
     },
 
     async loadTournaments(game?: string) {
@@ -136,8 +157,50 @@ export const actions = {
             mutations.setLoading(true);
             mutations.clearError();
 
-            const tournaments = await api.getTournaments({ game });
-            mutations.setTournaments(tournaments);
+            const page = await api.getTournamentsPage({ game }, (fresh) => {
+                // A cached first page was shown; swap in the revalidated one unless more were loaded since
+                if (state.tournamentsCursor === page.nextCursor) {
+                    mutations.setTournaments(fresh.items);
+                    mutations.setTournamentsCursor(fresh.nextCursor);
+                }
+            });
+            mutations.setTournaments(page.items);
+            mutations.setTournamentsCursor(page.nextCursor);
+        } catch (error: any) {
+            mutations.setError(error.response?.data?.detail || 'Failed to load tournaments');
+        } finally {
+            mutations.setLoading(false);
+        }
+    },
+
+    // Type-ahead: only the response to the latest query is kept
+    async search(q: string, kind?: 'tournament' | 'team') {
+        const query = ++searchSequence;
+        if (!q.trim()) {
+            mutations.setSearchResults([]);
+            return;
+        }
+        try {
+            const results = await api.search(q, { kind });
+            if (query === searchSequence) {
+                mutations.setSearchResults(results);
+            }
+        } catch (error: any) {
+            mutations.setError(error.response?.data?.detail || 'Search failed');
+        }
+    },
+
+    async loadMoreTournaments(game?: string) {
+        if (!state.tournamentsCursor) {
+            return;
+        }
+        try {
+            mutations.setLoading(true);
+            mutations.clearError();
+
+            const page = await api.getTournamentsPage({ game, after: state.tournamentsCursor });
+            mutations.appendTournaments(page.items);
+            mutations.setTournamentsCursor(page.nextCursor);
         } catch (error: any) {
             mutations.setError(error.response?.data?.detail || 'Failed to load tournaments');
         } finally {
@@ -166,7 +229,7 @@ export const actions = {
             mutations.setLoading(true);
             mutations.clearError();
 
-            const teams = await api.getTeams();
+            const teams = await api.getTeams(undefined, mutations.setTeams);
             mutations.setTeams(teams);
         } catch (error: any) {
             mutations.setError(error.response?.data?.detail || 'Failed to load teams');
@@ -220,4 +283,19 @@ export const actions = {
             mutations.setLoading(false);
         }
     },
+
+    // One request however many tournaments are asked for
+    async loadParticipantsFor(tournamentIds: number[]): Promise<Map<number, Participation[]>> {
+        try {
+            mutations.setLoading(true);
+            mutations.clearError();
+
+            return await api.getParticipantsFor(tournamentIds);
+        } catch (error: any) {
+            mutations.setError(error.response?.data?.detail || 'Failed to load participants');
+            throw error;
+        } finally {
+            mutations.setLoading(false);
+        }
+    },
 };
\ No newline at end of file